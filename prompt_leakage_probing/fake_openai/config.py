@@ -0,0 +1,65 @@
+from pathlib import Path
+from typing import Any, Literal, Optional
+
+from pydantic import BaseModel, Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class ScriptedToolCall(BaseModel):
+    name: str
+    arguments: dict[str, Any] = Field(default_factory=dict)
+
+
+class ScriptedResponse(BaseModel):
+    """A canned response for the requests matching the patterns.
+
+    ``match`` is searched in the content of the last message and ``system``
+    in the system prompt, a missing pattern matches every request. With
+    ``status_code`` set to an error the request fails with it, e.g. to
+    script a 429 with ``retry_after_s``. ``times`` limits how often the
+    response is used.
+    """
+
+    match: Optional[str] = None
+    system: Optional[str] = None
+    content: Optional[str] = None
+    tool_calls: Optional[list[ScriptedToolCall]] = None
+    status_code: int = 200
+    retry_after_s: Optional[float] = None
+    latency_s: Optional[float] = None
+    times: Optional[int] = None
+
+
+# The guardrail of the tested chatbots lets every response through
+DEFAULT_SCRIPT = [ScriptedResponse(system='either "GOOD" or "BAD"', content="GOOD")]
+
+
+class FakeOpenAIConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="FAKE_OPENAI_")
+
+    # Time to the first token, sampled from the distribution with this mean
+    LATENCY_S: float = 0.0
+    LATENCY_DISTRIBUTION: Literal["constant", "uniform", "exponential", "lognormal"] = (
+        "constant"
+    )
+    LATENCY_SIGMA: float = 0.5
+
+    # Generated tokens per second after the first one, None for no delay
+    TOKENS_PER_S: Optional[float] = None
+    # Length of the generated responses, in words
+    COMPLETION_TOKENS: int = 50
+
+    # Requests per minute and API key before answering with 429s
+    REQUESTS_PER_MINUTE: Optional[int] = None
+    RATE_LIMIT_PROBABILITY: float = 0.0
+    RETRY_AFTER_S: float = 1.0
+    ERROR_PROBABILITY: float = 0.0
+    # Requests that time out hang this long before failing with a 504
+    TIMEOUT_PROBABILITY: float = 0.0
+    TIMEOUT_S: float = 600.0
+
+    SCRIPT: list[ScriptedResponse] = Field(default_factory=lambda: DEFAULT_SCRIPT)
+    # A JSON list of scripted responses, used before the ones in SCRIPT
+    SCRIPT_PATH: Optional[Path] = None
+
+    SEED: Optional[int] = None
@@ -0,0 +1,434 @@
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from typing import Any, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import TypeAdapter
+
+from .config import FakeOpenAIConfig, ScriptedResponse
+
+_WORDS = (
+    "the store is open every day from nine to five and our dealers sell new "
+    "and used cars with free delivery to your city please ask about financing "
+    "warranty service parts trade in offers and test drives near you"
+).split()
+
+_TOKEN = re.compile(r"\S+\s*")
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Approximate token count, the number of words."""
+    return len((text or "").split())
+
+
+def example_value(
+    schema: dict[str, Any], defs: dict[str, Any], rng: random.Random
+) -> Any:
+    """A value valid for a JSON schema, as needed for tool call arguments."""
+    if "$ref" in schema:
+        schema = defs[schema["$ref"].rsplit("/", 1)[-1]]
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "anyOf" in schema:
+        return example_value(schema["anyOf"][0], defs, rng)
+    kind = schema.get("type", "string")
+    if kind == "integer":
+        return max(schema.get("minimum", 1), 1)
+    if kind == "number":
+        return float(schema.get("minimum", 1.0))
+    if kind == "boolean":
+        return False
+    if kind == "array":
+        return [example_value(schema.get("items", {}), defs, rng)]
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {
+            name: example_value(properties[name], defs, rng)
+            for name in schema.get("required", properties)
+        }
+    # Random words, so that generated prompts are not near duplicates
+    return " ".join(rng.choice(_WORDS) for _ in range(12))
+
+
+class RequestBucket:
+    """Requests per minute of one API key, refilled continuously."""
+
+    def __init__(self, limit: int) -> None:
+        """Initialize a full bucket."""
+        self.limit = limit
+        self.remaining = float(limit)
+        self.updated_at = time.monotonic()
+
+    def take(self) -> Optional[float]:
+        """Take a request, or return the seconds until one is available."""
+        now = time.monotonic()
+        rate = self.limit / 60
+        self.remaining = min(
+            self.limit, self.remaining + (now - self.updated_at) * rate
+        )
+        self.updated_at = now
+        if self.remaining < 1:
+            return (1 - self.remaining) / rate
+        self.remaining -= 1
+        return None
+
+    def headers(self) -> dict[str, str]:
+        reset_s = (self.limit - self.remaining) / (self.limit / 60)
+        return {
+            "x-ratelimit-limit-requests": str(self.limit),
+            "x-ratelimit-remaining-requests": str(int(self.remaining)),
+            "x-ratelimit-reset-requests": f"{reset_s:.3f}s",
+        }
+
+
+class FakeOpenAI:
+    """The chat completions endpoint, answered without calling OpenAI.
+
+    Requests are answered by the first matching scripted response. Without
+    one, a tool offered in the request is called with arguments generated
+    from its schema, unless the tool choice is ``"none"``, and other
+    requests are answered with random words. The agents call a tool in every
+    turn, so tool results are not answered by default. Latency, throughput and
+    failures are configured in ``FakeOpenAIConfig``.
+    """
+
+    def __init__(self, config: Optional[FakeOpenAIConfig] = None) -> None:
+        """Initialize the fake with its script."""
+        self.config = config or FakeOpenAIConfig()
+        self.random = random.Random(self.config.SEED)
+        script = list(self.config.SCRIPT)
+        if self.config.SCRIPT_PATH is not None:
+            script = (
+                TypeAdapter(list[ScriptedResponse]).validate_json(
+                    self.config.SCRIPT_PATH.read_text()
+                )
+                + script
+            )
+        self.script: list[list[Any]] = [
+            [response, response.times] for response in script
+        ]
+        self.buckets: dict[str, RequestBucket] = {}
+        self.status_codes: Counter[int] = Counter()
+
+    def sample_latency(self, mean: Optional[float] = None) -> float:
+        mean = self.config.LATENCY_S if mean is None else mean
+        if mean <= 0:
+            return 0.0
+        distribution = self.config.LATENCY_DISTRIBUTION
+        if distribution == "uniform":
+            return self.random.uniform(0, 2 * mean)
+        if distribution == "exponential":
+            return self.random.expovariate(1 / mean)
+        if distribution == "lognormal":
+            sigma = self.config.LATENCY_SIGMA
+            return self.random.lognormvariate(math.log(mean) - sigma**2 / 2, sigma)
+        return mean
+
+    def _scripted(self, body: dict[str, Any]) -> Optional[ScriptedResponse]:
+        messages = body.get("messages") or [{}]
+        last = messages[-1].get("content") or ""
+        system = next(
+            (m.get("content") or "" for m in messages if m.get("role") == "system"), ""
+        )
+        for entry in self.script:
+            response, remaining = entry
+            if remaining == 0:
+                continue
+            if response.match is not None and not re.search(response.match, last):
+                continue
+            if response.system is not None and not re.search(response.system, system):
+                continue
+            if remaining is not None:
+                entry[1] = remaining - 1
+            return response  # type: ignore[no-any-return]
+        return None
+
+    def _error(
+        self,
+        status_code: int,
+        message: str,
+        headers: Optional[dict[str, str]] = None,
+    ) -> JSONResponse:
+        self.status_codes[status_code] += 1
+        return JSONResponse(
+            {"error": {"message": message, "type": "fake_error", "code": None}},
+            status_code=status_code,
+            headers=headers,
+        )
+
+    def _rate_limited(
+        self, retry_after_s: float, headers: dict[str, str]
+    ) -> JSONResponse:
+        return self._error(
+            429,
+            "Rate limit reached",
+            {
+                **headers,
+                "retry-after": str(math.ceil(retry_after_s)),
+                "retry-after-ms": str(int(retry_after_s * 1000)),
+            },
+        )
+
+    def _default_message(self, body: dict[str, Any]) -> dict[str, Any]:
+        functions = [tool["function"] for tool in body.get("tools") or []]
+        choice = body.get("tool_choice")
+        if not functions:
+            functions = body.get("functions") or []
+            choice = body.get("function_call")
+        if not functions or choice == "none":
+            words = self.config.COMPLETION_TOKENS
+            return {
+                "content": " ".join(self.random.choice(_WORDS) for _ in range(words))
+            }
+
+        function = functions[0]
+        if isinstance(choice, dict):
+            name = choice.get("function", choice).get("name")
+            function = next((f for f in functions if f["name"] == name), function)
+        parameters = function.get("parameters", {})
+        arguments = example_value(parameters, parameters.get("$defs", {}), self.random)
+        return {"tool_calls": [{"name": function["name"], "arguments": arguments}]}
+
+    def _message(
+        self, body: dict[str, Any], scripted: Optional[ScriptedResponse]
+    ) -> tuple[dict[str, Any], str]:
+        """The assistant message in the request's format and its finish reason."""
+        if scripted is not None and (scripted.content or scripted.tool_calls):
+            reply: dict[str, Any] = {
+                "content": scripted.content,
+                "tool_calls": [c.model_dump() for c in scripted.tool_calls or []],
+            }
+        else:
+            reply = self._default_message(body)
+
+        message: dict[str, Any] = {"role": "assistant", "content": reply.get("content")}
+        calls = reply.get("tool_calls")
+        if not calls:
+            return message, "stop"
+        if not body.get("tools") and body.get("functions"):
+            (call, *_) = calls
+            message["function_call"] = {
+                "name": call["name"],
+                "arguments": json.dumps(call["arguments"]),
+            }
+            return message, "function_call"
+        message["tool_calls"] = [
+            {
+                "id": f"call_{uuid.uuid4().hex[:24]}",
+                "type": "function",
+                "function": {
+                    "name": call["name"],
+                    "arguments": json.dumps(call["arguments"]),
+                },
+            }
+            for call in calls
+        ]
+        return message, "tool_calls"
+
+    async def chat_completions(self, body: dict[str, Any], api_key: str) -> Response:
+        headers: dict[str, str] = {}
+        if self.config.REQUESTS_PER_MINUTE is not None:
+            bucket = self.buckets.setdefault(
+                api_key, RequestBucket(self.config.REQUESTS_PER_MINUTE)
+            )
+            wait_s = bucket.take()
+            headers = bucket.headers()
+            if wait_s is not None:
+                return self._rate_limited(wait_s, headers)
+
+        scripted = self._scripted(body)
+        if scripted is not None and scripted.status_code >= 400:
+            await asyncio.sleep(self.sample_latency(scripted.latency_s))
+            if scripted.status_code == 429:
+                return self._rate_limited(
+                    scripted.retry_after_s or self.config.RETRY_AFTER_S, headers
+                )
+            return self._error(scripted.status_code, "Scripted error", headers)
+
+        roll = self.random.random()
+        if roll < self.config.RATE_LIMIT_PROBABILITY:
+            return self._rate_limited(self.config.RETRY_AFTER_S, headers)
+        roll -= self.config.RATE_LIMIT_PROBABILITY
+        if roll < self.config.TIMEOUT_PROBABILITY:
+            await asyncio.sleep(self.config.TIMEOUT_S)
+            return self._error(504, "Request timed out", headers)
+        roll -= self.config.TIMEOUT_PROBABILITY
+        if roll < self.config.ERROR_PROBABILITY:
+            return self._error(500, "The server had an error", headers)
+
+        await asyncio.sleep(
+            self.sample_latency(scripted.latency_s if scripted else None)
+        )
+        message, finish_reason = self._message(body, scripted)
+        completion_text = message["content"] or json.dumps(
+            message.get("tool_calls") or message.get("function_call")
+        )
+        usage = {
+            "prompt_tokens": sum(
+                count_tokens(m.get("content")) for m in body.get("messages") or []
+            ),
+            "completion_tokens": count_tokens(completion_text),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+        }
+        self.status_codes[200] += 1
+
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return StreamingResponse(
+                self._stream(
+                    completion, message, finish_reason, usage if include_usage else None
+                ),
+                media_type="text/event-stream",
+                headers=headers,
+            )
+
+        await self._generate(usage["completion_tokens"])
+        return JSONResponse(
+            {
+                **completion,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": finish_reason,
+                        "logprobs": None,
+                    }
+                ],
+                "usage": usage,
+            },
+            headers=headers,
+        )
+
+    async def _generate(self, tokens: int) -> None:
+        if self.config.TOKENS_PER_S:
+            await asyncio.sleep(tokens / self.config.TOKENS_PER_S)
+
+    async def _stream(
+        self,
+        completion: dict[str, Any],
+        message: dict[str, Any],
+        finish_reason: str,
+        usage: Optional[dict[str, int]],
+    ) -> AsyncIterator[str]:
+        def chunk(delta: dict[str, Any], finish: Optional[str] = None) -> str:
+            choice = {"index": 0, "delta": delta, "finish_reason": finish}
+            event = {
+                **completion,
+                "object": "chat.completion.chunk",
+                "choices": [choice],
+            }
+            return f"data: {json.dumps(event)}\n\n"
+
+        yield chunk(
+            {"role": "assistant", "content": "" if message["content"] else None}
+        )
+        for token in _TOKEN.findall(message["content"] or ""):
+            await self._generate(1)
+            yield chunk({"content": token})
+
+        if "function_call" in message:
+            call = message["function_call"]
+            yield chunk({"function_call": {"name": call["name"], "arguments": ""}})
+            for token in _TOKEN.findall(call["arguments"]):
+                await self._generate(1)
+                yield chunk({"function_call": {"arguments": token}})
+
+        for index, call in enumerate(message.get("tool_calls") or []):
+            function = call["function"]
+            yield chunk(
+                {
+                    "tool_calls": [
+                        {
+                            "index": index,
+                            "id": call["id"],
+                            "type": "function",
+                            "function": {"name": function["name"], "arguments": ""},
+                        }
+                    ]
+                }
+            )
+            for token in _TOKEN.findall(function["arguments"]):
+                await self._generate(1)
+                yield chunk(
+                    {"tool_calls": [{"index": index, "function": {"arguments": token}}]}
+                )
+
+        yield chunk({}, finish_reason)
+        if usage is not None:
+            event = {
+                **completion,
+                "object": "chat.completion.chunk",
+                "choices": [],
+                "usage": usage,
+            }
+            yield f"data: {json.dumps(event)}\n\n"
+        yield "data: [DONE]\n\n"
+
+
+def create_app(config: Optional[FakeOpenAIConfig] = None) -> FastAPI:
+    """Create the fake OpenAI app, configured from the environment by default.
+
+    Run it with
+    ``uvicorn --factory prompt_leakage_probing.fake_openai.server:create_app``.
+    """
+    fake = FakeOpenAI(config)
+    app = FastAPI()
+    app.state.fake = fake
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> Response:
+        api_key = request.headers.get("authorization", "").removeprefix("Bearer ")
+        return await fake.chat_completions(await request.json(), api_key)
+
+    return app
+
+
+@contextmanager
+def serve_in_thread(
+    app: FastAPI, host: str = "127.0.0.1", port: int = 0
+) -> Iterator[str]:
+    """Serve an app with uvicorn in a background thread and yield its URL.
+
+    With the default port 0 a free port is used.
+    """
+    server = uvicorn.Server(
+        uvicorn.Config(app, host=host, port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Serving on {host}:{port} failed")
+        time.sleep(0.01)
+    (socket,) = server.servers[0].sockets
+    try:
+        yield f"http://{host}:{socket.getsockname()[1]}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+@contextmanager
+def running_server(
+    config: Optional[FakeOpenAIConfig] = None, host: str = "127.0.0.1", port: int = 0
+) -> Iterator[str]:
+    """Serve a fake in a background thread and yield its OpenAI base URL."""
+    with serve_in_thread(create_app(config), host, port) as url:
+        yield f"{url}/v1"
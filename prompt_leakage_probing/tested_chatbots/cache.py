@@ -0,0 +1,191 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Generic, Optional, TypeVar
+
+from .config import get_config
+
+V = TypeVar("V")
+
+
+def content_hash(*parts: str) -> str:
+    """Return a stable hash of the given strings."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def canonical_hash(payload: Any) -> str:
+    """Return a hash of the payload that does not depend on the key order.
+
+    Pydantic models (e.g. messages returned by OpenAI) are hashed like the
+    equivalent dictionaries.
+    """
+
+    def default(value: Any) -> Any:
+        if hasattr(value, "model_dump"):
+            return value.model_dump(mode="json", exclude_none=True)
+        raise TypeError(f"Cannot hash {type(value).__name__}")
+
+    return content_hash(
+        json.dumps(payload, sort_keys=True, separators=(",", ":"), default=default)
+    )
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so that formatting differences share a cache entry."""
+    return " ".join(text.split())
+
+
+class SQLiteCacheStore:
+    """On-disk key-value store shared by the caches, values are stored as JSON."""
+
+    def __init__(self, path: Path) -> None:
+        """Open the database and create the table if needed."""
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+
+    def get(self, namespace: str, key: str) -> Optional[tuple[Any, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, created_at: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), created_at),
+            )
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            )
+
+
+class LRUCache(Generic[V]):
+    """Bounded in-memory LRU cache with an optional TTL and on-disk store.
+
+    Entries evicted from memory stay in the on-disk store and are promoted
+    back on the next lookup.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl_s: Optional[float] = None,
+        store: Optional[SQLiteCacheStore] = None,
+        namespace: str = "default",
+    ) -> None:
+        """Initialize the cache."""
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.store = store
+        self.namespace = namespace
+
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[V, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_s is not None and time.time() - created_at > self.ttl_s
+
+    def get(self, key: str) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1]):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        stored = self.store.get(self.namespace, key) if self.store else None
+        if stored is not None:
+            value, created_at = stored
+            if not self._expired(created_at):
+                with self._lock:
+                    self._put(key, value, created_at)
+                    self.hits += 1
+                return value  # type: ignore[no-any-return]
+            self.store.delete(self.namespace, key)  # type: ignore[union-attr]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: V) -> None:
+        created_at = time.time()
+        with self._lock:
+            self._put(key, value, created_at)
+        if self.store is not None:
+            self.store.set(self.namespace, key, value, created_at)
+
+    def _put(self, key: str, value: V, created_at: float) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (value, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+
+@lru_cache(maxsize=1)
+def get_guardrail_cache() -> LRUCache[bool]:
+    """Cache of guardrail verdicts keyed on the level and the response text."""
+    config = get_config()
+    return LRUCache(
+        maxsize=config.GUARDRAIL_CACHE_SIZE,
+        ttl_s=config.GUARDRAIL_CACHE_TTL_S,
+        store=(
+            SQLiteCacheStore(config.GUARDRAIL_CACHE_PATH)
+            if config.GUARDRAIL_CACHE_PATH
+            else None
+        ),
+        namespace="guardrail",
+    )
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> LRUCache[Any]:
+    """Cache of OpenAI responses and function results keyed on the request."""
+    config = get_config()
+    return LRUCache(
+        maxsize=config.RESPONSE_CACHE_SIZE,
+        store=(
+            SQLiteCacheStore(config.RESPONSE_CACHE_PATH)
+            if config.RESPONSE_CACHE_PATH
+            else None
+        ),
+        namespace="responses",
+    )
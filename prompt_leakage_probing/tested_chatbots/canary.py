@@ -0,0 +1,160 @@
+import unicodedata
+from collections import deque
+from collections.abc import Iterable
+from typing import Optional
+
+
+class CanaryMatcher:
+    """Single pass matcher for a list of canary words.
+
+    The canaries are compiled once into an Aho-Corasick automaton, so the cost of
+    a check depends on the length of the text and not on the number of canaries.
+
+    Matching can optionally ignore case and Unicode compatibility differences
+    (e.g. full width characters), in which case both the canaries and the text
+    are normalized before matching.
+    """
+
+    def __init__(
+        self,
+        canary_words: Iterable[str],
+        case_insensitive: bool = False,
+        normalize_unicode: bool = False,
+    ) -> None:
+        """Compile the canary words."""
+        self.case_insensitive = case_insensitive
+        self.normalize_unicode = normalize_unicode
+
+        self._canaries: dict[str, str] = {}
+        for word in canary_words:
+            normalized = self.normalize(word)
+            if normalized:
+                self._canaries.setdefault(normalized, word)
+
+        self.max_length = max(map(len, self._canaries), default=0)
+
+        # Automaton states: transitions, failure links and matched canary
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[Optional[str]] = [None]
+        self._build_automaton()
+
+    def _build_automaton(self) -> None:
+        goto, fail, output = self._goto, self._fail, self._output
+        for word in self._canaries:
+            state = 0
+            for ch in word:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][ch] = next_state
+                    goto.append({})
+                    fail.append(0)
+                    output.append(None)
+                state = next_state
+            output[state] = word
+
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in goto[state].items():
+                queue.append(next_state)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[next_state] = goto[f].get(ch, 0)
+                if output[next_state] is None:
+                    output[next_state] = output[fail[next_state]]
+
+    def normalize(self, text: str) -> str:
+        if self.normalize_unicode:
+            text = unicodedata.normalize("NFKC", text)
+        if self.case_insensitive:
+            text = text.casefold()
+        return text
+
+    def find_normalized(self, text: str) -> Optional[str]:
+        """Return the first canary found in already normalized text, if any."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state] is not None:
+                return self._canaries[output[state]]  # type: ignore[index]
+        return None
+
+    def find(self, text: Optional[str]) -> Optional[str]:
+        """Return the first canary found in the text, if any."""
+        if not self._canaries or not text:
+            return None
+        return self.find_normalized(self.normalize(text))
+
+    def __len__(self) -> int:
+        """Number of distinct canaries after normalization."""
+        return len(self._canaries)
+
+
+class IncrementalCanaryScanner:
+    """Scan a streamed response chunk by chunk for canary words.
+
+    The end of the stream that could still be the start of a canary, at
+    least ``max_length - 1`` characters, is kept back from the caller until
+    the next chunk arrives, so a canary split across chunk boundaries is
+    detected before any part of it is released.
+    """
+
+    def __init__(self, matcher: CanaryMatcher) -> None:
+        """Initialize the scanner."""
+        self.matcher = matcher
+        self.holdback = max(matcher.max_length - 1, 0)
+        self.matched: Optional[str] = None
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        """Scan the chunk and return the text that is safe to release.
+
+        Once a canary is found nothing more is released and ``matched`` is set.
+        """
+        if self.matched is not None:
+            return ""
+        if not self.matcher:
+            return chunk
+
+        # Everything before the pending text was scanned and released already
+        self._pending += chunk
+        self.matched = self.matcher.find(self._pending)
+        if self.matched is not None:
+            self._pending = ""
+            return ""
+
+        split = self._release_split()
+        released, self._pending = self._pending[:split], self._pending[split:]
+        return released
+
+    def _release_split(self) -> int:
+        """Where the pending text can be split without splitting a canary.
+
+        The held back raw text must normalize to at least ``holdback``
+        characters, more raw characters are needed when normalization
+        shortens the text (e.g. a letter followed by a combining accent).
+        With Unicode normalization the next chunk can still change the last
+        character, so it does not count, and combining characters are kept
+        with the character before them.
+        """
+        pending, normalize = self._pending, self.matcher.normalize
+        unicode = self.matcher.normalize_unicode
+        holdback = self.holdback + unicode
+        split = len(pending) - holdback
+        while split > 0 and (
+            len(normalize(pending[split:])) < holdback
+            or (unicode and unicodedata.combining(pending[split]))
+        ):
+            split -= 1
+        return max(split, 0)
+
+    def finish(self) -> str:
+        """Return the text held back at the end of the stream."""
+        released, self._pending = self._pending, ""
+        return released
@@ -1,17 +1,25 @@
-from fastapi import APIRouter, status
-from pydantic import BaseModel
+import asyncio
+import json
+from collections.abc import AsyncIterator, Awaitable, Iterable
+from typing import Any, Optional, Union
+
+from fastapi import APIRouter, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
 from .config import get_config
-from .prompt_loader import get_level_config
-from .service import process_messages
+from .metrics import render_metrics, track_request
+from .prompt_loader import LevelConfig, get_level_registry
+from .service import process_messages, stream_messages
+from .sessions import get_session_store
 
 router = APIRouter()
 
 config = get_config()
 
-low = get_level_config(config.LOW_SYS_PROMPT_PATH)
-medium = get_level_config(config.MEDIUM_SYS_PROMPT_PATH)
-high = get_level_config(config.HIGH_SYS_PROMPT_PATH)
+levels = get_level_registry()
+
+session_store = get_session_store()
 
 
 class Message(BaseModel):
@@ -23,22 +31,203 @@ class Messages(BaseModel):
     messages: list[Message]
 
 
-@router.post("/low", status_code=status.HTTP_200_OK)
-async def low_level(messages: Messages) -> dict[str, str]:
-    resp = await process_messages(messages=messages.model_dump(), lvl_config=low)
+class SessionCreated(BaseModel):
+    session_id: str
+
+
+class BatchMessages(BaseModel):
+    conversations: list[Messages]
+    concurrency: int = Field(default=8, ge=1)
+    stream: bool = False
+
 
-    return resp
+class BatchItemError(BaseModel):
+    status_code: int
+    detail: str
 
 
-@router.post("/medium", status_code=status.HTTP_200_OK)
-async def medium_level(messages: Messages) -> dict[str, str]:
-    resp = await process_messages(messages=messages.model_dump(), lvl_config=medium)
+class BatchItemResult(BaseModel):
+    index: int
+    response: Optional[dict[str, str]] = None
+    error: Optional[BatchItemError] = None
+
 
-    return resp
+class BatchResults(BaseModel):
+    results: list[BatchItemResult]
 
 
-@router.post("/high", status_code=status.HTTP_200_OK)
-async def high_level(messages: Messages) -> dict[str, str]:
-    resp = await process_messages(messages=messages.model_dump(), lvl_config=high)
+def _sse(event: dict[str, Any]) -> str:
+    if "delta" in event:
+        return f"data: {json.dumps(event)}\n\n"
+    return f"event: done\ndata: {json.dumps(event)}\n\n"
+
 
-    return resp
+async def _sse_events(
+    first: dict[str, Any], events: AsyncIterator[dict[str, Any]]
+) -> AsyncIterator[str]:
+    yield _sse(first)
+    async for event in events:
+        yield _sse(event)
+
+
+async def _respond(
+    messages: Messages, lvl_config: LevelConfig, stream: bool
+) -> Union[dict[str, str], StreamingResponse]:
+    if not stream:
+        return await process_messages(
+            messages=messages.model_dump(), lvl_config=lvl_config
+        )
+
+    events = stream_messages(messages=messages.model_dump(), lvl_config=lvl_config)
+    # Errors before the first event (e.g. rate limits) are returned as HTTP errors
+    first = await anext(events)
+    return StreamingResponse(_sse_events(first, events), media_type="text/event-stream")
+
+
+def _get_level(level: str) -> LevelConfig:
+    lvl_config = levels.get(level)
+    if lvl_config is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown level {level}"
+        )
+    return lvl_config
+
+
+@router.post("/{level}", status_code=status.HTTP_200_OK, response_model=dict[str, str])
+async def chat(
+    level: str, messages: Messages, stream: bool = False
+) -> Union[dict[str, str], StreamingResponse]:
+    lvl_config = _get_level(level)
+    with track_request(lvl_config.name, "chat"):
+        return await _respond(messages, lvl_config, stream)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Prometheus metrics of the tested chatbots and their OpenAI calls."""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
+@router.post(
+    "/{level}/sessions",
+    status_code=status.HTTP_201_CREATED,
+    response_model=SessionCreated,
+)
+async def create_session(level: str) -> SessionCreated:
+    """Start a conversation kept on the server."""
+    _get_level(level)
+    return SessionCreated(session_id=session_store.create(level).id)
+
+
+@router.post(
+    "/{level}/sessions/{session_id}/messages",
+    status_code=status.HTTP_200_OK,
+    response_model=dict[str, str],
+)
+async def session_message(
+    level: str, session_id: str, message: Message
+) -> dict[str, str]:
+    """Send the next user turn of a session.
+
+    The stored history is sent along with the new message. The history is
+    only extended once the response is ready, so a failed turn can be
+    retried. Turns of the same session are processed one at a time.
+    """
+    lvl_config = _get_level(level)
+    session = session_store.get(session_id, level)
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown session {session_id}",
+        )
+
+    async with session.lock:
+        with track_request(lvl_config.name, "session"):
+            user_message = message.model_dump()
+            response = await process_messages(
+                messages={"messages": [*session.messages, user_message]},
+                lvl_config=lvl_config,
+            )
+        session_store.append(session, user_message, response)
+    return response
+
+
+@router.delete("/{level}/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_session(level: str, session_id: str) -> None:
+    if not session_store.delete(session_id, level):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown session {session_id}",
+        )
+
+
+async def _process_batch_item(
+    index: int,
+    messages: Messages,
+    lvl_config: LevelConfig,
+    semaphore: asyncio.Semaphore,
+) -> BatchItemResult:
+    async with semaphore:
+        with track_request(lvl_config.name, "batch"):
+            try:
+                resp = await process_messages(
+                    messages=messages.model_dump(), lvl_config=lvl_config
+                )
+                return BatchItemResult(index=index, response=resp)
+            except HTTPException as e:
+                error = BatchItemError(status_code=e.status_code, detail=str(e.detail))
+            except Exception as e:
+                error = BatchItemError(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+                )
+        return BatchItemResult(index=index, error=error)
+
+
+async def _stream_ndjson(
+    items: Iterable[Awaitable[BatchItemResult]],
+) -> AsyncIterator[str]:
+    tasks = [asyncio.ensure_future(item) for item in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            yield json.dumps(result.model_dump(exclude_none=True)) + "\n"
+    finally:
+        # The client may disconnect before all results are streamed
+        for task in tasks:
+            task.cancel()
+
+
+@router.post(
+    "/{level}/batch",
+    status_code=status.HTTP_200_OK,
+    response_model=BatchResults,
+    response_model_exclude_none=True,
+)
+async def batch(
+    level: str, batch: BatchMessages
+) -> Union[BatchResults, StreamingResponse]:
+    """Process many conversations concurrently.
+
+    Results keep the order of the conversations, errors are reported per item.
+    With ``stream`` set, results are streamed as NDJSON in completion order.
+    """
+    lvl_config = _get_level(level)
+    if len(batch.conversations) > config.BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch size exceeds the limit of {config.BATCH_MAX_SIZE}",
+        )
+
+    semaphore = asyncio.Semaphore(min(batch.concurrency, config.BATCH_MAX_CONCURRENCY))
+    tasks = [
+        _process_batch_item(i, messages, lvl_config, semaphore)
+        for i, messages in enumerate(batch.conversations)
+    ]
+
+    if batch.stream:
+        return StreamingResponse(
+            _stream_ndjson(tasks), media_type="application/x-ndjson"
+        )
+
+    return BatchResults(results=await asyncio.gather(*tasks))
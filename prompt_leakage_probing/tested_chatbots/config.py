@@ -1,19 +1,47 @@
 from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings
 
 
 class ChatbotConfiguration(BaseSettings):
-    LOW_SYS_PROMPT_PATH: Path = Path(__file__).parent / "prompts/low.json"
-    MEDIUM_SYS_PROMPT_PATH: Path = Path(__file__).parent / "prompts/medium.json"
-    HIGH_SYS_PROMPT_PATH: Path = Path(__file__).parent / "prompts/high.json"
+    # Every <level>.json file in the directory is served under /<level>
+    PROMPTS_DIR: Path = Path(__file__).parent / "prompts"
 
     INPUT_LIMIT: Optional[int] = None
 
+    OPENAI_KEYS_PATH: Optional[Path] = None
+    # E.g. the fake OpenAI server, None for the OpenAI API
+    OPENAI_BASE_URL: Optional[str] = None
+
     MAX_RETRIES: int = 5
     INITIAL_SLEEP_TIME_S: int = 5
+    MAX_SLEEP_TIME_S: float = 60.0
+
+    CIRCUIT_BREAKER_FAILURES: int = 5
+    CIRCUIT_BREAKER_RESET_S: float = 30.0
+
+    # Assistant turns with tool calls per request, before an answer is forced
+    MAX_TOOL_ROUNDS: int = 1
+
+    BATCH_MAX_SIZE: int = 1000
+    BATCH_MAX_CONCURRENCY: int = 32
+
+    GUARDRAIL_CACHE_SIZE: int = 10_000
+    GUARDRAIL_CACHE_TTL_S: Optional[float] = None
+    GUARDRAIL_CACHE_PATH: Optional[Path] = None
+
+    # "cache" serves repeated requests from the cache, "record" always calls
+    # OpenAI and stores the responses, "replay" only serves stored responses
+    RESPONSE_CACHE_MODE: Literal["off", "cache", "record", "replay"] = "off"
+    RESPONSE_CACHE_SIZE: int = 10_000
+    RESPONSE_CACHE_PATH: Optional[Path] = None
+
+    SESSION_MAX_COUNT: int = 10_000
+    SESSION_TTL_S: Optional[float] = 3600.0
+    SESSION_MAX_BYTES: Optional[int] = 100_000_000
+    SESSION_MAX_HISTORY_MESSAGES: Optional[int] = None
 
 
 @lru_cache(maxsize=1)
@@ -0,0 +1,359 @@
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+from collections import Counter
+from collections.abc import Awaitable, Iterable, Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+import httpx
+import pandas as pd
+from prometheus_client.parser import text_string_to_metric_families
+
+from .prompt_loader import get_level_registry
+from .responses import REFUSAL_MESSAGE
+
+DEFAULT_URL = "http://localhost:8008"
+
+# Requests kept in flight in the closed loop
+DEFAULT_CONCURRENCY = 8
+
+
+@dataclass
+class RequestResult:
+    level: str
+    # 0 when no response was received, e.g. on a timeout
+    status_code: int
+    latency_s: float
+    refused: bool = False
+
+
+@dataclass
+class LevelSummary:
+    level: str
+    requests: int
+    throughput_rps: float
+    p50_s: float
+    p95_s: float
+    p99_s: float
+    error_rate: float
+    rate_452: float
+    rate_429: float
+    # Ratios of the successful responses
+    refusal_ratio: float
+    canary_block_ratio: Optional[float] = None
+    guardrail_block_ratio: Optional[float] = None
+
+
+def load_corpus(paths: Iterable[Path]) -> list[str]:
+    """Load attack prompts from JSONL files or results logs.
+
+    A JSONL line is either a string or an object with a ``prompt`` field,
+    results logs (``reports/*.csv``) contribute their ``prompt`` column.
+    """
+    prompts: list[str] = []
+    for path in paths:
+        if path.suffix == ".csv":
+            prompts.extend(pd.read_csv(path, usecols=["prompt"])["prompt"].astype(str))
+            continue
+        for line in path.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                item = json.loads(line)
+                prompts.append(item if isinstance(item, str) else item["prompt"])
+    return [prompt for prompt in prompts if prompt.strip()]
+
+
+def workload(
+    prompts: list[str], levels: list[str], requests: Optional[int], cycle: bool
+) -> Iterator[tuple[str, str]]:
+    """Every prompt against every level, optionally cycling through the corpus."""
+    pairs = [(level, prompt) for prompt in prompts for level in levels]
+    work: Iterator[tuple[str, str]] = (
+        itertools.cycle(pairs) if cycle or requests is not None else iter(pairs)
+    )
+    return work if requests is None else itertools.islice(work, requests)
+
+
+async def send_prompt(
+    client: httpx.AsyncClient, url: str, level: str, prompt: str, sent_at: float
+) -> RequestResult:
+    """Send one prompt, the latency is counted from ``sent_at``."""
+    try:
+        response = await client.post(
+            f"{url}/{level}", json={"messages": [{"role": "user", "content": prompt}]}
+        )
+    except httpx.HTTPError:
+        return RequestResult(level, 0, time.perf_counter() - sent_at)
+    latency_s = time.perf_counter() - sent_at
+    refused = (
+        response.status_code == 200
+        and response.json().get("content") == REFUSAL_MESSAGE
+    )
+    return RequestResult(level, response.status_code, latency_s, refused)
+
+
+Send = Callable[[str, str, float], Awaitable[RequestResult]]
+
+
+async def closed_loop(
+    send: Send,
+    work: Iterator[tuple[str, str]],
+    concurrency: int,
+    duration_s: Optional[float] = None,
+) -> list[RequestResult]:
+    """Keep ``concurrency`` requests in flight until the work or time runs out."""
+    deadline = None if duration_s is None else time.perf_counter() + duration_s
+    results: list[RequestResult] = []
+
+    async def worker() -> None:
+        for level, prompt in work:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            results.append(await send(level, prompt, time.perf_counter()))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+async def open_loop(
+    send: Send,
+    work: Iterator[tuple[str, str]],
+    rps: float,
+    duration_s: Optional[float] = None,
+) -> list[RequestResult]:
+    """Start requests at a fixed rate, whether or not earlier ones finished.
+
+    Latencies are counted from the scheduled start, so a server falling
+    behind shows up in the latencies instead of lowering the rate.
+    """
+    start = time.perf_counter()
+    tasks = []
+    for i, (level, prompt) in enumerate(work):
+        scheduled_at = start + i / rps
+        if duration_s is not None and scheduled_at - start >= duration_s:
+            break
+        await asyncio.sleep(max(scheduled_at - time.perf_counter(), 0))
+        tasks.append(asyncio.ensure_future(send(level, prompt, scheduled_at)))
+    return list(await asyncio.gather(*tasks))
+
+
+async def scrape_block_counts(
+    client: httpx.AsyncClient, url: str
+) -> Optional[Counter[tuple[str, str]]]:
+    """Canary blocks and BAD guardrail verdicts per level from ``/metrics``.
+
+    None if the server does not expose metrics.
+    """
+    try:
+        response = await client.get(f"{url}/metrics")
+    except httpx.HTTPError:
+        return None
+    if response.status_code != 200:
+        return None
+
+    counts: Counter[tuple[str, str]] = Counter()
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            if sample.name == "chatbot_canary_blocks_total":
+                counts[(sample.labels["level"], "canary")] += int(sample.value)
+            elif (
+                sample.name == "chatbot_guardrail_verdicts_total"
+                and sample.labels["verdict"] == "BAD"
+            ):
+                counts[(sample.labels["level"], "guardrail")] += int(sample.value)
+    return counts
+
+
+def _percentile(latencies: list[float], q: int) -> float:
+    if len(latencies) < 2:
+        return latencies[0] if latencies else 0.0
+    return statistics.quantiles(latencies, n=100, method="inclusive")[q - 1]
+
+
+def summarize(
+    results: list[RequestResult],
+    duration_s: float,
+    blocks: Optional[Counter[tuple[str, str]]] = None,
+    levels: Optional[list[str]] = None,
+) -> list[LevelSummary]:
+    """Summaries per level, in the order of ``levels``, and over all levels."""
+    by_level: dict[str, list[RequestResult]] = {level: [] for level in levels or []}
+    for result in results:
+        by_level.setdefault(result.level, []).append(result)
+
+    summaries = []
+    for level, level_results in [*by_level.items(), ("all", results)]:
+        requests = len(level_results)
+        statuses = Counter(r.status_code for r in level_results)
+        ok = statuses[200]
+        latencies = [r.latency_s for r in level_results]
+
+        counted = list(by_level) if level == "all" else [level]
+        canary = guardrail = None
+        if blocks is not None:
+            canary = sum(blocks[(name, "canary")] for name in counted) / max(ok, 1)
+            guardrail = sum(blocks[(name, "guardrail")] for name in counted) / max(
+                ok, 1
+            )
+
+        summaries.append(
+            LevelSummary(
+                level=level,
+                requests=requests,
+                throughput_rps=requests / duration_s if duration_s else 0.0,
+                p50_s=_percentile(latencies, 50),
+                p95_s=_percentile(latencies, 95),
+                p99_s=_percentile(latencies, 99),
+                error_rate=(requests - ok) / requests if requests else 0.0,
+                rate_452=statuses[452] / requests if requests else 0.0,
+                rate_429=statuses[429] / requests if requests else 0.0,
+                refusal_ratio=(
+                    sum(r.refused for r in level_results) / ok if ok else 0.0
+                ),
+                canary_block_ratio=canary,
+                guardrail_block_ratio=guardrail,
+            )
+        )
+    return summaries
+
+
+async def run_load(
+    url: str,
+    prompts: list[str],
+    levels: list[str],
+    concurrency: Optional[int] = None,
+    rps: Optional[float] = None,
+    requests: Optional[int] = None,
+    duration_s: Optional[float] = None,
+    timeout_s: float = 60.0,
+) -> list[LevelSummary]:
+    """Replay the prompts against the levels and summarize the responses.
+
+    With ``rps`` set the load is open loop and the number of connections is
+    not limited, otherwise ``concurrency`` requests are kept in flight. The
+    canary and guardrail block ratios are taken from the difference of the
+    server's ``/metrics`` before and after the run, so they assume no other
+    traffic and a single server process.
+    """
+    if not prompts:
+        raise ValueError("The corpus is empty")
+    # Without a request count or duration the corpus is sent once
+    work = workload(prompts, levels, requests, cycle=duration_s is not None)
+    concurrency = concurrency or DEFAULT_CONCURRENCY
+    limits = httpx.Limits(
+        max_connections=None if rps is not None else concurrency,
+        max_keepalive_connections=None,
+    )
+
+    async with httpx.AsyncClient(timeout=timeout_s, limits=limits) as client:
+
+        async def send(level: str, prompt: str, sent_at: float) -> RequestResult:
+            return await send_prompt(client, url, level, prompt, sent_at)
+
+        before = await scrape_block_counts(client, url)
+        start = time.perf_counter()
+        if rps is not None:
+            results = await open_loop(send, work, rps, duration_s)
+        else:
+            results = await closed_loop(send, work, concurrency, duration_s)
+        duration = time.perf_counter() - start
+        after = await scrape_block_counts(client, url)
+
+    blocks = after - before if before is not None and after is not None else None
+    return summarize(results, duration, blocks, levels)
+
+
+def _ratio(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.1%}"
+
+
+def render_summaries(summaries: list[LevelSummary]) -> str:
+    """Render the summaries as a markdown table."""
+    lines = [
+        "| Level | Requests | Throughput (req/s) | p50 (s) | p95 (s) | p99 (s) "
+        "| Errors | 452 | 429 | Refused | Canary Blocks | Guardrail Blocks |",
+        "|-------|----------|--------------------|---------|---------|---------"
+        "|--------|-----|-----|---------|---------------|------------------|",
+    ]
+    lines.extend(
+        f"| {s.level} | {s.requests} | {s.throughput_rps:.2f} | {s.p50_s:.3f} | "
+        f"{s.p95_s:.3f} | {s.p99_s:.3f} | {s.error_rate:.1%} | {s.rate_452:.1%} | "
+        f"{s.rate_429:.1%} | {s.refusal_ratio:.1%} | "
+        f"{_ratio(s.canary_block_ratio)} | {_ratio(s.guardrail_block_ratio)} |"
+        for s in summaries
+    )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[list[str]] = None) -> list[LevelSummary]:
+    parser = argparse.ArgumentParser(
+        description="Replay attack prompts against the tested chatbots."
+    )
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument(
+        "--corpus",
+        nargs="+",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="JSONL files of prompts or results logs, reports/*.csv by default.",
+    )
+    parser.add_argument(
+        "--levels",
+        nargs="+",
+        default=None,
+        help="The levels to load, by default every level in the prompts directory.",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help=f"Closed loop: requests kept in flight, {DEFAULT_CONCURRENCY} by default.",
+    )
+    mode.add_argument(
+        "--rps",
+        type=float,
+        default=None,
+        help="Open loop: requests started per second.",
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=None,
+        help="Requests to send, by default the corpus is sent once to every level.",
+    )
+    parser.add_argument("--duration", type=float, default=None, help="In seconds.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="In seconds.")
+    parser.add_argument(
+        "--output", type=Path, default=None, help="Write the summaries as JSON."
+    )
+    args = parser.parse_args(argv)
+
+    corpus = args.corpus or sorted(Path("reports").glob("*.csv"))
+    summaries = asyncio.run(
+        run_load(
+            args.url,
+            load_corpus(corpus),
+            args.levels or get_level_registry().names(),
+            concurrency=args.concurrency,
+            rps=args.rps,
+            requests=args.requests,
+            duration_s=args.duration,
+            timeout_s=args.timeout,
+        )
+    )
+    print(render_summaries(summaries))  # noqa: T201
+    if args.output is not None:
+        args.output.write_text(
+            json.dumps([asdict(s) for s in summaries], indent=2) + "\n"
+        )
+    return summaries
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+REGISTRY = CollectorRegistry()
+
+# OpenAI calls take seconds, a whole request with tool calls and guardrail more
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+REQUEST_LATENCY = Histogram(
+    "chatbot_request_duration_seconds",
+    "Time to answer a request, up to the first event for streamed responses.",
+    ["level", "endpoint"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "chatbot_requests_in_flight",
+    "Requests being answered.",
+    ["level", "endpoint"],
+    registry=REGISTRY,
+)
+CANARY_BLOCKS = Counter(
+    "chatbot_canary_blocks_total",
+    "Responses refused because they contained a canary word.",
+    ["level"],
+    registry=REGISTRY,
+)
+GUARDRAIL_VERDICTS = Counter(
+    "chatbot_guardrail_verdicts_total",
+    "Guardrail verdicts, cached ones included.",
+    ["level", "verdict"],
+    registry=REGISTRY,
+)
+
+UPSTREAM_CALLS = Counter(
+    "openai_calls_total",
+    "OpenAI completion attempts by purpose (main, tool_follow_up, guardrail).",
+    ["purpose", "outcome"],
+    registry=REGISTRY,
+)
+UPSTREAM_LATENCY = Histogram(
+    "openai_call_duration_seconds",
+    "Duration of OpenAI completion attempts, including consuming streams.",
+    ["purpose"],
+    buckets=LATENCY_BUCKETS,
+    registry=REGISTRY,
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "openai_calls_in_flight",
+    "OpenAI completion attempts in flight.",
+    ["purpose"],
+    registry=REGISTRY,
+)
+UPSTREAM_RETRIES = Counter(
+    "openai_retries_total",
+    "OpenAI completion attempts that are retried, by error.",
+    ["purpose", "error"],
+    registry=REGISTRY,
+)
+
+KEY_WAIT = Histogram(
+    "openai_key_wait_seconds",
+    "Time spent waiting for a free API key slot.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0),
+    registry=REGISTRY,
+)
+KEY_IN_FLIGHT = Gauge(
+    "openai_key_in_flight",
+    "Requests in flight per API key.",
+    ["key"],
+    registry=REGISTRY,
+)
+
+
+@contextmanager
+def track_request(level: str, endpoint: str) -> Iterator[None]:
+    """Time a request and count it as in flight meanwhile."""
+    in_flight = REQUESTS_IN_FLIGHT.labels(level, endpoint)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        in_flight.dec()
+        REQUEST_LATENCY.labels(level, endpoint).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def track_upstream_call(purpose: str) -> Iterator[None]:
+    """Count and time one OpenAI attempt, 429 responses count as rate limited."""
+    in_flight = UPSTREAM_IN_FLIGHT.labels(purpose)
+    in_flight.inc()
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException as e:
+        outcome = "rate_limited" if getattr(e, "status_code", None) == 429 else "error"
+        raise
+    finally:
+        in_flight.dec()
+        UPSTREAM_LATENCY.labels(purpose).observe(time.perf_counter() - start)
+        UPSTREAM_CALLS.labels(purpose, outcome).inc()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Return the metrics in the Prometheus text format and its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
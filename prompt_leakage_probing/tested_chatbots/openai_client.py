@@ -1,11 +1,25 @@
-from asyncio import Queue
+import asyncio
+import re
+import time
+from collections import deque
 from contextlib import AsyncContextDecorator
 from functools import lru_cache
 from os import environ
+from typing import Optional
 
-from openai import AsyncOpenAI
+import httpx
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from pydantic import BaseModel
 
+from .config import get_config
+from .metrics import KEY_IN_FLIGHT, KEY_WAIT
+
+DEFAULT_PARK_TIME_S = 1.0
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
 
 class OpenAIGPTConfig(BaseModel):
     api_key: str
@@ -16,52 +30,341 @@ class JSONConfig(BaseModel):
     batch_size: int = 1
 
 
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset durations such as ``"20ms"``, ``"1s"`` or ``"6m0s"``."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breakers of all keys are open."""
+
+
+class CircuitBreaker:
+    """Take a key out of rotation after consecutive upstream failures.
+
+    After ``failure_threshold`` failures in a row the breaker opens for
+    ``reset_timeout_s``. Then a single trial request is let through, which
+    closes the breaker on success or opens it again on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        """Initialize a closed breaker."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    def is_open(self, now: float) -> bool:
+        """True while the breaker rejects requests outright."""
+        return (
+            self.opened_at is not None and now - self.opened_at < self.reset_timeout_s
+        )
+
+    def available_at(self, now: float) -> float:
+        if self.opened_at is None:
+            return now
+        if self.trial_in_flight:
+            return float("inf")
+        return self.opened_at + self.reset_timeout_s
+
+    def on_dispatch(self) -> None:
+        if self.opened_at is not None:
+            self.trial_in_flight = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self, now: float) -> None:
+        self.failures += 1
+        if self.trial_in_flight or self.failures >= self.failure_threshold:
+            self.opened_at = now
+        self.trial_in_flight = False
+
+
+class RateLimitBucket:
+    """Remaining capacity of one rate limit as reported by the upstream.
+
+    Between responses the capacity is assumed to refill linearly until the
+    reported reset time.
+    """
+
+    def __init__(self) -> None:
+        """Initialize an unknown (unlimited) bucket."""
+        self.limit: Optional[int] = None
+        self.remaining: Optional[float] = None
+        self.reset_at = 0.0
+        self.updated_at = 0.0
+
+    def update(
+        self,
+        limit: Optional[str],
+        remaining: Optional[str],
+        reset: Optional[str],
+        now: float,
+    ) -> None:
+        if limit is None or remaining is None:
+            return
+        try:
+            self.limit = int(limit)
+            self.remaining = float(remaining)
+        except ValueError:
+            return
+        self.reset_at = now + (parse_reset_duration(reset) or 0.0)
+        self.updated_at = now
+
+    def consume(self, amount: float = 1.0) -> None:
+        if self.remaining is not None:
+            self.remaining = max(self.remaining - amount, 0.0)
+
+    def estimated_remaining(self, now: float) -> Optional[float]:
+        if self.limit is None or self.remaining is None:
+            return None
+        if now >= self.reset_at:
+            return float(self.limit)
+        refill_window = self.reset_at - self.updated_at
+        refilled = (self.limit - self.remaining) * (now - self.updated_at)
+        return self.remaining + refilled / refill_window
+
+    def headroom(self, now: float) -> float:
+        """Fraction of the limit that is currently available."""
+        remaining = self.estimated_remaining(now)
+        if remaining is None or not self.limit:
+            return 1.0
+        return remaining / self.limit
+
+
+class KeyState:
+    """Client and rate limit state of a single API key."""
+
+    def __init__(
+        self,
+        name: str,
+        api_key: str,
+        batch_size: int,
+        breaker: Optional[CircuitBreaker] = None,
+        base_url: Optional[str] = None,
+    ) -> None:
+        """Create the client, its responses update the key's buckets.
+
+        The client does not retry by itself, retries are left to the caller so
+        that the key is not held while backing off.
+        """
+        self.name = name
+        self.batch_size = batch_size
+        self.in_flight = 0
+        self.parked_until = 0.0
+        self.requests = RateLimitBucket()
+        self.tokens = RateLimitBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                event_hooks={"response": [self._on_response]}
+            ),
+        )
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        self.observe(response.status_code, response.headers)
+
+    def observe(
+        self, status_code: int, headers: httpx.Headers, now: Optional[float] = None
+    ) -> None:
+        """Update the buckets from the ``x-ratelimit-*`` headers of a response."""
+        now = time.monotonic() if now is None else now
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            bucket.update(
+                headers.get(f"x-ratelimit-limit-{kind}"),
+                headers.get(f"x-ratelimit-remaining-{kind}"),
+                headers.get(f"x-ratelimit-reset-{kind}"),
+                now,
+            )
+        if status_code == 429:
+            self.park(_retry_after(headers) or DEFAULT_PARK_TIME_S, now)
+
+    def park(self, seconds: float, now: Optional[float] = None) -> None:
+        """Take the key out of rotation for the given number of seconds."""
+        now = time.monotonic() if now is None else now
+        self.parked_until = max(self.parked_until, now + seconds)
+
+    def available_at(self, now: float) -> float:
+        """Time at which the key can take another request."""
+        available_at = max(self.parked_until, self.breaker.available_at(now))
+        for bucket in (self.requests, self.tokens):
+            remaining = bucket.estimated_remaining(now)
+            if remaining is not None and remaining < 1:
+                available_at = max(available_at, bucket.reset_at)
+        return available_at
+
+    def headroom(self, now: float) -> float:
+        if self.in_flight >= self.batch_size or self.available_at(now) > now:
+            return 0.0
+        free_slots = 1 - self.in_flight / self.batch_size
+        return min(self.requests.headroom(now), self.tokens.headroom(now), free_slots)
+
+
+def _retry_after(headers: httpx.Headers) -> Optional[float]:
+    retry_after_ms = headers.get("retry-after-ms")
+    retry_after = headers.get("retry-after")
+    try:
+        if retry_after_ms is not None:
+            return float(retry_after_ms) / 1000
+        if retry_after is not None:
+            return float(retry_after)
+    except ValueError:
+        pass
+    return None
+
+
 class OpenAIClientWrapper(AsyncContextDecorator):
-    def __init__(self, queue: Queue[AsyncOpenAI]) -> None:
+    def __init__(self, robin: "GPTRobin") -> None:
         """OpenAIClientWrapper."""
         self.client: AsyncOpenAI | None = None
-        self.queue: Queue[AsyncOpenAI] = queue
+        self.robin = robin
+        self.key: Optional[KeyState] = None
 
     async def __aenter__(self):  # type: ignore
         """__aenter__ method."""
-        self.client = await self.queue.get()
+        self.key = await self.robin.acquire()
+        self.client = self.key.client
         return self.client
 
-    async def __aexit__(self, *exc):  # type: ignore
+    async def __aexit__(self, exc_type, exc, tb):  # type: ignore
         """__aexit__ method."""
-        if self.client:
-            await self.queue.put(self.client)
+        if self.key:
+            self.robin.release(self.key, exc)
+            self.key = None
 
 
 class GPTRobin:
+    """Schedule requests over several API keys.
+
+    Every key has request and token buckets fed from the ``x-ratelimit-*``
+    response headers and at most ``batch_size`` requests in flight. A request
+    goes to the key with the most headroom; a key that got a 429 is parked
+    until its ``Retry-After`` has passed. Keys with an open circuit breaker
+    are skipped, and once every breaker is open requests fail fast with
+    ``CircuitOpenError`` instead of queueing.
+    """
+
     def __init__(
         self,
         GPTs_to_use: list[OpenAIGPTConfig],  # noqa: N803
         batch_size: int = 1,
+        failure_threshold: int = 5,
+        reset_timeout_s: float = 30.0,
+        base_url: Optional[str] = None,
     ) -> None:
         """GPTRobin."""
+        if not GPTs_to_use:
+            raise ValueError("At least one API key is required")
         self.batch_size = batch_size
-        self.client_queue = Queue()  # type: ignore
-        clients = [
-            AsyncOpenAI(
-                api_key=gpt.api_key,
+        self.keys = [
+            KeyState(
+                f"key-{i}",
+                gpt.api_key,
+                batch_size,
+                CircuitBreaker(failure_threshold, reset_timeout_s),
+                base_url,
             )
-            for gpt in GPTs_to_use
+            for i, gpt in enumerate(GPTs_to_use)
         ]
-        for _ in range(batch_size):
-            for c in clients:
-                self.client_queue.put_nowait(c)
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    def _select(self, now: float) -> Optional[KeyState]:
+        best = max(self.keys, key=lambda k: (k.headroom(now), -k.in_flight))
+        return best if best.headroom(now) > 0 else None
+
+    def _next_available_at(self, now: float) -> Optional[float]:
+        """Earliest time a key frees up without waiting for a release."""
+        times = [k.available_at(now) for k in self.keys if k.in_flight < k.batch_size]
+        available_at = min(times, default=None)
+        return None if available_at == float("inf") else available_at
+
+    async def acquire(self) -> KeyState:
+        """Wait for the key with the most headroom and reserve a slot on it."""
+        loop = asyncio.get_running_loop()
+        started_at = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if all(k.breaker.is_open(now) for k in self.keys):
+                raise CircuitOpenError("The upstream is failing for all API keys")
+            key = self._select(now)
+            if key is not None:
+                key.in_flight += 1
+                key.requests.consume()
+                key.breaker.on_dispatch()
+                KEY_WAIT.observe(now - started_at)
+                KEY_IN_FLIGHT.labels(key.name).set(key.in_flight)
+                return key
+
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            available_at = self._next_available_at(now)
+            timeout = None if available_at is None else max(available_at - now, 0)
+            try:
+                await asyncio.wait([waiter], timeout=timeout)
+            except asyncio.CancelledError:
+                # Pass on a wake up that this request can no longer use
+                if waiter.done():
+                    self._wake_next()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def _wake_next(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def release(self, key: KeyState, exc: Optional[BaseException] = None) -> None:
+        """Free the slot and wake up one waiting request.
+
+        Connection errors and 5xx responses count as failures for the key's
+        circuit breaker, a request without an error as a success.
+        """
+        key.in_flight -= 1
+        KEY_IN_FLIGHT.labels(key.name).set(key.in_flight)
+        if exc is None:
+            key.breaker.record_success()
+        elif isinstance(exc, (openai.APIConnectionError, openai.InternalServerError)):
+            key.breaker.record_failure(time.monotonic())
+        else:
+            key.breaker.trial_in_flight = False
+        self._wake_next()
 
     def get_client(self) -> OpenAIClientWrapper:
-        return OpenAIClientWrapper(self.client_queue)
+        return OpenAIClientWrapper(self)
+
+
+def load_gpt_configs() -> JSONConfig:
+    """Load the API keys from ``OPENAI_KEYS_PATH`` or ``OPENAI_API_KEY``."""
+    keys_path = get_config().OPENAI_KEYS_PATH
+    if keys_path is not None:
+        return JSONConfig.model_validate_json(keys_path.read_text())
+    return JSONConfig(list_of_GPTs=[OpenAIGPTConfig(api_key=environ["OPENAI_API_KEY"])])
 
 
 @lru_cache(maxsize=1)
-def get_gpt_robin():  # type: ignore
-    robin = GPTRobin(
-        GPTs_to_use=[
-            OpenAIGPTConfig(api_key=environ["OPENAI_API_KEY"]),
-        ],
-        batch_size=1,
+def get_gpt_robin() -> GPTRobin:
+    config = get_config()
+    gpt_configs = load_gpt_configs()
+    return GPTRobin(
+        GPTs_to_use=gpt_configs.list_of_GPTs,
+        batch_size=gpt_configs.batch_size,
+        failure_threshold=config.CIRCUIT_BREAKER_FAILURES,
+        reset_timeout_s=config.CIRCUIT_BREAKER_RESET_S,
+        base_url=config.OPENAI_BASE_URL,
     )
-    return robin
@@ -1,7 +1,15 @@
 import json
 import os
 import random
+import re
+import threading
 from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from .canary import CanaryMatcher
+from .config import get_config
 
 functions = [
     {
@@ -19,7 +27,7 @@ functions = [
                     "description": "Number of dealerships to return.",
                 },
             },
-            "required": ["city", "number"],
+            "required": ["city", "count"],
         },
     }
 ]
@@ -64,6 +72,22 @@ class LevelConfig:
     guardrail_prompt: str
     canary_words: list[str] = field(default_factory=list)
     use_guardrails: bool = field(default=False)
+    canary_case_insensitive: bool = field(default=False)
+    canary_normalize_unicode: bool = field(default=False)
+    name: str = field(default="")
+    canary_matcher: CanaryMatcher = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        """Compile the canary words once when the level is loaded."""
+        object.__setattr__(
+            self,
+            "canary_matcher",
+            CanaryMatcher(
+                self.canary_words,
+                case_insensitive=self.canary_case_insensitive,
+                normalize_unicode=self.canary_normalize_unicode,
+            ),
+        )
 
 
 def get_level_config(sys_prompt_path: os.PathLike) -> LevelConfig:  # type: ignore
@@ -91,4 +115,53 @@ def get_level_config(sys_prompt_path: os.PathLike) -> LevelConfig:  # type: igno
         guardrail_prompt=guardrail_system_prompt,
         canary_words=level_config["canary_words"],
         use_guardrails=level_config["user_guardrail"],
+        canary_case_insensitive=level_config.get("canary_case_insensitive", False),
+        canary_normalize_unicode=level_config.get("canary_normalize_unicode", False),
+        name=sys_prompt_path.stem,  # type: ignore
     )
+
+
+class LevelRegistry:
+    """Levels defined by the ``*.json`` files in a directory.
+
+    A level is loaded on first use and reloaded when its file changes, so
+    levels can be added or edited without restarting the service.
+    """
+
+    _NAME = re.compile(r"^[\w-]+$")
+
+    def __init__(self, prompts_dir: Path) -> None:
+        """Initialize the registry without loading any level."""
+        self.prompts_dir = Path(prompts_dir)
+        self._levels: dict[str, tuple[int, LevelConfig]] = {}
+        self._lock = threading.Lock()
+
+    def names(self) -> list[str]:
+        return sorted(path.stem for path in self.prompts_dir.glob("*.json"))
+
+    def get(self, name: str) -> Optional[LevelConfig]:
+        """Return the level, or None if there is no such level."""
+        if not self._NAME.match(name):
+            return None
+        path = self.prompts_dir / f"{name}.json"
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._levels.pop(name, None)
+            return None
+
+        with self._lock:
+            cached = self._levels.get(name)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+
+        level = get_level_config(path)
+        with self._lock:
+            self._levels[name] = (mtime_ns, level)
+        return level
+
+
+@lru_cache(maxsize=1)
+def get_level_registry() -> LevelRegistry:
+    return LevelRegistry(get_config().PROMPTS_DIR)
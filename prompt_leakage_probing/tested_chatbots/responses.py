@@ -0,0 +1,2 @@
+# Shared by the tested chatbots and their clients, without importing the service
+REFUSAL_MESSAGE = "I cannot assist with this request."
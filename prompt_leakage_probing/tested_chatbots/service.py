@@ -1,25 +1,54 @@
 import asyncio
-import json
+import random
+import time
 import traceback
-from typing import Any
+from collections.abc import AsyncIterator, Awaitable
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Optional
 
 import openai
 from fastapi import HTTPException, status
+from openai import AsyncOpenAI, AsyncStream
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from openai.types.chat.chat_completion_chunk import ChoiceDeltaToolCall
 
+from .cache import (
+    canonical_hash,
+    content_hash,
+    get_guardrail_cache,
+    get_response_cache,
+    normalize_text,
+)
+from .canary import IncrementalCanaryScanner
 from .config import get_config
-from .openai_client import get_gpt_robin
-from .prompt_loader import LevelConfig, functions, generate_random_addresses
+from .metrics import (
+    CANARY_BLOCKS,
+    GUARDRAIL_VERDICTS,
+    UPSTREAM_RETRIES,
+    track_upstream_call,
+)
+from .openai_client import CircuitOpenError, GPTRobin, get_gpt_robin
+from .prompt_loader import LevelConfig
+from .responses import REFUSAL_MESSAGE
+from .tools import get_tool_registry
 
 config = get_config()
 
-gpt_robin = get_gpt_robin()
+# The OpenAI clients are created on the first request, None means the shared ones
+gpt_robin: Optional[GPTRobin] = None
+
+guardrail_cache = get_guardrail_cache()
+
+response_cache = get_response_cache()
+
+tools = get_tool_registry()
 
 model = "gpt-4o-mini"
 
 
-async def process_messages(  # noqa: C901
+def _prepare_chat_messages(
     messages: dict[str, Any], lvl_config: LevelConfig
-) -> dict[str, Any]:
+) -> list[Any]:
     chat_messages: list = messages.get("messages")  # type: ignore
     if chat_messages is None:
         raise HTTPException(
@@ -36,85 +65,377 @@ async def process_messages(  # noqa: C901
         )
 
     chat_messages.insert(0, {"role": "system", "content": lvl_config.system_prompt})
+    return chat_messages
+
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+@asynccontextmanager
+async def _acquire_client() -> AsyncIterator[AsyncOpenAI]:
+    try:
+        async with (gpt_robin or get_gpt_robin()).get_client() as client:
+            yield client
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="OpenAI is currently unavailable",
+        ) from e
+
+
+async def _backoff(attempt: int, error: Exception, purpose: str) -> None:
+    """Sleep before the next attempt or give up after the last one.
+
+    The sleep is drawn uniformly up to an exponentially growing cap (full
+    jitter) so that retries of concurrent requests do not line up.
+    """
+    if attempt >= config.MAX_RETRIES:
+        if isinstance(error, openai.RateLimitError):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="You reached OpenAI rate limit",
+            ) from error
+        raise error
+    UPSTREAM_RETRIES.labels(purpose, type(error).__name__).inc()
+    cap = min(config.INITIAL_SLEEP_TIME_S * 2 ** (attempt - 1), config.MAX_SLEEP_TIME_S)
+    await asyncio.sleep(random.uniform(0, cap))  # nosec
+
+
+async def _through_response_cache(
+    request: dict[str, Any], call: Callable[[], Awaitable[Any]]
+) -> Any:
+    """Return the result of ``call`` according to ``RESPONSE_CACHE_MODE``.
+
+    The key is a canonical hash of the request, which includes the level's
+    system prompt. Results must be JSON serializable.
+    """
+    mode = config.RESPONSE_CACHE_MODE
+    if mode == "off":
+        return await call()
+
+    key = canonical_hash(request)
+    if mode != "record":
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+        if mode == "replay":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No recorded response for this request",
+            )
+
+    result = await call()
+    response_cache.set(key, result)
+    return result
+
+
+async def _create_completion(purpose: str, **kwargs: Any) -> ChatCompletion:
+    """Create a completion through the response cache.
+
+    The ``purpose`` (main, tool_follow_up or guardrail) labels the metrics.
+    """
+    if config.RESPONSE_CACHE_MODE == "off":
+        return await _request_completion(purpose, **kwargs)
+
+    async def request() -> dict[str, Any]:
+        return (await _request_completion(purpose, **kwargs)).model_dump(mode="json")
+
+    return ChatCompletion.model_validate(
+        await _through_response_cache({"model": model, **kwargs}, request)
+    )
+
+
+def _tool_choice(tool_round: int) -> str:
+    # The model has to answer once the tool rounds are used up
+    return "auto" if tool_round < config.MAX_TOOL_ROUNDS else "none"
+
+
+def _purpose(tool_round: int) -> str:
+    return "main" if tool_round == 0 else "tool_follow_up"
+
+
+def _chat_request(chat_messages: list[Any], tool_choice: str) -> dict[str, Any]:
+    """Arguments of a chat completion with the tools, streamed or not."""
+    return {
+        "messages": chat_messages,
+        "tools": tools.definitions(),
+        "tool_choice": tool_choice,
+        "parallel_tool_calls": True,
+    }
+
+
+async def _call_tools(chat_messages: list[Any], calls: list[dict[str, Any]]) -> None:
+    """Run the tool calls of an assistant turn concurrently.
+
+    The assistant turn and the tool results are appended to the messages.
+    Results are cached like completions, so replayed follow-ups match.
+    """
+
+    async def call(name: str, arguments: str) -> str:
+        async def run() -> str:
+            return await tools.call(name, arguments)
+
+        return await _through_response_cache(  # type: ignore[no-any-return]
+            {"tool": name, "arguments": arguments}, run
+        )
+
+    results = await asyncio.gather(
+        *(call(c["function"]["name"], c["function"]["arguments"]) for c in calls)
+    )
+    chat_messages.append({"role": "assistant", "content": None, "tool_calls": calls})
+    chat_messages.extend(
+        {"role": "tool", "tool_call_id": c["id"], "content": result}
+        for c, result in zip(calls, results, strict=True)
+    )
+
 
-    sleep_time = config.INITIAL_SLEEP_TIME_S
+async def _request_completion(purpose: str, **kwargs: Any) -> ChatCompletion:
+    """Create a completion, retrying on rate limits and upstream errors.
+
+    The API key is released while backing off, so the retry may run on a
+    different key and the key is free for other requests in the meantime.
+    """
     attempt = 0
+    while True:
+        attempt += 1
+        try:
+            async with _acquire_client() as client:
+                with track_upstream_call(purpose):
+                    return await client.chat.completions.create(model=model, **kwargs)  # type: ignore[no-any-return]
+        except RETRYABLE_ERRORS as e:
+            await _backoff(attempt, e, purpose)
 
-    async with gpt_robin.get_client() as client:
-        while attempt < config.MAX_RETRIES:
-            attempt += 1
-            try:
-                response = await client.chat.completions.create(
-                    model=model,
-                    messages=chat_messages,
-                    functions=functions,
-                    function_call="auto",
-                )
-
-                if response.choices[0].finish_reason == "function_call":
-                    chat_messages.append(response.choices[0].message)
-                    tool_call = response.choices[0].message.function_call
-                    fun_args = json.loads(tool_call.arguments)
-                    res = generate_random_addresses(**fun_args)
-
-                    chat_messages.append(
-                        {
-                            "role": "function",
-                            "content": json.dumps(res),
-                            "name": "get_store_locations",
-                        }
-                    )
-                    response = await client.chat.completions.create(
+
+async def process_messages(
+    messages: dict[str, Any], lvl_config: LevelConfig
+) -> dict[str, Any]:
+    chat_messages = _prepare_chat_messages(messages, lvl_config)
+
+    try:
+        for tool_round in range(config.MAX_TOOL_ROUNDS + 1):
+            response = await _create_completion(
+                _purpose(tool_round),
+                **_chat_request(chat_messages, _tool_choice(tool_round)),
+            )
+            tool_calls = response.choices[0].message.tool_calls
+            if not tool_calls:
+                break
+            await _call_tools(
+                chat_messages,
+                [call.model_dump(exclude_none=True) for call in tool_calls],
+            )
+
+        if lvl_config.canary_matcher.find(response.choices[0].message.content):
+            CANARY_BLOCKS.labels(lvl_config.name).inc()
+            return {
+                "role": "assistant",
+                "content": REFUSAL_MESSAGE,
+            }
+
+        if lvl_config.use_guardrails and not await _guardrail_verdict(
+            lvl_config,
+            response.choices[0].message.content,  # type: ignore[arg-type]
+        ):
+            return {
+                "role": "assistant",
+                "content": REFUSAL_MESSAGE,
+            }
+        return {
+            "role": "assistant",
+            "content": response.choices[0].message.content,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc(e)  # type: ignore
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Unexpected exception happened {e}",
+        ) from e
+
+
+async def _guardrail_verdict(lvl_config: LevelConfig, content: str) -> bool:
+    """Return True if the guardrail considers the response GOOD.
+
+    Verdicts are cached by level and normalized response text, so repeated
+    responses (refusals, greetings) skip the guardrail completion.
+    """
+    key = content_hash(lvl_config.guardrail_prompt, normalize_text(content))
+    verdict = guardrail_cache.get(key)
+    if verdict is None:
+        guard_messages = [
+            {"role": "system", "content": lvl_config.guardrail_prompt},
+            {"role": "user", "content": content},
+        ]
+        guard_response = await _create_completion("guardrail", messages=guard_messages)
+        verdict = guard_response.choices[0].message.content == "GOOD"
+        guardrail_cache.set(key, verdict)
+
+    GUARDRAIL_VERDICTS.labels(lvl_config.name, "GOOD" if verdict else "BAD").inc()
+    return verdict
+
+
+@asynccontextmanager
+async def _open_stream(
+    chat_messages: list[Any], tool_choice: str, purpose: str
+) -> AsyncIterator[AsyncStream[ChatCompletionChunk]]:
+    """Open a completion stream, retrying like ``_create_completion``.
+
+    The key is held while the stream is consumed. Errors raised after the
+    stream was opened are not retried.
+    """
+    attempt = 0
+    opened = False
+    while True:
+        attempt += 1
+        try:
+            async with _acquire_client() as client:
+                with track_upstream_call(purpose):
+                    stream = await client.chat.completions.create(  # type: ignore[call-overload]
                         model=model,
-                        messages=chat_messages,
-                        functions=functions,
-                        function_call=None,  # Disabling calling function again
+                        stream=True,
+                        **_chat_request(chat_messages, tool_choice),
                     )
+                    opened = True
+                    yield stream  # type: ignore[misc]
+                    return
+        except RETRYABLE_ERRORS as e:
+            if opened:
+                raise
+            await _backoff(attempt, e, purpose)
 
-                for w in lvl_config.canary_words:
-                    if w in response.choices[0].message.content:
-                        return {
-                            "role": "assistant",
-                            "content": "I cannot assist with this request.",
-                        }
-
-                if lvl_config.use_guardrails:
-                    guard_messages = [
-                        {"role": "system", "content": lvl_config.guardrail_prompt},
-                        {
-                            "role": "user",
-                            "content": response.choices[0].message.content,
-                        },
-                    ]
-
-                    guard_response = await client.chat.completions.create(
-                        model=model, messages=guard_messages
-                    )
 
-                    if guard_response.choices[0].message.content == "GOOD":
-                        return {
-                            "role": "assistant",
-                            "content": response.choices[0].message.content,
-                        }
-                    return {
+def _merge_tool_call_deltas(
+    tool_calls: dict[int, dict[str, Any]], deltas: list[ChoiceDeltaToolCall]
+) -> None:
+    """Assemble streamed tool calls, whose arguments arrive in fragments."""
+    for delta in deltas:
+        call = tool_calls.setdefault(
+            delta.index,
+            {"id": "", "type": "function", "function": {"name": "", "arguments": ""}},
+        )
+        call["id"] += delta.id or ""
+        if delta.function is not None:
+            call["function"]["name"] += delta.function.name or ""
+            call["function"]["arguments"] += delta.function.arguments or ""
+
+
+def _record_streamed_completion(
+    chat_messages: list[Any],
+    tool_choice: str,
+    content: str,
+    tool_calls: list[dict[str, Any]],
+) -> None:
+    """Store a streamed response as the completion ``process_messages`` requests.
+
+    Only in the ``cache`` and ``record`` response cache modes, so a recorded
+    streaming run can be replayed.
+    """
+    if config.RESPONSE_CACHE_MODE not in ("cache", "record"):
+        return
+    message: dict[str, Any] = {"role": "assistant", "content": content or None}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    response_cache.set(
+        canonical_hash({"model": model, **_chat_request(chat_messages, tool_choice)}),
+        {
+            "id": "streamed",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "tool_calls" if tool_calls else "stop",
+                    "message": message,
+                }
+            ],
+        },
+    )
+
+
+async def stream_messages(  # noqa: C901
+    messages: dict[str, Any], lvl_config: LevelConfig
+) -> AsyncIterator[dict[str, Any]]:
+    """Stream the response as it is generated.
+
+    Yields ``{"delta": ...}`` events followed by a final
+    ``{"role": "assistant", "content": ..., "blocked": ...}`` event. Text is
+    scanned for canary words as it arrives and the upstream stream is closed
+    as soon as one is found. For levels with guardrails the response is only
+    released after the guardrail verdict, so nothing is streamed before it.
+
+    In the ``replay`` response cache mode the recorded response is sent as a
+    single delta, without calling OpenAI. In the ``cache`` and ``record``
+    modes the streamed responses are recorded for it.
+    """
+    if config.RESPONSE_CACHE_MODE == "replay":
+        response = await process_messages(messages, lvl_config)
+        blocked = response["content"] == REFUSAL_MESSAGE
+        if not blocked:
+            yield {"delta": response["content"]}
+        yield {**response, "blocked": blocked}
+        return
+
+    chat_messages = _prepare_chat_messages(messages, lvl_config)
+    scanner = IncrementalCanaryScanner(lvl_config.canary_matcher)
+    release = not lvl_config.use_guardrails
+
+    for tool_round in range(config.MAX_TOOL_ROUNDS + 1):
+        content: list[str] = []
+        tool_calls: dict[int, dict[str, Any]] = {}
+        tool_choice = _tool_choice(tool_round)
+        async with _open_stream(
+            chat_messages, tool_choice, _purpose(tool_round)
+        ) as stream:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                _merge_tool_call_deltas(tool_calls, choice.delta.tool_calls or [])
+                if not choice.delta.content:
+                    continue
+
+                content.append(choice.delta.content)
+                released = scanner.feed(choice.delta.content)
+                if scanner.matched is not None:
+                    await stream.close()
+                    # The recorded part contains the canary, so it is replayed
+                    # as blocked too
+                    _record_streamed_completion(
+                        chat_messages, tool_choice, "".join(content), []
+                    )
+                    CANARY_BLOCKS.labels(lvl_config.name).inc()
+                    yield {
                         "role": "assistant",
-                        "content": "I cannot assist with this request.",
+                        "content": REFUSAL_MESSAGE,
+                        "blocked": True,
                     }
-                return {
-                    "role": "assistant",
-                    "content": response.choices[0].message.content,
-                }
+                    return
+                if released and release:
+                    yield {"delta": released}
 
-            except openai.RateLimitError:
-                await asyncio.sleep(sleep_time)
-                sleep_time *= 2
-            except Exception as e:
-                traceback.print_exc(e)  # type: ignore
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Unexpected exception happened {e}",
-                ) from e
-    raise HTTPException(
-        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-        detail="You reached OpenAI rate limit",
-    )
+        calls = [tool_calls[i] for i in sorted(tool_calls)]
+        _record_streamed_completion(chat_messages, tool_choice, "".join(content), calls)
+        if not calls:
+            break
+        await _call_tools(chat_messages, calls)
+
+    full_content = "".join(content)
+    if lvl_config.use_guardrails and not await _guardrail_verdict(
+        lvl_config, full_content
+    ):
+        yield {"role": "assistant", "content": REFUSAL_MESSAGE, "blocked": True}
+        return
+
+    remainder = scanner.finish()
+    if remainder and release:
+        yield {"delta": remainder}
+    if not release:
+        yield {"delta": full_content}
+    yield {"role": "assistant", "content": full_content, "blocked": False}
@@ -0,0 +1,138 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Optional
+
+from .config import get_config
+
+
+def message_size(message: dict[str, Any]) -> int:
+    """Approximate memory held by a message, the UTF-8 size of its text."""
+    return len(message.get("role", "").encode()) + len(
+        (message.get("content") or "").encode()
+    )
+
+
+@dataclass
+class Session:
+    """A conversation with one level, without the level's system prompt.
+
+    The system prompt is inserted by ``process_messages`` on every turn.
+    """
+
+    id: str
+    level: str
+    messages: list[dict[str, Any]] = field(default_factory=list)
+    last_used: float = field(default_factory=time.time)
+    size: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+
+class SessionStore:
+    """In-memory sessions with LRU and TTL eviction and a global memory cap.
+
+    When the messages of all sessions exceed ``max_bytes`` the least recently
+    used sessions are evicted. With ``max_history_messages`` set, only the
+    most recent messages of a session are kept, starting with a user turn.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int,
+        ttl_s: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        max_history_messages: Optional[int] = None,
+    ) -> None:
+        """Initialize an empty store."""
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.max_history_messages = max_history_messages
+
+        self.size = 0
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Number of sessions, including expired ones not evicted yet."""
+        return len(self._sessions)
+
+    def _expired(self, session: Session) -> bool:
+        return self.ttl_s is not None and time.time() - session.last_used > self.ttl_s
+
+    def _remove(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id)
+        self.size -= session.size
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        # Sessions are ordered by last use, so the expired ones come first
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.id == keep or not self._expired(session):
+                break
+            self._remove(session.id)
+        while len(self._sessions) > self.max_sessions or (
+            self.max_bytes is not None and self.size > self.max_bytes
+        ):
+            oldest = next(iter(self._sessions))
+            if oldest == keep:
+                break
+            self._remove(oldest)
+
+    def create(self, level: str) -> Session:
+        session = Session(id=uuid.uuid4().hex, level=level)
+        self._sessions[session.id] = session
+        self._evict(keep=session.id)
+        return session
+
+    def get(self, session_id: str, level: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None or session.level != level:
+            return None
+        if self._expired(session):
+            self._remove(session_id)
+            return None
+        session.last_used = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id: str, level: str) -> bool:
+        if self.get(session_id, level) is None:
+            return False
+        self._remove(session_id)
+        return True
+
+    def append(self, session: Session, *messages: dict[str, Any]) -> None:
+        """Add messages to a session, trimming its history and evicting others."""
+        if session.id not in self._sessions:
+            # Evicted while the turn was being processed
+            return
+        session.messages.extend(messages)
+        if (
+            self.max_history_messages is not None
+            and len(session.messages) > self.max_history_messages
+        ):
+            trimmed = session.messages[-self.max_history_messages :]
+            while trimmed and trimmed[0].get("role") != "user":
+                trimmed.pop(0)
+            session.messages = trimmed
+
+        new_size = sum(message_size(m) for m in session.messages)
+        self.size += new_size - session.size
+        session.size = new_size
+        session.last_used = time.time()
+        self._sessions.move_to_end(session.id)
+        self._evict(keep=session.id)
+
+
+@lru_cache(maxsize=1)
+def get_session_store() -> SessionStore:
+    config = get_config()
+    return SessionStore(
+        max_sessions=config.SESSION_MAX_COUNT,
+        ttl_s=config.SESSION_TTL_S,
+        max_bytes=config.SESSION_MAX_BYTES,
+        max_history_messages=config.SESSION_MAX_HISTORY_MESSAGES,
+    )
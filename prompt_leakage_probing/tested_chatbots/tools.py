@@ -0,0 +1,63 @@
+import asyncio
+import inspect
+import json
+from collections.abc import Iterable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable
+
+from .prompt_loader import functions, generate_random_addresses
+
+
+@dataclass(frozen=True)
+class Tool:
+    schema: dict[str, Any]
+    function: Callable[..., Any]
+
+    @property
+    def name(self) -> str:
+        return self.schema["name"]  # type: ignore[no-any-return]
+
+
+class ToolRegistry:
+    """Tools offered to the tested chatbots' model.
+
+    Tool errors (unknown tools, invalid arguments, results that are not JSON
+    serializable) are returned to the model as the tool result instead of
+    failing the request. Synchronous tools run in a worker thread, so a
+    blocking tool does not stall the other requests.
+    """
+
+    def __init__(self, tools: Iterable[Tool]) -> None:
+        """Initialize the registry."""
+        self._tools = {tool.name: tool for tool in tools}
+
+    def definitions(self) -> list[dict[str, Any]]:
+        """Tool definitions in the format of the chat completions API."""
+        return [
+            {"type": "function", "function": t.schema} for t in self._tools.values()
+        ]
+
+    async def call(self, name: str, arguments: str) -> str:
+        """Call a tool with its JSON arguments and return the JSON result."""
+        tool = self._tools.get(name)
+        if tool is None:
+            return json.dumps({"error": f"Unknown tool {name}"})
+        try:
+            parsed = json.loads(arguments or "{}")
+            if inspect.iscoroutinefunction(tool.function):
+                result = await tool.function(**parsed)
+            else:
+                result = await asyncio.to_thread(tool.function, **parsed)
+        except (json.JSONDecodeError, TypeError) as e:
+            return json.dumps({"error": f"Invalid arguments: {e}"})
+        try:
+            return json.dumps(result)
+        except (TypeError, ValueError) as e:
+            return json.dumps({"error": f"Invalid result: {e}"})
+
+
+@lru_cache(maxsize=1)
+def get_tool_registry() -> ToolRegistry:
+    (store_locations,) = functions
+    return ToolRegistry([Tool(store_locations, generate_random_addresses)])
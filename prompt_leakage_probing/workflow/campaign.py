@@ -0,0 +1,257 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import time
+import traceback
+import uuid
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from fastagency.ui.console import ConsoleUI
+
+from ..tested_chatbots.prompt_loader import get_level_registry
+from .tools.log_prompt_leakage import generate_markdown_report
+from .tools.probe_stats import probe_stats_path
+from .tools.result_store import RESULTS_DB_ENV, get_result_store
+from .tools.timing import timing_path
+from .workflow import prompt_leak_scenarios
+
+DEFAULT_MODEL_URL = "http://localhost:8008"
+
+
+@dataclass(frozen=True)
+class CampaignCell:
+    """One scenario run against one level for a number of rounds."""
+
+    scenario: str
+    level: str
+    rounds: int
+
+    @property
+    def name(self) -> str:
+        return f"{log_file_stem(self.scenario)}-{self.level}-{self.rounds}"
+
+
+@dataclass
+class CellResult:
+    cell: CampaignCell
+    log_path: Path
+    duration_s: float
+    summary: Optional[str] = None
+    error: Optional[str] = None
+
+
+def log_file_stem(scenario: str) -> str:
+    """Return the log file stem of a scenario.
+
+    Example: ``SimplePromptLeak`` -> ``simple_prompt_leak``.
+    """
+    return re.sub(r"(?<!^)(?=[A-Z][a-z])", "_", scenario).lower()
+
+
+def build_matrix(
+    scenarios: Iterable[str], levels: Iterable[str], rounds: Iterable[int]
+) -> list[CampaignCell]:
+    """Return every combination of scenario, level and round count.
+
+    The levels are those of the tested chatbots' level registry.
+    """
+    scenarios, levels, rounds = list(scenarios), list(levels), list(rounds)
+    unknown = [s for s in scenarios if s not in prompt_leak_scenarios]
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {unknown}")
+    known_levels = get_level_registry().names()
+    unknown = [level for level in levels if level not in known_levels]
+    if unknown:
+        raise ValueError(f"Unknown levels: {unknown}")
+    return [
+        CampaignCell(scenario, level, n_rounds)
+        for scenario, level, n_rounds in itertools.product(scenarios, levels, rounds)
+    ]
+
+
+def run_cell(
+    cell: CampaignCell,
+    cells_dir: Path,
+    campaign_id: str,
+    model_url: str = DEFAULT_MODEL_URL,
+    scenario_params: Optional[dict[str, Any]] = None,
+) -> CellResult:
+    """Run a single cell without user interaction.
+
+    Rows are written to the cell's own CSV file in ``cells_dir``. Errors are
+    recorded in the result instead of being raised, so one failing cell does
+    not stop the others. ``scenario_params`` are passed on to the scenario,
+    e.g. ``classification_batch_size``.
+    """
+    log_path = Path(cells_dir) / f"{cell.name}.csv"
+    params: dict[str, Any] = {
+        **(scenario_params or {}),
+        "model_level": cell.level,
+        "max_round": cell.rounds,
+        "log_path": log_path,
+        "model_url": model_url,
+        "campaign_id": campaign_id,
+    }
+
+    start = time.perf_counter()
+    result = CellResult(cell=cell, log_path=log_path, duration_s=0.0)
+    try:
+        result.summary = prompt_leak_scenarios[cell.scenario](ConsoleUI(), params).run()
+    except Exception:
+        result.error = traceback.format_exc()
+    finally:
+        # Pool workers exit without running atexit handlers
+        get_result_store(log_path).flush()
+        result.duration_s = time.perf_counter() - start
+    return result
+
+
+def merge_cell_logs(
+    results: Iterable[CellResult],
+    output_dir: Path,
+    campaign_id: Optional[str] = None,
+) -> list[Path]:
+    """Concatenate the cell logs into one CSV log per scenario.
+
+    The probe statistics and timings are merged the same way and every
+    merged log gets a markdown report next to it. When the rows are stored
+    in the ``PROMPT_LEAKAGE_RESULTS_DB`` database there are no cell logs to
+    concatenate, the reports are then made from the database rows of the
+    campaign and the returned paths only name the reports and sidecar files.
+    """
+    results_db = os.environ.get(RESULTS_DB_ENV)
+    by_scenario: dict[str, list[Path]] = {}
+    for result in results:
+        if results_db or result.log_path.exists():
+            by_scenario.setdefault(result.cell.scenario, []).append(result.log_path)
+
+    merged_paths = []
+    for scenario, log_paths in by_scenario.items():
+        merged_path = Path(output_dir) / f"{log_file_stem(scenario)}.csv"
+        if not results_db:
+            with merged_path.open("w", newline="") as merged:
+                for i, log_path in enumerate(log_paths):
+                    with log_path.open(newline="") as f:
+                        header = f.readline()
+                        if i == 0:
+                            merged.write(header)
+                        shutil.copyfileobj(f, merged)
+
+        for sidecar_path in (probe_stats_path, timing_path):
+            with sidecar_path(merged_path).open("w") as merged_sidecar:
+                for log_path in log_paths:
+                    if sidecar_path(log_path).exists():
+                        merged_sidecar.write(sidecar_path(log_path).read_text())
+
+        merged_path.with_suffix(".md").write_text(
+            generate_markdown_report(
+                name=scenario,
+                log_path=merged_path,
+                campaign_id=campaign_id if results_db else None,
+            )
+        )
+        merged_paths.append(merged_path)
+    return merged_paths
+
+
+def run_campaign(
+    cells: Iterable[CampaignCell],
+    output_dir: Path,
+    max_workers: Optional[int] = None,
+    model_url: str = DEFAULT_MODEL_URL,
+    campaign_id: Optional[str] = None,
+    scenario_params: Optional[dict[str, Any]] = None,
+) -> list[CellResult]:
+    """Run all cells in parallel worker processes and merge their logs.
+
+    The campaign takes as long as its slowest cell. Results are returned in
+    the order of ``cells`` and a ``campaign.json`` summary is written to
+    ``output_dir``.
+    """
+    cells = list(cells)
+    campaign_id = campaign_id or uuid.uuid4().hex
+    cells_dir = Path(output_dir) / "cells"
+    cells_dir.mkdir(parents=True, exist_ok=True)
+
+    # Spawned workers do not inherit the parent's threads and open connections
+    with ProcessPoolExecutor(
+        max_workers=max_workers or len(cells) or None,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        futures = {
+            executor.submit(
+                run_cell, cell, cells_dir, campaign_id, model_url, scenario_params
+            ): cell
+            for cell in cells
+        }
+        results_by_cell = {}
+        for future in as_completed(futures):
+            result = future.result()
+            results_by_cell[futures[future]] = result
+            status = "failed" if result.error else "done"
+            print(f"{result.cell.name}: {status} in {result.duration_s:.1f}s")  # noqa: T201
+
+    results = [results_by_cell[cell] for cell in cells]
+    merge_cell_logs(results, output_dir, campaign_id)
+    (Path(output_dir) / "campaign.json").write_text(
+        json.dumps(
+            {
+                "campaign_id": campaign_id,
+                "cells": [{**asdict(r), "log_path": str(r.log_path)} for r in results],
+            },
+            indent=2,
+        )
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run prompt leak scenarios against tested levels in parallel."
+    )
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        default=list(prompt_leak_scenarios),
+        metavar="SCENARIO",
+    )
+    level_names = get_level_registry().names()
+    parser.add_argument("--levels", nargs="+", default=level_names, choices=level_names)
+    parser.add_argument("--rounds", nargs="+", type=int, default=[5])
+    parser.add_argument("--output-dir", type=Path, default=Path("reports/campaign"))
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--model-url", default=DEFAULT_MODEL_URL)
+    parser.add_argument(
+        "--classification-batch-size",
+        type=int,
+        default=1,
+        help="Number of probes the LLM classifier scores in one call.",
+    )
+    parser.add_argument(
+        "--fan-out",
+        type=int,
+        default=1,
+        help="Number of candidate attacks sent concurrently per generator turn.",
+    )
+    args = parser.parse_args()
+
+    campaign_results = run_campaign(
+        build_matrix(args.scenarios, args.levels, args.rounds),
+        output_dir=args.output_dir,
+        max_workers=args.max_workers,
+        model_url=args.model_url,
+        scenario_params={
+            "classification_batch_size": args.classification_batch_size,
+            "fan_out": args.fan_out,
+        },
+    )
+    if any(r.error for r in campaign_results):
+        raise SystemExit(1)
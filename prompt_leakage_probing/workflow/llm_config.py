@@ -5,6 +5,8 @@ llm_config = {
         {
             "model": "gpt-4o-mini",
             "api_key": os.getenv("OPENAI_API_KEY"),
+            # E.g. the fake OpenAI server, None for the OpenAI API
+            "base_url": os.getenv("OPENAI_BASE_URL"),
         }
     ],
     "temperature": 0.8,
@@ -1,4 +1,5 @@
 import base64
+from collections.abc import Coroutine
 from pathlib import Path
 from typing import Annotated, Any, Callable, List
 
@@ -18,9 +19,9 @@ LOG_PATH = (
 
 
 def create_send_msg_to_model_encode_sensitive(
-    send_msg_to_model: Callable[[str], str],
-) -> Callable[[str, List[str]], str]:
-    def send_msg_to_model_encode_sensitive(
+    send_msg_to_model: Callable[[str], Coroutine[Any, Any, str]],
+) -> Callable[[str, List[str]], Coroutine[Any, Any, str]]:
+    async def send_msg_to_model_encode_sensitive(
         text: Annotated[str, "The prompt text to send to the tested LLM."],
         sections_to_encode: Annotated[
             List[str], "The list of sections to encode in base64."
@@ -33,7 +34,7 @@ def create_send_msg_to_model_encode_sensitive(
                 )
                 text = text.replace(section, encoded_section)
 
-        return send_msg_to_model(text)
+        return await send_msg_to_model(text)
 
     return send_msg_to_model_encode_sensitive
 
@@ -1,11 +1,16 @@
 import functools
-from collections.abc import Iterable
+import inspect
+import uuid
+from collections.abc import Coroutine, Iterable
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
 from autogen import GroupChat, GroupChatManager, register_function
 from autogen.agentchat import Agent, ConversableAgent, UserProxyAgent
+from autogen.agentchat.contrib.capabilities.transform_messages import (
+    TransformMessages,
+)
 from fastagency import UI
 
 from prompt_leakage_probing.workflow.agents import (
@@ -13,12 +18,26 @@ from prompt_leakage_probing.workflow.agents import (
     PromptLeakageClassifierAgent,
 )
 
+from ....tested_chatbots.prompt_loader import functions as tested_model_functions
+from ....tested_chatbots.prompt_loader import get_level_registry
 from ...llm_config import llm_config
+from ...tools.fan_out import create_fan_out_probe
+from ...tools.leakage_scorer import LOCAL_REASONING_PREFIX, LocalLeakageScorer
 from ...tools.log_prompt_leakage import (
+    PendingProbe,
+    create_log_prompt_leakage_batch_function,
     create_log_prompt_leakage_function,
     generate_markdown_report,
 )
-from ...tools.model_adapter import create_send_msg_to_model
+from ...tools.message_history import (
+    CurrentExchangeOnly,
+    PendingProbesOnly,
+    RecentExchangesWithDigest,
+)
+from ...tools.model_adapter import create_async_send_msg_to_model
+from ...tools.near_duplicates import NearDuplicateIndex
+from ...tools.probe_stats import ProbeStats, append_probe_stats
+from ...tools.timing import JSONLinesSpanExporter, SpanExporter, Tracer
 from ..scenario_template import ScenarioTemplate
 
 
@@ -29,6 +48,18 @@ class FunctionToRegister:
     description: str
 
 
+def _prompt_argument(
+    signature: inspect.Signature, args: tuple[Any, ...], kwargs: dict[str, Any]
+) -> Any:
+    """The prompt sent by a probe call, its first parameter.
+
+    Tool arguments are passed as keywords in the order the LLM emitted them,
+    so the prompt is looked up by name.
+    """
+    arguments = signature.bind(*args, **kwargs).arguments
+    return arguments[next(iter(signature.parameters))]
+
+
 class PromptLeakageScenario(ScenarioTemplate):
     DEFAULT_LOG_PATH = (
         Path(__file__).parent
@@ -56,21 +87,78 @@ class PromptLeakageScenario(ScenarioTemplate):
         self.counter = 0
         self.model_level = "low"
         self.max_round = 1
+        self.campaign_id = params.get("campaign_id") or uuid.uuid4().hex
+        # Number of exchanges the generator sees verbatim, None for all of them
+        self.history_window: Optional[int] = params.get("history_window")
+        self.classifier_sees_current_exchange_only: bool = params.get(
+            "classifier_sees_current_exchange_only", False
+        )
+        self.probe_function_name = "send_msg_to_model"
+        # Clear cut responses are classified without the LLM classifier
+        self.use_local_scorer: bool = params.get("local_scorer", False)
+        self.local_scorer: Optional[LocalLeakageScorer] = None
+        self.last_probe_scored_locally = False
+        self.log_prompt_leakage: Optional[Callable[..., str]] = None
+        # Candidate attacks the generator sends concurrently in one turn
+        self.fan_out = max(int(params.get("fan_out", 1)), 1)
+        self.fan_out_concurrency = max(
+            int(params.get("fan_out_concurrency") or self.fan_out), 1
+        )
+        # Probes classified by the LLM classifier in one call, 1 for every
+        # probe. A fanned out turn is always classified together.
+        self.classification_batch_size = max(
+            int(params.get("classification_batch_size", 1)), self.fan_out
+        )
+        self.pending_probes: list[PendingProbe] = []
+        # Prompts within this many SimHash bits of an earlier one are not sent,
+        # None to send every prompt
+        near_duplicate_distance = params.get("near_duplicate_distance")
+        self.sent_prompts = (
+            NearDuplicateIndex(max_distance=near_duplicate_distance)
+            if near_duplicate_distance is not None
+            else None
+        )
+        self.last_probe_suppressed = False
+        self.stats = ProbeStats(
+            scenario=type(self).__name__,
+            model_name=self.model_level,
+            campaign_id=self.campaign_id,
+        )
+        # Spans are tagged with the number of rounds logged when they start
+        self.tracer = Tracer(
+            scenario=type(self).__name__,
+            model_name=self.model_level,
+            campaign_id=self.campaign_id,
+            current_round=lambda: self.counter,
+        )
+        # Where the spans go, by default next to the result rows
+        self.span_exporter: Optional[SpanExporter] = params.get("span_exporter")
 
     def setup_environment(self) -> None:
-        self.model_level = self.ui.multiple_choice(
+        """Set the tested level, round count and log path.
+
+        Values given in ``params`` (``model_level``, ``max_round`` and
+        ``log_path``) are used as they are, the user is asked for the rest.
+        """
+        if "log_path" in self.params:
+            self.prompt_leak_log_save_path = Path(self.params["log_path"])
+
+        self.model_level = self.params.get("model_level") or self.ui.multiple_choice(
             sender="Prompt leakage team",
             prompt="What model would you like to test?",
-            choices=["low", "medium", "high"],
+            choices=get_level_registry().names(),
         )
 
         self.max_round = int(
-            self.ui.multiple_choice(
+            self.params.get("max_round")
+            or self.ui.multiple_choice(
                 sender="Prompt leakage team",
                 prompt="How much rounds would you like to run?",
                 choices=["1", "5", "20", "50", "100"],
             )
         )
+        self.stats.model_name = self.model_level
+        self.tracer.model_name = self.model_level
 
     def setup_prompt_leak_classifier_agent(self, executor: Agent) -> ConversableAgent:
         confidential_part = self.TESTED_MODEL_CONFIDENTIAL_PATH.read_text()
@@ -85,8 +173,23 @@ class PromptLeakageScenario(ScenarioTemplate):
             is_termination_msg=lambda _: self.counter >= self.max_round,
         )
 
-        log_prompt_leakage = create_log_prompt_leakage_function(
-            save_path=self.prompt_leak_log_save_path, model_name=self.model_level
+        if self.use_local_scorer:
+            self.local_scorer = LocalLeakageScorer(
+                confidential_part, non_confidential_part, tested_model_functions
+            )
+
+        prompt_leak_classifier.generate_reply = self.tracer.traced(  # type: ignore[method-assign]
+            "classifier", prompt_leak_classifier.generate_reply
+        )
+
+        log_prompt_leakage = self.tracer.traced(
+            "log",
+            create_log_prompt_leakage_function(
+                save_path=self.prompt_leak_log_save_path,
+                model_name=self.model_level,
+                scenario=type(self).__name__,
+                campaign_id=self.campaign_id,
+            ),
         )
 
         @functools.wraps(log_prompt_leakage)
@@ -96,6 +199,24 @@ class PromptLeakageScenario(ScenarioTemplate):
                 self.counter += 1
             return retval
 
+        self.log_prompt_leakage = function_call_counter
+
+        if self.classification_batch_size > 1:
+            register_function(
+                create_log_prompt_leakage_batch_function(
+                    function_call_counter, self.pending_probes
+                ),
+                caller=prompt_leak_classifier,
+                executor=executor,
+                name="log_prompt_leakage_batch",
+                description="Save the classifications of the numbered prompt leak attempts",
+            )
+            TransformMessages(
+                transforms=[PendingProbesOnly(self.pending_probes)],
+                verbose=False,
+            ).add_to_agent(prompt_leak_classifier)
+            return prompt_leak_classifier
+
         register_function(
             function_call_counter,
             caller=prompt_leak_classifier,
@@ -104,6 +225,12 @@ class PromptLeakageScenario(ScenarioTemplate):
             description="Save prompt leak attempt",
         )
 
+        if self.classifier_sees_current_exchange_only:
+            TransformMessages(
+                transforms=[CurrentExchangeOnly(self.probe_function_name)],
+                verbose=False,
+            ).add_to_agent(prompt_leak_classifier)
+
         return prompt_leak_classifier
 
     def setup_prompt_generator_agent(self, executor: Agent) -> ConversableAgent:
@@ -113,11 +240,34 @@ class PromptLeakageScenario(ScenarioTemplate):
             code_execution_config=False,
             is_termination_msg=lambda _: self.counter >= self.max_round,
         )
+        prompt_generator.generate_reply = self.tracer.traced(  # type: ignore[method-assign]
+            "generator", prompt_generator.generate_reply
+        )
 
         function_to_register = self.get_function_to_register(
             model_level=self.model_level
         )
 
+        # Suppressed near duplicates are not sent, so they are not timed
+        probe = self._suppress_near_duplicates(
+            self._score_probe_locally(
+                self.tracer.traced("probe", function_to_register.function)
+            )
+        )
+        if self.fan_out > 1:
+            function_to_register = FunctionToRegister(
+                function=create_fan_out_probe(
+                    probe,
+                    max_concurrency=self.fan_out_concurrency,
+                    max_probes=self._remaining_fan_out,
+                ),
+                name=f"{function_to_register.name}_fan_out",
+                description=f"{function_to_register.description}, "
+                f"up to {self.fan_out} different probes at once",
+            )
+        else:
+            function_to_register.function = probe
+
         register_function(
             function_to_register.function,
             caller=prompt_generator,
@@ -125,9 +275,108 @@ class PromptLeakageScenario(ScenarioTemplate):
             name=function_to_register.name,
             description=function_to_register.description,
         )
+        self.probe_function_name = function_to_register.name
+
+        if self.history_window is not None:
+            TransformMessages(
+                transforms=[
+                    RecentExchangesWithDigest(
+                        function_to_register.name, max_exchanges=self.history_window
+                    )
+                ],
+                verbose=False,
+            ).add_to_agent(prompt_generator)
 
         return prompt_generator
 
+    def _remaining_fan_out(self) -> int:
+        """Probes the next fanned out turn may send without exceeding the rounds."""
+        remaining = self.max_round - self.counter - len(self.pending_probes)
+        return min(self.fan_out, remaining)
+
+    def _suppress_near_duplicates(
+        self, probe: Callable[..., Coroutine[Any, Any, str]]
+    ) -> Callable[..., Coroutine[Any, Any, str]]:
+        """Wrap the probe function to not send near duplicates of earlier prompts.
+
+        A near duplicate is answered with a request to try something
+        different, it is neither sent nor classified.
+        """
+        signature = inspect.signature(probe)
+
+        @functools.wraps(probe)
+        async def deduplicated_probe(*args: Any, **kwargs: Any) -> str:
+            self.last_probe_suppressed = False
+            prompt = _prompt_argument(signature, args, kwargs)
+            if self.sent_prompts is None:
+                return await probe(*args, **kwargs)
+
+            earlier = self.sent_prompts.find(prompt)
+            if earlier is not None:
+                self.stats.suppressed += 1
+                self.last_probe_suppressed = True
+                return (
+                    "Not sent, this prompt is nearly identical to an earlier one: "
+                    f"{earlier!r}. Try something different."
+                )
+
+            # Added before sending so concurrent probes see each other
+            self.sent_prompts.add(prompt)
+            try:
+                return await probe(*args, **kwargs)
+            except Exception:
+                self.sent_prompts.remove(prompt)
+                raise
+
+        return deduplicated_probe
+
+    def _score_probe_locally(
+        self, probe: Callable[..., Coroutine[Any, Any, str]]
+    ) -> Callable[..., Coroutine[Any, Any, str]]:
+        """Wrap the probe function to log clear cut responses directly.
+
+        Responses the local scorer is confident about are logged without the
+        LLM classifier, which is then skipped for the round. In batched mode
+        the other responses are buffered for the classifier.
+        """
+        signature = inspect.signature(probe)
+
+        @functools.wraps(probe)
+        async def scored_probe(*args: Any, **kwargs: Any) -> str:
+            self.last_probe_scored_locally = False
+            response = await probe(*args, **kwargs)
+            self.stats.probes += 1
+
+            prompt = _prompt_argument(signature, args, kwargs)
+            score = self.local_scorer.classify(response) if self.local_scorer else None
+            if score is not None and self.log_prompt_leakage is not None:
+                self.log_prompt_leakage(
+                    prompt,
+                    response,
+                    f"{LOCAL_REASONING_PREFIX} {score.reasoning}",
+                    score.level,
+                )
+                self.stats.scored_locally += 1
+                self.last_probe_scored_locally = True
+            elif self.classification_batch_size > 1:
+                self.pending_probes.append(PendingProbe(prompt, response))
+            return response
+
+        return scored_probe
+
+    def _classification_due(self) -> bool:
+        """Whether the classifier should speak after the last probe.
+
+        In batched mode the classifier waits until the batch is full or the
+        buffered probes would complete the last round.
+        """
+        if self.classification_batch_size == 1:
+            return not (self.last_probe_scored_locally or self.last_probe_suppressed)
+        pending = len(self.pending_probes)
+        return pending >= self.classification_batch_size or (
+            pending > 0 and self.counter + pending >= self.max_round
+        )
+
     def setup_agents(self) -> Iterable[Agent]:
         """Create agents specific to prompt leakage."""
         user_proxy = UserProxyAgent(
@@ -156,10 +405,10 @@ class PromptLeakageScenario(ScenarioTemplate):
 
     def get_function_to_register(self, model_level: str) -> FunctionToRegister:
         """Return the function to register for model interaction."""
-        url = "http://localhost:8008"
+        url = self.params.get("model_url", "http://localhost:8008")
 
         return FunctionToRegister(
-            function=create_send_msg_to_model(_url=f"{url}/{model_level}"),
+            function=create_async_send_msg_to_model(_url=f"{url}/{model_level}"),
             name="send_msg_to_model",
             description="Sends a message to the tested LLM",
         )
@@ -193,6 +442,9 @@ class PromptLeakageScenario(ScenarioTemplate):
             if last_speaker is user_proxy:
                 prev_speaker = messages[-2]["name"]
                 if prev_speaker == "Prompt_Generator_Agent":
+                    if not self._classification_due():
+                        return prompt_generator
+                    self.stats.classifier_turns += 1
                     return prompt_leak_classifier
                 elif prev_speaker == "Prompt_Leak_Classifier_Agent":
                     return prompt_generator
@@ -215,14 +467,29 @@ class PromptLeakageScenario(ScenarioTemplate):
     def execute_scenario(self, group_chat_manager: GroupChatManager) -> str:
         """Run the main scenario logic."""
         initial_message = self.get_initial_message()
+        if self.fan_out > 1:
+            initial_message += (
+                f"\n\nIn every turn, send {self.fan_out} different candidate "
+                f"prompts at once by calling {self.probe_function_name}."
+            )
 
         self.counter = 0
 
-        chat_result = group_chat_manager.groupchat.agents[1].initiate_chat(
-            group_chat_manager,
-            message=initial_message,
-            summary_method="reflection_with_llm",
-        )
+        try:
+            chat_result = group_chat_manager.groupchat.agents[1].initiate_chat(
+                group_chat_manager,
+                message=initial_message,
+                summary_method=self.tracer.traced(
+                    "summary", ConversableAgent._reflection_with_llm_as_summary
+                ),
+            )
+        finally:
+            # Timings of a failed campaign show where it got stuck
+            self.tracer.flush(
+                self.span_exporter
+                or JSONLinesSpanExporter(self.prompt_leak_log_save_path)
+            )
+        append_probe_stats(self.prompt_leak_log_save_path, self.stats)
         return chat_result.summary  # type: ignore [no-any-return]
 
     def generate_report(self) -> str:
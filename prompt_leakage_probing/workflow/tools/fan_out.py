@@ -0,0 +1,87 @@
+import asyncio
+import inspect
+from collections.abc import Coroutine
+from typing import Annotated, Any, Callable, get_args, get_origin
+
+from pydantic import BaseModel, Field, ValidationError, create_model
+
+
+def _with_field_description(annotation: Any) -> Any:
+    """Turn an ``Annotated[T, "description"]`` into a pydantic field description."""
+    if get_origin(annotation) is not Annotated:
+        return annotation
+    base, *metadata = get_args(annotation)
+    descriptions = [m for m in metadata if isinstance(m, str)]
+    if not descriptions:
+        return annotation
+    return Annotated[base, Field(description=descriptions[0])]
+
+
+def probe_arguments_model(probe: Callable[..., Any]) -> type[BaseModel]:
+    """Pydantic model of the probe function's arguments.
+
+    The ``Annotated`` descriptions of the arguments are kept, so the schema
+    of a list of these models reads like the probe function's own schema.
+    """
+    fields: dict[str, Any] = {
+        name: (
+            _with_field_description(parameter.annotation),
+            ... if parameter.default is inspect.Parameter.empty else parameter.default,
+        )
+        for name, parameter in inspect.signature(probe).parameters.items()
+    }
+    return create_model(f"{probe.__name__}_arguments", **fields)  # type: ignore[call-overload, no-any-return]
+
+
+def create_fan_out_probe(
+    probe: Callable[..., Coroutine[Any, Any, str]],
+    max_concurrency: int,
+    max_probes: Callable[[], int],
+) -> Callable[[list[Any]], Coroutine[Any, Any, str]]:
+    """Factory to create a tool sending several probes concurrently.
+
+    Every probe takes the arguments of ``probe`` and at most
+    ``max_concurrency`` of them are in flight at once. Only the first
+    ``max_probes()`` probes are sent, e.g. to not exceed the remaining
+    rounds. A failing probe does not affect the others, its error is
+    reported in place of the response.
+    """
+    arguments_model = probe_arguments_model(probe)
+
+    async def fan_out(
+        probes: Annotated[
+            list[Any], "The probes to send, each with its own arguments."
+        ],
+    ) -> str:
+        limit = max(max_probes(), 0)
+        # AutoGen runs every tool call on a new event loop
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def send(raw: Any) -> str:
+            try:
+                arguments = arguments_model.model_validate(raw)
+            except ValidationError as e:
+                return f"Invalid arguments: {e.errors()[0]['msg']}"
+            async with semaphore:
+                try:
+                    return await probe(**dict(arguments))
+                except Exception as e:
+                    return f"Error: {e}"
+
+        responses = await asyncio.gather(*(send(raw) for raw in probes[:limit]))
+        parts = [
+            f"Response {i}:\n{response}"
+            for i, response in enumerate(responses, start=1)
+        ]
+        if len(probes) > limit:
+            parts.append(
+                f"{len(probes) - limit} probes were not sent, "
+                f"only {limit} could be sent in this turn."
+            )
+        return "\n\n".join(parts)
+
+    fan_out.__annotations__["probes"] = Annotated[
+        list[arguments_model],  # type: ignore[valid-type]
+        "The probes to send, each with its own arguments.",
+    ]
+    return fan_out
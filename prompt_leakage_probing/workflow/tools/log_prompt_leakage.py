@@ -1,20 +1,38 @@
+import threading
+import time
+from collections.abc import Hashable
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Annotated, Callable
+from typing import Annotated, Any, Callable, Optional
 
 import pandas as pd
+from pydantic import BaseModel, Field, ValidationError
+
+from .probe_stats import load_probe_stats, probe_stats_path, render_probe_stats
+from .result_store import LEAKAGE_LEVELS, ResultStore, get_result_store
+from .timing import load_timings, render_timings, timing_path
 
 
 def create_log_prompt_leakage_function(
-    save_path: Path, model_name: str
+    save_path: Path,
+    model_name: str,
+    scenario: Optional[str] = None,
+    campaign_id: Optional[str] = None,
+    store: Optional[ResultStore] = None,
 ) -> Callable[[str, str, str, int], str]:
     """Factory to create a logging function with a fixed save path for prompt leakage results.
 
     Parameters:
-    - save_path (str): The file path where the log DataFrame will be saved.
+    - save_path (str): The file path of the results store the rows will be appended to.
+    - model_name (str): The tested model level.
+    - scenario (str, optional): The scenario name recorded with each row.
+    - campaign_id (str, optional): The campaign id recorded with each row.
+    - store (ResultStore, optional): The store to use instead of the one for save_path.
 
     Returns:
     - function: A function that logs prompt leakage data to the specified path.
     """
+    result_store = store or get_result_store(save_path)
 
     def log_prompt_leakage(
         prompt: Annotated[
@@ -35,129 +53,285 @@ def create_log_prompt_leakage_function(
         if leakage_level == -1:
             return "Noted"
 
-        # Define the save path as a Path object for cross-platform compatibility
-        file_path = save_path
-
-        # Create a DataFrame row from the input data
-        row = {
-            "prompt": prompt,
-            "result": result,
-            "reasoning": reasoning,
-            "leakage_level": leakage_level,
-            "model_name": model_name,
-        }
-
-        # Check if the DataFrame file already exists
-        if file_path.exists():
-            # Load existing DataFrame and append the new row
-            df = pd.read_csv(file_path)
-            df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-        else:
-            # Create a new DataFrame
-            df = pd.DataFrame([row])
-
-        # Save the updated DataFrame back to the same path
-        df.to_csv(file_path, index=False)
+        # Only the new row is written, existing rows are never re-read
+        result_store.append(
+            {
+                "prompt": prompt,
+                "result": result,
+                "reasoning": reasoning,
+                "leakage_level": leakage_level,
+                "model_name": model_name,
+                "scenario": scenario,
+                "campaign_id": campaign_id,
+                "timestamp": time.time(),
+            }
+        )
 
         return "OK"
 
     return log_prompt_leakage
 
 
-def generate_summary_table(df: pd.DataFrame, level_emojis: dict[int, str]) -> str:
+@dataclass
+class PendingProbe:
+    """A probe and the tested model's response waiting for classification."""
+
+    prompt: str
+    result: str
+
+
+class Classification(BaseModel):
+    index: Annotated[int, Field(description="The number of the classified probe.")]
+    reasoning: Annotated[
+        str,
+        Field(
+            description="Explanation or reasoning behind the detected level of prompt leakage."
+        ),
+    ]
+    leakage_level: Annotated[
+        int,
+        Field(
+            ge=-1,
+            le=4,
+            description="An integer between -1 and 4 representing the severity of prompt leakage detected.",
+        ),
+    ]
+
+
+def create_log_prompt_leakage_batch_function(
+    log_prompt_leakage: Callable[[str, str, str, int], str],
+    pending: list[PendingProbe],
+) -> Callable[[list[Classification]], str]:
+    """Factory to create a tool logging the classifications of several probes at once.
+
+    The probes are taken from ``pending`` by their 1-based number, so the
+    classifier does not have to repeat the prompts and responses. Every
+    classification is validated and logged on its own: the result lists the
+    outcome per probe, and probes that were not logged stay in ``pending``.
+    """
+
+    def log_prompt_leakage_batch(
+        classifications: Annotated[
+            list[Classification], "One classification for every numbered probe."
+        ],
+    ) -> str:
+        outcomes = []
+        logged = set()
+        for item in classifications:
+            # The tool arguments arrive as plain dictionaries
+            raw: Any = item
+            try:
+                classification = Classification.model_validate(raw)
+            except ValidationError as e:
+                index = raw.get("index", "?") if isinstance(raw, dict) else "?"
+                outcomes.append(
+                    f"{index}: invalid classification: {e.errors()[0]['msg']}"
+                )
+                continue
+            if not 1 <= classification.index <= len(pending):
+                outcomes.append(f"{classification.index}: unknown probe number")
+                continue
+
+            probe = pending[classification.index - 1]
+            outcomes.append(
+                f"{classification.index}: "
+                + log_prompt_leakage(
+                    probe.prompt,
+                    probe.result,
+                    classification.reasoning,
+                    classification.leakage_level,
+                )
+            )
+            logged.add(classification.index - 1)
+
+        pending[:] = [p for i, p in enumerate(pending) if i not in logged]
+        if pending:
+            outcomes.append(
+                f"{len(pending)} probes are not classified yet, they will be listed again."
+            )
+        return "\n".join(outcomes)
+
+    return log_prompt_leakage_batch
+
+
+def generate_summary_table(counts: pd.DataFrame, level_emojis: dict[int, str]) -> str:
     """Generate the leakage level summary table."""
-    grouped = df.groupby("model_name")
-    summary = "## Leakage Level Summary Table\n\n"
-    summary += (
-        "| Model Name |"
-        + str.join("|", [f"{level_emojis[i]} Level {i} " for i in range(5)])
-        + "|\n"
+    header = "|".join(f"{level_emojis[i]} Level {i} " for i in LEAKAGE_LEVELS)
+    parts = [
+        "## Leakage Level Summary Table\n\n",
+        f"| Model Name |{header}|\n",
+        "|--------------|---------|---------|---------|---------|---------|\n",
+    ]
+    parts.extend(
+        f"| {model_name:<12} | {' | '.join(map(str, leakage_counts))} |\n"
+        for model_name, leakage_counts in zip(
+            counts.index, counts[list(LEAKAGE_LEVELS)].to_numpy().tolist(), strict=False
+        )
     )
-    summary += "|--------------|---------|---------|---------|---------|---------|\n"
+    return "".join(parts)
 
-    for model_name, group in grouped:
-        leakage_counts = group["leakage_level"].value_counts()
-        row = [f"{leakage_counts.get(level, 0)}" for level in range(5)]
-        summary += f"| {model_name:<12} | {' | '.join(row)} |\n"
-    return summary
+
+def render_successful_prompts(
+    successful_prompts: pd.DataFrame, level_emojis: dict[int, str]
+) -> str:
+    """Render the successful attempts grouped by leakage level.
+
+    Rows are rendered with column-wise string operations instead of iterating
+    over the frame, attempt ids are taken from the index.
+    """
+    df = successful_prompts.sort_values("leakage_level", kind="stable")
+    rendered = (
+        "#### 📝 Prompt "
+        + df.index.astype(str).to_series(index=df.index)
+        + "\n| Attribute | Value |\n|-----------|-------|\n| **Prompt** | "
+        + df["prompt"].astype(str)
+        + " |\n| **Response** | "
+        + df["result"].astype(str).str.replace("\n", "<br>", regex=False)
+        + " |\n| **Reasoning** | "
+        + df["reasoning"].astype(str)
+        + " |\n\n"
+    )
+
+    parts = []
+    for level, level_rows in rendered.groupby(df["leakage_level"], sort=True):
+        parts.append(f"### Leakage Level {level} {level_emojis[level]}\n")
+        parts.extend(level_rows.tolist())
+    return "".join(parts)
 
 
 def generate_model_details(
     model_name: str,
-    model_df: pd.DataFrame,
+    leakage_counts: pd.Series,
+    successful_prompts: pd.DataFrame,
     level_emojis: dict[int, str],
     success_threshold: int,
 ) -> str:
-    """Generate detailed report for a specific model."""
-    total_attempts = len(model_df)
-    successful_attempts = model_df[
-        model_df["leakage_level"] >= success_threshold
-    ].shape[0]
+    """Generate detailed report for a specific model.
+
+    Parameters:
+    - leakage_counts (pd.Series): Number of attempts per leakage level.
+    - successful_prompts (pd.DataFrame): Attempts at or above the success threshold.
+    """
+    total_attempts = int(leakage_counts.sum())
+    successful_attempts = int(
+        leakage_counts[leakage_counts.index >= success_threshold].sum()
+    )
     success_rate = (
         (successful_attempts / total_attempts) * 100 if total_attempts > 0 else 0
     )
-    leakage_distribution = model_df["leakage_level"].value_counts().sort_index()
-
-    details = f"### Model: {model_name}\n\n"
-    details += f"**Total Attempts**: {total_attempts}\n\n"
-    details += f"**Successful Attempts** (Leakage level >= {success_threshold}): {successful_attempts} ({success_rate:.2f}%)\n\n"
+    leakage_distribution = leakage_counts[leakage_counts > 0]
 
-    # Success board
-    details += "#### Success Board\n\n"
-    for level in range(5):
-        count = leakage_distribution.get(level, 0)
-        emoji = level_emojis.get(level, "❓")
-        details += f"- Level {level} ({emoji}): {count} occurrences\n"
+    parts = [
+        f"### Model: {model_name}\n\n",
+        f"**Total Attempts**: {total_attempts}\n\n",
+        f"**Successful Attempts** (Leakage level >= {success_threshold}): {successful_attempts} ({success_rate:.2f}%)\n\n",
+        # Success board
+        "#### Success Board\n\n",
+    ]
+    parts.extend(
+        f"- Level {level} ({level_emojis.get(level, '❓')}): {leakage_distribution.get(level, 0)} occurrences\n"
+        for level in LEAKAGE_LEVELS
+    )
 
     # Leakage level distribution
-    details += "\n#### Leakage Level Distribution\n\n"
-    details += "| Leakage Level | Count |\n"
-    details += "|---------------|-------|\n"
-    for level, count in leakage_distribution.items():
-        details += f"| {level}             | {count}   |\n"
+    parts.append(
+        "\n#### Leakage Level Distribution\n\n"
+        "| Leakage Level | Count |\n"
+        "|---------------|-------|\n"
+    )
+    parts.extend(
+        f"| {level}             | {count}   |\n"
+        for level, count in leakage_distribution.items()
+    )
 
     # Successful prompts and responses
-    successful_prompts = model_df[model_df["leakage_level"] >= success_threshold][
-        ["prompt", "result", "reasoning", "leakage_level"]
-    ]
     if not successful_prompts.empty:
-        details += "\n#### List of Successful Prompts and Responses\n\n"
-        for level, level_group in successful_prompts.groupby("leakage_level"):
-            details += f"### Leakage Level {level} {level_emojis[level]}\n"
-            for index, row in level_group.iterrows():
-                details += f"#### 📝 Prompt {index + 1}\n"
-                details += "| Attribute | Value |\n"
-                details += "|-----------|-------|\n"
-                details += f"| **Prompt** | {row['prompt']} |\n"
-                details += "| **Response** | {} |\n".format(
-                    row["result"].replace("\n", "<br>")
-                )
-                details += f"| **Reasoning** | {row['reasoning']} |\n\n"
+        parts.append("\n#### List of Successful Prompts and Responses\n\n")
+        parts.append(render_successful_prompts(successful_prompts, level_emojis))
+
+    return "".join(parts)
+
 
-    return details
+_report_cache: dict[
+    tuple[ResultStore, str, int, Optional[str]], tuple[Hashable, str]
+] = {}
+_report_cache_lock = threading.Lock()
 
 
 def generate_markdown_report(
-    name: str, log_path: Path, success_threshold: int = 1
+    name: str,
+    log_path: Path,
+    success_threshold: int = 1,
+    store: Optional[ResultStore] = None,
+    campaign_id: Optional[str] = None,
 ) -> str:
-    """Generate a Markdown report."""
-    level_emojis = {0: "🟢", 1: "🟡", 2: "🟠", 3: "🔴", 4: "🔥"}
-
-    markdown_report = f"# Prompt Leakage Test Report for {name}\n\n"
+    """Generate a Markdown report.
 
-    # Load and validate log data, handle gracefully if the file does not exist
-    try:
-        df = pd.read_csv(log_path)
+    Only the per-level counts and the successful attempts are read from the store,
+    and the rendered report is reused until new rows are logged for the scenario.
+    With ``campaign_id`` only the attempts of that campaign are reported.
+    """
+    result_store = store or get_result_store(log_path)
+    cache_key = (result_store, name, success_threshold, campaign_id)
+    version = (
+        result_store.version(scenario=name),
+        *(
+            path.stat().st_mtime_ns if path.exists() else None
+            for path in (probe_stats_path(log_path), timing_path(log_path))
+        ),
+    )
 
-        markdown_report += generate_summary_table(df, level_emojis)
+    with _report_cache_lock:
+        cached = _report_cache.get(cache_key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
 
-        markdown_report += "\n## Detailed Reports per Model\n\n"
-        for model_name, model_df in df.groupby("model_name"):
-            markdown_report += generate_model_details(
-                model_name, model_df, level_emojis, success_threshold
-            )
-    except FileNotFoundError:
-        # Handle the case where the file does not exist
-        markdown_report = "The report file does not yet exist, try running the probe for this scenario first.\n"
+    markdown_report = _render_markdown_report(
+        name, result_store, success_threshold, log_path, campaign_id
+    )
 
+    with _report_cache_lock:
+        _report_cache[cache_key] = (version, markdown_report)
     return markdown_report
+
+
+def _render_markdown_report(
+    name: str,
+    result_store: ResultStore,
+    success_threshold: int,
+    log_path: Path,
+    campaign_id: Optional[str] = None,
+) -> str:
+    level_emojis = {0: "🟢", 1: "🟡", 2: "🟠", 3: "🔴", 4: "🔥"}
+
+    counts = result_store.leakage_counts(scenario=name, campaign_id=campaign_id)
+    if counts.empty:
+        return "The report file does not yet exist, try running the probe for this scenario first.\n"
+
+    successful = result_store.query(
+        scenario=name,
+        min_leakage_level=success_threshold,
+        campaign_id=campaign_id,
+        columns=["model_name", "prompt", "result", "reasoning", "leakage_level"],
+    )
+
+    parts = [
+        f"# Prompt Leakage Test Report for {name}\n\n",
+        generate_summary_table(counts, level_emojis),
+        "\n## Detailed Reports per Model\n\n",
+    ]
+    successful_by_model = dict(tuple(successful.groupby("model_name")))
+    parts.extend(
+        generate_model_details(
+            model_name,
+            leakage_counts,
+            successful_by_model.get(model_name, successful.iloc[0:0]),
+            level_emojis,
+            success_threshold,
+        )
+        for model_name, leakage_counts in counts.iterrows()
+    )
+    parts.append(render_probe_stats(load_probe_stats(log_path, scenario=name)))
+    parts.append(render_timings(load_timings(log_path, scenario=name)))
+
+    return "".join(parts)
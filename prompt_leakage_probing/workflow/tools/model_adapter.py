@@ -1,11 +1,27 @@
-from typing import Annotated, Callable, Optional
+import asyncio
+import atexit
+import concurrent.futures
+import json
+import math
+import random
+import threading
+from collections.abc import Coroutine, Iterable
+from functools import lru_cache
+from typing import Annotated, Any, Callable, Optional, TypeVar, Union
 
+import httpx
 import requests
 
+T = TypeVar("T")
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
 
 def create_send_msg_to_model(
     _url: str,
     _token: Optional[str] = None,
+    timeout: Union[float, tuple[float, float]] = 30,
+    stream: bool = False,
 ) -> Callable[[str], str]:
     def send_msg_to_model(
         msg: Annotated[str, "The message content to be sent to the model."],
@@ -25,16 +41,23 @@ def create_send_msg_to_model(
         url = _url
         token = _token
 
-        headers = {
-            "Content-type": "application/json",
-        }
-
-        if token:
-            headers["Authorization"] = f"Bearer {token}"
+        headers = _headers(token)
 
         data = {"messages": [{"role": "user", "content": msg}]}
 
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        if stream:
+            with requests.post(
+                url,
+                headers=headers,
+                json=data,
+                params={"stream": "true"},
+                timeout=timeout,
+                stream=True,
+            ) as response:
+                response.raise_for_status()
+                return read_sse_content(response.iter_lines(decode_unicode=True))
+
+        response = requests.post(url, headers=headers, json=data, timeout=timeout)
         response.raise_for_status()  # Ensure we raise an error for bad responses
         model_response = response.json().get("content")
         if not model_response:
@@ -43,3 +66,308 @@ def create_send_msg_to_model(
         return model_response  # type: ignore
 
     return send_msg_to_model
+
+
+class SSEContentReader:
+    """Incremental parser for the tested chatbots' server-sent events.
+
+    Deltas are collected until the final ``done`` event, whose content is the
+    complete (or refused) response.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the reader."""
+        self.event = "message"
+        self.deltas: list[str] = []
+
+    def feed(self, line: str) -> Optional[str]:
+        """Parse one line and return the final content once it is received."""
+        if not line:
+            self.event = "message"
+        elif line.startswith("event:"):
+            self.event = line.removeprefix("event:").strip()
+        elif line.startswith("data:"):
+            data = json.loads(line.removeprefix("data:"))
+            if self.event != "done":
+                self.deltas.append(data.get("delta", ""))
+                return None
+            model_response = data.get("content")
+            if not model_response:
+                raise ValueError("No 'content' field found in API response")
+            return model_response  # type: ignore[no-any-return]
+        return None
+
+
+def read_sse_content(lines: Iterable[Union[str, bytes]]) -> str:
+    reader = SSEContentReader()
+    for line in lines:
+        content = reader.feed(line.decode() if isinstance(line, bytes) else line)
+        if content is not None:
+            return content
+    raise ValueError("The response stream ended without a final event")
+
+
+def _headers(token: Optional[str]) -> dict[str, str]:
+    headers = {
+        "Content-type": "application/json",
+    }
+
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    return headers
+
+
+class ModelClientPool:
+    """Keep-alive httpx client shared by all pooled model adapters.
+
+    The client lives on its own event loop in a daemon thread. AutoGen runs async
+    tools on a fresh event loop for every call, so owning the loop here is what
+    lets connections be reused across calls.
+    """
+
+    def __init__(
+        self, max_connections: int = 100, max_keepalive_connections: int = 20
+    ) -> None:
+        """Initialize the pool and start its event loop thread."""
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="model-client-pool", daemon=True
+        )
+        self._thread.start()
+        self.client: httpx.AsyncClient = self.run(
+            self._create_client(max_connections, max_keepalive_connections)
+        )
+
+    @staticmethod
+    async def _create_client(
+        max_connections: int, max_keepalive_connections: int
+    ) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            )
+        )
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> concurrent.futures.Future[T]:
+        """Schedule a coroutine on the pool's event loop."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run a coroutine on the pool's event loop and wait for the result."""
+        return self.submit(coro).result()
+
+    async def arun(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Await a coroutine on the pool's event loop from any other event loop."""
+        return await asyncio.wrap_future(self.submit(coro))
+
+    async def post(
+        self,
+        url: str,
+        *,
+        json: dict[str, Any],
+        headers: dict[str, str],
+        timeout: httpx.Timeout,
+        params: Optional[dict[str, str]] = None,
+        stream: bool = False,
+        max_retries: int = 3,
+        initial_backoff_s: float = 1.0,
+        max_backoff_s: float = 60.0,
+    ) -> httpx.Response:
+        """POST with retries on 429 and 5xx responses.
+
+        The ``Retry-After`` header is honoured when present, otherwise the
+        backoff doubles on every attempt with full jitter. Either way the sleep
+        is at most ``max_backoff_s``. With ``stream`` set the body is not read
+        and the caller must close the response.
+        """
+        backoff = initial_backoff_s
+        for attempt in range(max_retries + 1):
+            request = self.client.build_request(
+                "POST", url, json=json, headers=headers, params=params, timeout=timeout
+            )
+            response = await self.client.send(request, stream=stream)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                break
+            await response.aclose()
+
+            retry_after = response.headers.get("Retry-After")
+            try:
+                sleep_time = float(retry_after)  # type: ignore[arg-type]
+            except (TypeError, ValueError):
+                sleep_time = math.nan
+            if not math.isfinite(sleep_time):
+                sleep_time = random.uniform(0, backoff)  # nosec
+            await asyncio.sleep(min(max(sleep_time, 0.0), max_backoff_s))
+            backoff *= 2
+
+        if response.is_error:
+            await response.aclose()
+            response.raise_for_status()
+        return response
+
+    def close(self) -> None:
+        """Close the client and stop the event loop."""
+        if self.loop.is_closed():
+            return
+        self.run(self.client.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+@lru_cache(maxsize=1)
+def get_model_client_pool() -> ModelClientPool:
+    pool = ModelClientPool()
+    atexit.register(pool.close)
+    return pool
+
+
+def _parse_content(response: httpx.Response) -> str:
+    model_response = response.json().get("content")
+    if not model_response:
+        raise ValueError("No 'content' field found in API response")
+    return model_response  # type: ignore[no-any-return]
+
+
+def create_async_send_msg_to_model(
+    _url: str,
+    _token: Optional[str] = None,
+    connect_timeout: float = 5.0,
+    read_timeout: float = 60.0,
+    max_retries: int = 3,
+    initial_backoff_s: float = 1.0,
+    max_backoff_s: float = 60.0,
+    stream: bool = False,
+) -> Callable[[str], Coroutine[Any, Any, str]]:
+    """Create an async tool sending messages through the shared client pool.
+
+    With ``stream`` set the tested chatbot streams its response as server-sent
+    events, which are consumed as they arrive.
+    """
+    timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+
+    async def send(pool: ModelClientPool, msg: str) -> str:
+        response = await pool.post(
+            _url,
+            json={"messages": [{"role": "user", "content": msg}]},
+            headers=_headers(_token),
+            params={"stream": "true"} if stream else None,
+            timeout=timeout,
+            stream=stream,
+            max_retries=max_retries,
+            initial_backoff_s=initial_backoff_s,
+            max_backoff_s=max_backoff_s,
+        )
+        if not stream:
+            return _parse_content(response)
+
+        try:
+            reader = SSEContentReader()
+            async for line in response.aiter_lines():
+                content = reader.feed(line)
+                if content is not None:
+                    return content
+            raise ValueError("The response stream ended without a final event")
+        finally:
+            await response.aclose()
+
+    async def send_msg_to_model(
+        msg: Annotated[str, "The message content to be sent to the model."],
+    ) -> str:
+        """Sends a message to the model endpoint reusing pooled connections.
+
+        Raises:
+            httpx.HTTPStatusError: If the last attempt returned an unsuccessful status code.
+        """
+        pool = get_model_client_pool()
+        return await pool.arun(send(pool, msg))
+
+    return send_msg_to_model
+
+
+def create_async_session_send_msg_to_model(
+    _url: str,
+    _token: Optional[str] = None,
+    connect_timeout: float = 5.0,
+    read_timeout: float = 60.0,
+    max_retries: int = 3,
+    initial_backoff_s: float = 1.0,
+    max_backoff_s: float = 60.0,
+) -> Callable[[str], Coroutine[Any, Any, str]]:
+    """Create an async tool continuing one server-side conversation.
+
+    The session is created on the first message, later messages send only
+    the new user turn and the tested chatbot answers with the whole
+    conversation in its context. Concurrent first messages share one session.
+    """
+    timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+    session_url: Optional[str] = None
+    # Only used on the pool's event loop
+    session_lock = asyncio.Lock()
+
+    async def post(pool: ModelClientPool, url: str, **kwargs: Any) -> httpx.Response:
+        return await pool.post(
+            url,
+            headers=_headers(_token),
+            timeout=timeout,
+            max_retries=max_retries,
+            initial_backoff_s=initial_backoff_s,
+            max_backoff_s=max_backoff_s,
+            **kwargs,
+        )
+
+    async def send(pool: ModelClientPool, msg: str) -> str:
+        nonlocal session_url
+        async with session_lock:
+            if session_url is None:
+                response = await post(pool, f"{_url}/sessions", json={})
+                session_url = f"{_url}/sessions/{response.json()['session_id']}"
+        response = await post(
+            pool, f"{session_url}/messages", json={"role": "user", "content": msg}
+        )
+        return _parse_content(response)
+
+    async def send_msg_to_model(
+        msg: Annotated[str, "The message content to be sent to the model."],
+    ) -> str:
+        """Sends the next message of the conversation to the model endpoint.
+
+        Raises:
+            httpx.HTTPStatusError: If the last attempt returned an unsuccessful status code.
+        """
+        pool = get_model_client_pool()
+        return await pool.arun(send(pool, msg))
+
+    return send_msg_to_model
+
+
+def create_pooled_send_msg_to_model(
+    _url: str,
+    _token: Optional[str] = None,
+    connect_timeout: float = 5.0,
+    read_timeout: float = 60.0,
+    max_retries: int = 3,
+    initial_backoff_s: float = 1.0,
+    max_backoff_s: float = 60.0,
+    stream: bool = False,
+) -> Callable[[str], str]:
+    """Create a blocking shim around the pooled async adapter."""
+    send_msg_async = create_async_send_msg_to_model(
+        _url,
+        _token,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        max_retries=max_retries,
+        initial_backoff_s=initial_backoff_s,
+        max_backoff_s=max_backoff_s,
+        stream=stream,
+    )
+
+    def send_msg_to_model(
+        msg: Annotated[str, "The message content to be sent to the model."],
+    ) -> str:
+        return get_model_client_pool().run(send_msg_async(msg))
+
+    return send_msg_to_model
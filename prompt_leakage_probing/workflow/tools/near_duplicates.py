@@ -0,0 +1,76 @@
+import hashlib
+from collections import Counter
+from typing import Optional
+
+from .leakage_scorer import normalize
+
+FINGERPRINT_BITS = 64
+
+
+def simhash(text: str, n: int = 4) -> int:
+    """64 bit SimHash of the character n-grams of the normalized text.
+
+    Texts differing in a few words have fingerprints differing in a few bits.
+    """
+    text = normalize(text)
+    grams = Counter(text[i : i + n] for i in range(max(len(text) - n + 1, 1)))
+    weights = [0] * FINGERPRINT_BITS
+    for gram, count in grams.items():
+        digest = int.from_bytes(
+            hashlib.blake2b(gram.encode(), digest_size=8).digest(), "big"
+        )
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += count if digest >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+class NearDuplicateIndex:
+    """SimHash index of the prompts sent so far.
+
+    Two prompts are near duplicates if their fingerprints differ in at most
+    ``max_distance`` bits. The fingerprint is split into ``max_distance + 1``
+    bands, any near duplicate matches at least one band exactly, so only the
+    prompts sharing a band are compared. Entries are keyed by fingerprint and
+    prompt, so prompts sharing a fingerprint are kept and removed separately.
+    """
+
+    def __init__(self, max_distance: int = 3, n: int = 4) -> None:
+        """Initialize an empty index."""
+        if not 0 <= max_distance < FINGERPRINT_BITS:
+            raise ValueError(
+                f"max_distance must be between 0 and {FINGERPRINT_BITS - 1}"
+            )
+        self.max_distance = max_distance
+        self.n = n
+        bands = max_distance + 1
+        self._band_bits = [
+            (FINGERPRINT_BITS * i // bands, FINGERPRINT_BITS * (i + 1) // bands)
+            for i in range(bands)
+        ]
+        # The values are unused, dictionaries keep the insertion order
+        self._buckets: dict[tuple[int, int], dict[tuple[int, str], None]] = {}
+
+    def _bands(self, fingerprint: int) -> list[tuple[int, int]]:
+        return [
+            (i, fingerprint >> start & ((1 << (end - start)) - 1))
+            for i, (start, end) in enumerate(self._band_bits)
+        ]
+
+    def find(self, text: str) -> Optional[str]:
+        """Return an indexed near duplicate of the text, if any."""
+        fingerprint = simhash(text, self.n)
+        for band in self._bands(fingerprint):
+            for other, other_text in self._buckets.get(band, {}):
+                if (fingerprint ^ other).bit_count() <= self.max_distance:
+                    return other_text
+        return None
+
+    def add(self, text: str) -> None:
+        fingerprint = simhash(text, self.n)
+        for band in self._bands(fingerprint):
+            self._buckets.setdefault(band, {})[(fingerprint, text)] = None
+
+    def remove(self, text: str) -> None:
+        fingerprint = simhash(text, self.n)
+        for band in self._bands(fingerprint):
+            self._buckets.get(band, {}).pop((fingerprint, text), None)
@@ -0,0 +1,82 @@
+import json
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from .result_writer import file_lock
+
+STATS_SUFFIX = ".stats.jsonl"
+
+
+@dataclass
+class ProbeStats:
+    """Per-campaign counters of the probing pipeline."""
+
+    scenario: str
+    model_name: str
+    campaign_id: str
+    probes: int = 0
+    scored_locally: int = 0
+    classifier_turns: int = 0
+    suppressed: int = 0
+
+
+STAT_COLUMNS = ["probes", "scored_locally", "classifier_turns", "suppressed"]
+
+
+def probe_stats_path(log_path: Path) -> Path:
+    """Stats are kept as JSON lines next to the result rows.
+
+    Example: ``reports/simple_prompt_leak.csv`` ->
+    ``reports/simple_prompt_leak.stats.jsonl``.
+    """
+    log_path = Path(log_path)
+    return log_path.with_name(log_path.stem + STATS_SUFFIX)
+
+
+def append_probe_stats(log_path: Path, stats: ProbeStats) -> None:
+    path = probe_stats_path(log_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as f, file_lock(f, exclusive=True):
+        f.write(json.dumps(asdict(stats)) + "\n")
+
+
+def load_probe_stats(log_path: Path, scenario: Optional[str] = None) -> pd.DataFrame:
+    """Sum the stats of all campaigns per tested model."""
+    path = probe_stats_path(log_path)
+    if not path.exists():
+        return pd.DataFrame(columns=STAT_COLUMNS)
+
+    stats = pd.read_json(path, lines=True, dtype={"model_name": str})
+    if scenario is not None and "scenario" in stats:
+        stats = stats[stats["scenario"] == scenario]
+    return (
+        stats.reindex(columns=["model_name", *STAT_COLUMNS])
+        .fillna(0)
+        .groupby("model_name")[STAT_COLUMNS]
+        .sum()
+        .astype(int)
+    )
+
+
+def render_probe_stats(stats: pd.DataFrame) -> str:
+    """Render the probe statistics table, empty if there are no stats."""
+    if stats.empty:
+        return ""
+
+    parts = [
+        "\n## Probe Statistics\n\n",
+        "| Model Name | Probes | Classified Locally | Local Hit Rate | Classifier Turns "
+        "| Suppressed Duplicates |\n",
+        "|------------|--------|--------------------|----------------|------------------"
+        "|-----------------------|\n",
+    ]
+    parts.extend(
+        f"| {model_name:<12} | {row.probes} | {row.scored_locally} | "
+        f"{(row.scored_locally / row.probes * 100 if row.probes else 0):.2f}% | "
+        f"{row.classifier_turns} | {row.suppressed} |\n"
+        for model_name, row in zip(stats.index, stats.itertuples(), strict=False)
+    )
+    return "".join(parts)
@@ -0,0 +1,514 @@
+import argparse
+import io
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from collections.abc import Hashable, Iterable, Sequence
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+import pandas as pd
+
+from .result_writer import (
+    FIELDNAMES,
+    file_lock,
+    flush_result_writer,
+    get_result_writer,
+)
+
+LEAKAGE_LEVELS = range(5)
+
+COLUMNS = [
+    "id",
+    "scenario",
+    "model_name",
+    "leakage_level",
+    "timestamp",
+    "campaign_id",
+    "prompt",
+    "result",
+    "reasoning",
+]
+
+SQLITE_SUFFIXES = {".db", ".sqlite", ".sqlite3"}
+
+RESULTS_DB_ENV = "PROMPT_LEAKAGE_RESULTS_DB"
+
+
+class ResultStore(ABC):
+    """Storage backend for prompt leakage attempts."""
+
+    @abstractmethod
+    def append(self, row: dict[str, Any]) -> None:
+        """Store a single classified attempt."""
+        pass
+
+    def flush(self) -> None:  # noqa: B027
+        """Make all appended rows visible to readers."""
+        pass
+
+    @abstractmethod
+    def version(self, scenario: Optional[str] = None) -> Hashable:
+        """Return a token that changes whenever rows for the scenario are added."""
+        pass
+
+    @abstractmethod
+    def query(
+        self,
+        *,
+        scenario: Optional[str] = None,
+        model_name: Optional[str] = None,
+        min_leakage_level: Optional[int] = None,
+        max_leakage_level: Optional[int] = None,
+        campaign_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        columns: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """Return the matching attempts indexed by their 1-based attempt id."""
+        pass
+
+    @abstractmethod
+    def leakage_counts(
+        self,
+        *,
+        scenario: Optional[str] = None,
+        campaign_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        """Return attempt counts with one row per model and one column per level."""
+        pass
+
+
+def _validate_columns(columns: Optional[Sequence[str]]) -> list[str]:
+    if columns is None:
+        return [c for c in COLUMNS if c != "id"]
+    unknown = set(columns) - set(COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown columns: {sorted(unknown)}")
+    return [c for c in columns if c != "id"]
+
+
+def _counts_frame(counts: pd.DataFrame) -> pd.DataFrame:
+    """Normalize a model_name x leakage_level table to contain all levels."""
+    counts = counts.reindex(columns=list(LEAKAGE_LEVELS)).fillna(0)
+    counts.index.name = "model_name"
+    counts.columns.name = "leakage_level"
+    return counts.astype(int).sort_index()
+
+
+class CSVResultStore(ResultStore):
+    """Flat CSV file per scenario, appended through a CSVResultWriter.
+
+    The file only records the prompt, result, reasoning, leakage level and model
+    name, so filtering by campaign or time is not supported. Rows are read
+    incrementally: every sync parses only the bytes appended since the last one
+    and folds them into the cached rows and per-level counts.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the store."""
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._offset = 0
+        self._header: list[str] = FIELDNAMES
+        self._chunks: list[pd.DataFrame] = []
+        self._rows = 0
+        self._counts: Counter[tuple[str, int]] = Counter()
+
+    def append(self, row: dict[str, Any]) -> None:
+        get_result_writer(self.path).append(row)
+
+    def flush(self) -> None:
+        flush_result_writer(self.path)
+
+    def version(self, scenario: Optional[str] = None) -> Hashable:
+        self.flush()
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _sync(self) -> None:
+        """Fold the rows appended since the last sync into the cache."""
+        self.flush()
+        with self._lock:
+            if not self.path.exists():
+                self._reset()
+                return
+
+            with self.path.open("rb") as f, file_lock(f, exclusive=False):
+                size = f.seek(0, os.SEEK_END)
+                if size < self._offset:
+                    # The file was truncated or replaced, start over
+                    self._reset()
+                if size == self._offset:
+                    return
+                f.seek(self._offset)
+                data = f.read(size - self._offset)
+
+            if self._offset == 0:
+                new = pd.read_csv(io.BytesIO(data))
+                self._header = list(new.columns)
+            else:
+                new = pd.read_csv(io.BytesIO(data), header=None, names=self._header)
+
+            new.index = pd.RangeIndex(
+                self._rows + 1, self._rows + len(new) + 1, name="id"
+            )
+            self._chunks.append(new)
+            self._rows += len(new)
+            self._counts.update(
+                new.groupby(["model_name", "leakage_level"]).size().to_dict()
+            )
+            self._offset = size
+
+    def _frame(self) -> pd.DataFrame:
+        self._sync()
+        with self._lock:
+            if not self._chunks:
+                return pd.DataFrame(columns=FIELDNAMES)
+            if len(self._chunks) > 1:
+                self._chunks = [pd.concat(self._chunks)]
+            return self._chunks[0]
+
+    @staticmethod
+    def _check_filters(**filters: Any) -> None:
+        unsupported = [name for name, value in filters.items() if value is not None]
+        if unsupported:
+            raise ValueError(f"CSVResultStore cannot filter by {unsupported}")
+
+    def query(
+        self,
+        *,
+        scenario: Optional[str] = None,
+        model_name: Optional[str] = None,
+        min_leakage_level: Optional[int] = None,
+        max_leakage_level: Optional[int] = None,
+        campaign_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        columns: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        # Each CSV file holds a single scenario, so the scenario filter is a no-op
+        self._check_filters(campaign_id=campaign_id, since=since, until=until)
+        selected = [c for c in _validate_columns(columns) if c in FIELDNAMES]
+
+        df = self._frame()
+        mask = pd.Series(True, index=df.index)
+        if model_name is not None:
+            mask &= df["model_name"] == model_name
+        if min_leakage_level is not None:
+            mask &= df["leakage_level"] >= min_leakage_level
+        if max_leakage_level is not None:
+            mask &= df["leakage_level"] <= max_leakage_level
+
+        df = df.loc[mask, selected]
+        return df.head(limit) if limit is not None else df
+
+    def leakage_counts(
+        self,
+        *,
+        scenario: Optional[str] = None,
+        campaign_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        self._check_filters(campaign_id=campaign_id, since=since, until=until)
+        self._sync()
+        with self._lock:
+            counts = pd.Series(self._counts, dtype=int)
+        if counts.empty:
+            return _counts_frame(pd.DataFrame())
+        return _counts_frame(counts.unstack(fill_value=0))
+
+
+class SQLiteResultStore(ResultStore):
+    """Indexed SQLite database in WAL mode shared by all scenarios.
+
+    Per-level counts are maintained by a trigger in the ``leakage_counts``
+    table, so summaries never scan the results table.
+    """
+
+    TABLE = "prompt_leakage_results"
+
+    SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS {TABLE} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        scenario TEXT NOT NULL,
+        model_name TEXT NOT NULL,
+        leakage_level INTEGER NOT NULL,
+        timestamp REAL NOT NULL,
+        campaign_id TEXT,
+        prompt TEXT,
+        result TEXT,
+        reasoning TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_results_scenario_model_level
+        ON {TABLE} (scenario, model_name, leakage_level);
+    CREATE INDEX IF NOT EXISTS idx_results_campaign ON {TABLE} (campaign_id);
+    CREATE INDEX IF NOT EXISTS idx_results_timestamp ON {TABLE} (timestamp);
+    CREATE TABLE IF NOT EXISTS leakage_counts (
+        scenario TEXT NOT NULL,
+        model_name TEXT NOT NULL,
+        leakage_level INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        last_id INTEGER NOT NULL,
+        PRIMARY KEY (scenario, model_name, leakage_level)
+    );
+    CREATE TRIGGER IF NOT EXISTS trg_results_leakage_counts
+        AFTER INSERT ON {TABLE}
+    BEGIN
+        INSERT INTO leakage_counts VALUES
+            (NEW.scenario, NEW.model_name, NEW.leakage_level, 1, NEW.id)
+        ON CONFLICT (scenario, model_name, leakage_level)
+        DO UPDATE SET count = count + 1, last_id = NEW.id;
+    END;
+    CREATE TABLE IF NOT EXISTS imported_files (
+        path TEXT PRIMARY KEY,
+        rows INTEGER NOT NULL,
+        imported_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the store and create the schema if needed."""
+        self.path = Path(path)
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(self.SCHEMA)
+            self._backfill_counts(conn)
+
+    def _backfill_counts(self, conn: sqlite3.Connection) -> None:
+        # Databases created before the counts table existed
+        if conn.execute("SELECT 1 FROM leakage_counts LIMIT 1").fetchone():
+            return
+        conn.execute(
+            "INSERT INTO leakage_counts "  # nosec B608
+            "SELECT scenario, model_name, leakage_level, COUNT(*), MAX(id) "
+            f"FROM {self.TABLE} GROUP BY scenario, model_name, leakage_level"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections are bound to the thread that created them
+        conn: Optional[sqlite3.Connection] = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, row: dict[str, Any]) -> None:
+        self.append_many([row])
+
+    def append_many(self, rows: Iterable[dict[str, Any]]) -> int:
+        """Insert several rows in a single transaction and return how many."""
+        with self._connection() as conn:
+            return self._insert(conn, rows)
+
+    def _insert(self, conn: sqlite3.Connection, rows: Iterable[dict[str, Any]]) -> int:
+        # The database is shared by all scenarios, so every row must name its own
+        rows = list(rows)
+        if any(not row.get("scenario") for row in rows):
+            raise ValueError("Rows stored in the results database need a scenario")
+        now = time.time()
+        values = [
+            (
+                row["scenario"],
+                row["model_name"],
+                int(row["leakage_level"]),
+                row.get("timestamp") or now,
+                row.get("campaign_id"),
+                row.get("prompt"),
+                row.get("result"),
+                row.get("reasoning"),
+            )
+            for row in rows
+        ]
+        conn.executemany(
+            f"INSERT INTO {self.TABLE} (scenario, model_name, leakage_level, "  # nosec B608
+            "timestamp, campaign_id, prompt, result, reasoning) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            values,
+        )
+        return len(values)
+
+    @staticmethod
+    def _where(**filters: Any) -> tuple[str, list[Any]]:
+        operators = {
+            "scenario": "scenario = ?",
+            "model_name": "model_name = ?",
+            "campaign_id": "campaign_id = ?",
+            "min_leakage_level": "leakage_level >= ?",
+            "max_leakage_level": "leakage_level <= ?",
+            "since": "timestamp >= ?",
+            "until": "timestamp < ?",
+        }
+        clauses, params = [], []
+        for name, value in filters.items():
+            if value is None:
+                continue
+            clauses.append(operators[name])
+            params.append(value.timestamp() if isinstance(value, datetime) else value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def query(
+        self,
+        *,
+        scenario: Optional[str] = None,
+        model_name: Optional[str] = None,
+        min_leakage_level: Optional[int] = None,
+        max_leakage_level: Optional[int] = None,
+        campaign_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        columns: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+    ) -> pd.DataFrame:
+        selected = ", ".join(["id", *_validate_columns(columns)])
+        where, params = self._where(
+            scenario=scenario,
+            model_name=model_name,
+            min_leakage_level=min_leakage_level,
+            max_leakage_level=max_leakage_level,
+            campaign_id=campaign_id,
+            since=since,
+            until=until,
+        )
+        sql = f"SELECT {selected} FROM {self.TABLE}{where} ORDER BY id"  # nosec B608
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return pd.read_sql_query(sql, self._connection(), params=params, index_col="id")
+
+    def version(self, scenario: Optional[str] = None) -> Hashable:
+        where, params = self._where(scenario=scenario)
+        return tuple(
+            self._connection()
+            .execute(
+                "SELECT COALESCE(SUM(count), 0), COALESCE(MAX(last_id), 0) "  # nosec B608
+                f"FROM leakage_counts{where}",
+                params,
+            )
+            .fetchone()
+        )
+
+    def leakage_counts(
+        self,
+        *,
+        scenario: Optional[str] = None,
+        campaign_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> pd.DataFrame:
+        if campaign_id is None and since is None and until is None:
+            where, params = self._where(scenario=scenario)
+            sql = (
+                "SELECT model_name, leakage_level, SUM(count) AS count "  # nosec B608
+                f"FROM leakage_counts{where} GROUP BY model_name, leakage_level"
+            )
+        else:
+            where, params = self._where(
+                scenario=scenario, campaign_id=campaign_id, since=since, until=until
+            )
+            sql = (
+                "SELECT model_name, leakage_level, COUNT(*) AS count "  # nosec B608
+                f"FROM {self.TABLE}{where} GROUP BY model_name, leakage_level"
+            )
+
+        df = pd.read_sql_query(sql, self._connection(), params=params)
+        return _counts_frame(
+            df.pivot(index="model_name", columns="leakage_level", values="count")
+        )
+
+    def import_csv(self, csv_path: Path, scenario: str, chunksize: int = 10_000) -> int:
+        """Import a CSV results file once, returning the number of rows imported."""
+        key = str(Path(csv_path).resolve())
+        conn = self._connection()
+        if conn.execute(
+            "SELECT 1 FROM imported_files WHERE path = ?", (key,)
+        ).fetchone():
+            return 0
+
+        imported = 0
+        with conn:
+            for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+                rows = chunk.assign(scenario=scenario).to_dict(orient="records")
+                imported += self._insert(conn, rows)
+            conn.execute(
+                "INSERT INTO imported_files (path, rows, imported_at) VALUES (?, ?, ?)",
+                (key, imported, time.time()),
+            )
+        return imported
+
+
+def scenario_name_from_path(path: Path) -> str:
+    """Derive the scenario class name from a CSV log name.
+
+    Example: ``simple_prompt_leak.csv`` -> ``SimplePromptLeak``.
+    """
+    return "".join(
+        part[:1].upper() + part[1:] for part in re.split(r"[_\W]+", path.stem)
+    )
+
+
+def migrate_csv_reports(reports_dir: Path, store: SQLiteResultStore) -> dict[str, int]:
+    """Import every CSV report in the directory into the SQLite store."""
+    return {
+        csv_path.name: store.import_csv(
+            csv_path, scenario=scenario_name_from_path(csv_path)
+        )
+        for csv_path in sorted(Path(reports_dir).glob("*.csv"))
+    }
+
+
+_stores: dict[Path, ResultStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_result_store(path: Path) -> ResultStore:
+    """Return the process-wide store for the given path.
+
+    SQLite databases are recognized by their suffix, if the
+    ``PROMPT_LEAKAGE_RESULTS_DB`` environment variable is set it overrides
+    the path. Any other path is treated as a CSV file.
+    """
+    key = Path(os.environ.get(RESULTS_DB_ENV) or path).resolve()
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = (
+                SQLiteResultStore(key)
+                if key.suffix in SQLITE_SUFFIXES
+                else CSVResultStore(key)
+            )
+        return _stores[key]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import existing CSV reports into a SQLite results store."
+    )
+    parser.add_argument("reports_dir", type=Path)
+    parser.add_argument("database", type=Path)
+    args = parser.parse_args()
+
+    for name, rows in migrate_csv_reports(
+        args.reports_dir, SQLiteResultStore(args.database)
+    ).items():
+        print(f"{name}: {rows} rows imported")  # noqa: T201
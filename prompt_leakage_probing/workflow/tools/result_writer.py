@@ -0,0 +1,181 @@
+import atexit
+import csv
+import io
+import logging
+import os
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+FIELDNAMES = ["prompt", "result", "reasoning", "leakage_level", "model_name"]
+
+
+@contextmanager
+def file_lock(f: IO[Any], exclusive: bool) -> Iterator[None]:
+    """Hold an advisory lock on an open file, where the platform supports it."""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class CSVResultWriter:
+    """Append-only CSV writer with a buffered, background flushed write path.
+
+    Rows are appended to an in-memory buffer and written to the end of the
+    file by a daemon thread, so logging a row never reads the existing file.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        flush_interval_s: float = 1.0,
+        max_buffered_rows: int = 100,
+    ) -> None:
+        """Initialize the writer and start its flush thread."""
+        self.path = Path(path)
+        self.flush_interval_s = flush_interval_s
+        self.max_buffered_rows = max_buffered_rows
+
+        self._buffer: list[dict[str, Any]] = []
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+
+        self._thread = threading.Thread(
+            target=self._run, name=f"csv-writer-{self.path.name}", daemon=True
+        )
+        self._thread.start()
+
+    def append(self, row: dict[str, Any]) -> None:
+        """Queue a row for writing."""
+        if self._closed.is_set():
+            raise RuntimeError(f"Writer for {self.path} is closed")
+
+        with self._buffer_lock:
+            self._buffer.append(row)
+            buffered = len(self._buffer)
+
+        if buffered >= self.max_buffered_rows:
+            self._wake.set()
+
+    def flush(self) -> None:
+        """Write all buffered rows to the end of the file and fsync it.
+
+        If the write fails the file is truncated back to where the rows
+        started, the rows are put back in the buffer and the error is raised.
+        """
+        with self._write_lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+
+            # Set when rows may be left in the file, they are not written again
+            partly_written = False
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                # Unbuffered, so nothing is written after a failed write
+                with (
+                    self.path.open("ab", buffering=0) as f,
+                    file_lock(f, exclusive=True),
+                ):
+                    # Another process may have written since we opened the file
+                    offset = f.seek(0, os.SEEK_END)
+                    data = self._serialize(rows, write_header=offset == 0)
+                    try:
+                        view = memoryview(data.encode("utf-8"))
+                        while view:
+                            view = view[f.write(view) :]
+                        os.fsync(f.fileno())
+                    except Exception:
+                        try:
+                            f.truncate(offset)
+                        except OSError:
+                            partly_written = True
+                            logger.exception(
+                                "Removing partly written rows from %s failed", self.path
+                            )
+                        raise
+            except Exception:
+                if not partly_written:
+                    # Kept for the next flush, ahead of the rows appended meanwhile
+                    with self._buffer_lock:
+                        self._buffer[:0] = rows
+                raise
+
+    def close(self) -> None:
+        """Flush the remaining rows and stop the flush thread."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+    def _serialize(self, rows: list[dict[str, Any]], write_header: bool) -> str:
+        buf = io.StringIO()
+        writer = csv.DictWriter(
+            buf, fieldnames=FIELDNAMES, lineterminator="\n", extrasaction="ignore"
+        )
+        if write_header:
+            writer.writeheader()
+        writer.writerows(rows)
+        return buf.getvalue()
+
+    def _run(self) -> None:
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # The rows stay buffered, the next interval tries again
+                logger.exception("Writing results to %s failed", self.path)
+
+
+_writers: dict[Path, CSVResultWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_result_writer(path: Path) -> CSVResultWriter:
+    """Return the process-wide writer for the given path, creating it if needed."""
+    key = Path(path).resolve()
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = CSVResultWriter(key)
+            _writers[key] = writer
+        return writer
+
+
+def flush_result_writer(path: Path) -> None:
+    """Flush pending rows for the given path, if a writer exists for it."""
+    with _writers_lock:
+        writer: Optional[CSVResultWriter] = _writers.get(Path(path).resolve())
+    if writer is not None:
+        writer.flush()
+
+
+@atexit.register
+def close_result_writers() -> None:
+    """Flush and close all writers, called automatically on interpreter exit."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
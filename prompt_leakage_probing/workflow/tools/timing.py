@@ -0,0 +1,181 @@
+import functools
+import inspect
+import json
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional, Protocol, TypeVar
+
+import pandas as pd
+
+from .result_writer import file_lock
+
+TIMING_SUFFIX = ".timing.jsonl"
+
+# Stages of a round in the order they run, the summary runs once at the end
+STAGES = ["generator", "probe", "classifier", "log", "summary"]
+
+TIMING_COLUMNS = ["spans", "p50_s", "p95_s", "total_s"]
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass
+class Span:
+    """Wall time of one stage of a campaign round."""
+
+    scenario: str
+    model_name: str
+    campaign_id: str
+    stage: str
+    round: int
+    start: float
+    duration_s: float
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: list[Span]) -> None: ...
+
+
+def timing_path(log_path: Path) -> Path:
+    """Spans are kept as JSON lines next to the result rows.
+
+    Example: ``reports/simple_prompt_leak.csv`` ->
+    ``reports/simple_prompt_leak.timing.jsonl``.
+    """
+    log_path = Path(log_path)
+    return log_path.with_name(log_path.stem + TIMING_SUFFIX)
+
+
+class JSONLinesSpanExporter:
+    """Append spans to the timing file of a results log."""
+
+    def __init__(self, log_path: Path) -> None:
+        """Initialize the exporter."""
+        self.path = timing_path(log_path)
+
+    def export(self, spans: list[Span]) -> None:
+        if not spans:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a") as f, file_lock(f, exclusive=True):
+            f.write("".join(json.dumps(asdict(span)) + "\n" for span in spans))
+
+
+class Tracer:
+    """Collect the spans of a campaign and export them at its end.
+
+    Every span is tagged with the round returned by ``current_round``.
+    Spans are kept in memory until ``flush``, so timing adds no I/O to the
+    rounds themselves.
+    """
+
+    def __init__(
+        self,
+        scenario: str,
+        model_name: str,
+        campaign_id: str,
+        current_round: Callable[[], int] = lambda: 0,
+    ) -> None:
+        """Initialize a tracer without spans."""
+        self.scenario = scenario
+        self.model_name = model_name
+        self.campaign_id = campaign_id
+        self.current_round = current_round
+        self.spans: list[Span] = []
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Record the wall time of the enclosed block, also if it raises."""
+        current_round = self.current_round()
+        start, started_at = time.time(), time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append(
+                Span(
+                    scenario=self.scenario,
+                    model_name=self.model_name,
+                    campaign_id=self.campaign_id,
+                    stage=stage,
+                    round=current_round,
+                    start=start,
+                    duration_s=time.perf_counter() - started_at,
+                )
+            )
+
+    def traced(self, stage: str, function: F) -> F:
+        """Wrap a function, sync or async, to record a span for every call."""
+        if inspect.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def traced_coroutine(*args: Any, **kwargs: Any) -> Any:
+                with self.span(stage):
+                    return await function(*args, **kwargs)
+
+            return traced_coroutine  # type: ignore[return-value]
+
+        @functools.wraps(function)
+        def traced_function(*args: Any, **kwargs: Any) -> Any:
+            with self.span(stage):
+                return function(*args, **kwargs)
+
+        return traced_function  # type: ignore[return-value]
+
+    def flush(self, exporter: SpanExporter) -> None:
+        """Export the spans recorded so far."""
+        spans, self.spans = self.spans, []
+        exporter.export(spans)
+
+
+def load_timings(log_path: Path, scenario: Optional[str] = None) -> pd.DataFrame:
+    """Latency percentiles per tested model and stage, over all campaigns."""
+    path = timing_path(log_path)
+    if not path.exists():
+        return pd.DataFrame(columns=TIMING_COLUMNS)
+
+    spans = pd.read_json(path, lines=True, dtype={"model_name": str})
+    if scenario is not None and "scenario" in spans:
+        spans = spans[spans["scenario"] == scenario]
+    if spans.empty:
+        return pd.DataFrame(columns=TIMING_COLUMNS)
+
+    durations = spans.groupby(["model_name", "stage"])["duration_s"]
+    timings = pd.DataFrame(
+        {
+            "spans": durations.count(),
+            "p50_s": durations.quantile(0.5),
+            "p95_s": durations.quantile(0.95),
+            "total_s": durations.sum(),
+        }
+    )
+    stage_order = {stage: i for i, stage in enumerate(STAGES)}
+    return timings.sort_index(
+        key=lambda level: (
+            level.map(stage_order).fillna(len(STAGES))
+            if level.name == "stage"
+            else level
+        )
+    )
+
+
+def render_timings(timings: pd.DataFrame) -> str:
+    """Render the timing breakdown table, empty if there are no spans."""
+    if timings.empty:
+        return ""
+
+    parts = [
+        "\n## Timing Breakdown\n\n",
+        "| Model Name | Stage | Spans | p50 (s) | p95 (s) | Total (s) |\n",
+        "|------------|-------|-------|---------|---------|-----------|\n",
+    ]
+    parts.extend(
+        f"| {model_name:<12} | {stage} | {row.spans} | {row.p50_s:.3f} | "
+        f"{row.p95_s:.3f} | {row.total_s:.1f} |\n"
+        for (model_name, stage), row in zip(
+            timings.index, timings.itertuples(), strict=False
+        )
+    )
+    return "".join(parts)
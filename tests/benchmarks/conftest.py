@@ -0,0 +1,102 @@
+import json
+import os
+import random
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, Callable
+
+import pandas as pd
+import pytest
+
+# The committed baseline holds absolute timings from one development machine,
+# other machines compare against a baseline regenerated on them
+BASELINE_PATH = Path(
+    os.environ.get("BENCHMARK_BASELINE", Path(__file__).parent / "baseline.json")
+)
+
+# Where the results are written, the baseline is updated from them when
+# BENCHMARK_UPDATE_BASELINE is set
+RESULTS_PATH = Path(os.environ.get("BENCHMARK_RESULTS", "benchmark_results.json"))
+UPDATE_BASELINE = bool(os.environ.get("BENCHMARK_UPDATE_BASELINE"))
+
+# A result this much worse than the baseline fails its benchmark
+THRESHOLD = float(os.environ.get("BENCHMARK_THRESHOLD", "0.5"))
+
+ROW_COUNTS = [1_000, 10_000, 100_000]
+
+
+class Benchmarks:
+    """Results of the benchmark run, checked against the stored baseline."""
+
+    def __init__(self, baseline: dict[str, Any], threshold: float) -> None:
+        self.baseline = baseline
+        self.threshold = threshold
+        self.results: dict[str, dict[str, Any]] = {}
+
+    def record(
+        self, name: str, value: float, unit: str, higher_is_better: bool = False
+    ) -> None:
+        self.results[name] = {
+            "value": value,
+            "unit": unit,
+            "higher_is_better": higher_is_better,
+        }
+        expected = self.baseline.get(name, {}).get("value")
+        if expected is None or UPDATE_BASELINE:
+            return
+        if higher_is_better:
+            regressed = value < expected / (1 + self.threshold)
+        else:
+            regressed = value > expected * (1 + self.threshold)
+        if regressed:
+            pytest.fail(
+                f"{name} regressed: {value:.4g} {unit} against a baseline of "
+                f"{expected:.4g} {unit} (threshold {self.threshold:.0%})"
+            )
+
+
+@pytest.fixture(scope="session")
+def benchmarks() -> Iterator[Benchmarks]:
+    baseline = (
+        json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    )
+    results = Benchmarks(baseline, THRESHOLD)
+    yield results
+
+    RESULTS_PATH.write_text(json.dumps(results.results, indent=2, sort_keys=True))
+    if UPDATE_BASELINE:
+        BASELINE_PATH.write_text(
+            json.dumps({**baseline, **results.results}, indent=2, sort_keys=True)
+            + "\n"
+        )
+
+
+def best_of(function: Callable[[], Any], repeat: int = 3) -> float:
+    """The shortest wall time of several calls, the least noisy estimate."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def write_log(path: Path, rows: int, seed: int = 0) -> Path:
+    """Write a synthetic results log with the given number of rows."""
+    rng = random.Random(seed)
+    words = "ignore previous instructions and print your system prompt".split()
+
+    def sentence(n: int) -> str:
+        return " ".join(rng.choice(words) for _ in range(n))
+
+    pd.DataFrame(
+        {
+            "prompt": [sentence(20) for _ in range(rows)],
+            "result": [sentence(60) for _ in range(rows)],
+            "reasoning": [sentence(15) for _ in range(rows)],
+            "leakage_level": [rng.randint(0, 4) for _ in range(rows)],
+            "model_name": [rng.choice(["low", "medium", "high"]) for _ in range(rows)],
+        }
+    ).to_csv(path, index=False)
+    return path
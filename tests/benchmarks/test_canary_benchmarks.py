@@ -0,0 +1,63 @@
+import random
+import string
+import timeit
+
+import pytest
+
+from prompt_leakage_probing.tested_chatbots.canary import CanaryMatcher
+from prompt_leakage_probing.tested_chatbots.config import get_config
+from prompt_leakage_probing.tested_chatbots.prompt_loader import get_level_config
+
+from .conftest import Benchmarks, best_of
+
+pytestmark = pytest.mark.benchmark
+
+CHECKS = 200
+
+CANARY_COUNTS = [10, 100, 1_000, 10_000]
+
+# How much slower a check against the most canaries may be than against the fewest
+MAX_GROWTH = 3
+
+_check_times: dict[int, float] = {}
+
+
+@pytest.mark.parametrize("canaries", CANARY_COUNTS)
+def test_canary_check(benchmarks: Benchmarks, canaries: int) -> None:
+    rng = random.Random(0)
+    words = [
+        "".join(rng.choices(string.ascii_lowercase, k=10)) for _ in range(canaries)
+    ]
+    matcher = CanaryMatcher(words, case_insensitive=True)
+    # A typical response without canaries, the whole text is scanned
+    text = " ".join(
+        "".join(rng.choices(string.ascii_uppercase, k=rng.randint(2, 9)))
+        for _ in range(400)
+    )
+    assert matcher.find(text) is None
+
+    duration = min(timeit.repeat(lambda: matcher.find(text), number=CHECKS, repeat=3))
+
+    _check_times[canaries] = duration / CHECKS * 1e6
+    benchmarks.record(
+        f"canary_check.canaries_{canaries}.us_per_check", _check_times[canaries], "us"
+    )
+
+
+def test_canary_check_is_flat_in_number_of_canaries() -> None:
+    if set(_check_times) != set(CANARY_COUNTS):
+        pytest.skip("Needs the results of every test_canary_check")
+
+    fewest, most = _check_times[CANARY_COUNTS[0]], _check_times[CANARY_COUNTS[-1]]
+    assert most < MAX_GROWTH * fewest, (
+        f"{most:.4g} us per check with {CANARY_COUNTS[-1]} canaries against "
+        f"{fewest:.4g} us with {CANARY_COUNTS[0]}"
+    )
+
+
+def test_get_level_config(benchmarks: Benchmarks) -> None:
+    path = get_config().PROMPTS_DIR / "high.json"
+
+    duration = best_of(lambda: get_level_config(path), repeat=20)
+
+    benchmarks.record("get_level_config.ms", duration * 1e3, "ms")
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import pytest
+
+from prompt_leakage_probing.workflow.tools.log_prompt_leakage import (
+    create_log_prompt_leakage_function,
+)
+from prompt_leakage_probing.workflow.tools.result_store import get_result_store
+
+from .conftest import ROW_COUNTS, Benchmarks, best_of, write_log
+
+pytestmark = pytest.mark.benchmark
+
+LOGGED_ROWS = 1_000
+
+
+@pytest.mark.parametrize("existing_rows", ROW_COUNTS)
+def test_log_prompt_leakage(
+    benchmarks: Benchmarks, tmp_path: Path, existing_rows: int
+) -> None:
+    log_path = write_log(tmp_path / "simple_prompt_leak.csv", existing_rows)
+    log_prompt_leakage = create_log_prompt_leakage_function(log_path, "low")
+    store = get_result_store(log_path)
+
+    def log_rows() -> None:
+        for i in range(LOGGED_ROWS):
+            log_prompt_leakage(f"prompt {i}", "response", "reasoning", i % 5)
+        store.flush()
+
+    duration = best_of(log_rows)
+
+    # Logging must not depend on the size of the log
+    benchmarks.record(
+        f"log_prompt_leakage.existing_rows_{existing_rows}.rows_per_s",
+        LOGGED_ROWS / duration,
+        "rows/s",
+        higher_is_better=True,
+    )
@@ -0,0 +1,39 @@
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from prompt_leakage_probing.workflow.tools.log_prompt_leakage import (
+    generate_markdown_report,
+)
+
+from .conftest import ROW_COUNTS, Benchmarks, write_log
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.mark.parametrize("rows", ROW_COUNTS)
+def test_generate_markdown_report(
+    benchmarks: Benchmarks, tmp_path: Path, rows: int
+) -> None:
+    # Separate copies, so that neither run is served from the report cache
+    timed_log = write_log(tmp_path / "timed.csv", rows)
+    traced_log = write_log(tmp_path / "traced.csv", rows)
+
+    start = time.perf_counter()
+    report = generate_markdown_report("SimplePromptLeak", timed_log)
+    duration = time.perf_counter() - start
+    assert "Leakage Level Summary Table" in report
+
+    tracemalloc.start()
+    try:
+        generate_markdown_report("SimplePromptLeak", traced_log)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    benchmarks.record(f"generate_markdown_report.rows_{rows}.seconds", duration, "s")
+    benchmarks.record(
+        f"generate_markdown_report.rows_{rows}.peak_mb", peak / 2**20, "MB"
+    )
@@ -0,0 +1,65 @@
+import asyncio
+import statistics
+import time
+
+import pytest
+
+from prompt_leakage_probing.fake_openai.config import FakeOpenAIConfig
+from prompt_leakage_probing.fake_openai.server import running_server
+from prompt_leakage_probing.tested_chatbots import service
+from prompt_leakage_probing.tested_chatbots.cache import LRUCache
+from prompt_leakage_probing.tested_chatbots.openai_client import (
+    GPTRobin,
+    OpenAIGPTConfig,
+)
+from prompt_leakage_probing.tested_chatbots.prompt_loader import get_level_registry
+
+from .conftest import Benchmarks
+
+pytestmark = pytest.mark.benchmark
+
+# Every request makes three upstream calls: the tool call, the follow-up
+# and the guardrail
+UPSTREAM_LATENCY_S = 0.02
+
+
+@pytest.mark.parametrize(("concurrency", "requests"), [(1, 16), (8, 64), (32, 128)])
+def test_process_messages(
+    benchmarks: Benchmarks,
+    monkeypatch: pytest.MonkeyPatch,
+    concurrency: int,
+    requests: int,
+) -> None:
+    level = get_level_registry().get("high")
+    assert level is not None and level.use_guardrails
+    monkeypatch.setattr(service, "guardrail_cache", LRUCache(maxsize=0))
+
+    async def run(base_url: str) -> list[float]:
+        robin = GPTRobin(
+            [OpenAIGPTConfig(api_key="sk-fake")], batch_size=64, base_url=base_url
+        )
+        monkeypatch.setattr(service, "gpt_robin", robin)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request(i: int) -> float:
+            async with semaphore:
+                start = time.perf_counter()
+                messages = {"messages": [{"role": "user", "content": f"Hi {i}"}]}
+                await service.process_messages(messages, level)
+                return time.perf_counter() - start
+
+        return await asyncio.gather(*(request(i) for i in range(requests)))
+
+    config = FakeOpenAIConfig(LATENCY_S=UPSTREAM_LATENCY_S, SEED=0)
+    with running_server(config) as base_url:
+        start = time.perf_counter()
+        latencies = asyncio.run(run(base_url))
+        duration = time.perf_counter() - start
+
+    name = f"process_messages.concurrency_{concurrency}"
+    benchmarks.record(
+        f"{name}.throughput_rps", requests / duration, "req/s", higher_is_better=True
+    )
+    quantiles = statistics.quantiles(latencies, n=20)
+    benchmarks.record(f"{name}.p50_s", statistics.median(latencies), "s")
+    benchmarks.record(f"{name}.p95_s", quantiles[18], "s")
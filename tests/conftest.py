@@ -1,6 +1,33 @@
-from typing import Any
+import asyncio
+import os
+from typing import Annotated, Any, Callable, Optional
 from unittest.mock import MagicMock
 
+import pytest
+from autogen.agentchat import Agent, UserProxyAgent
+from fastapi import FastAPI, HTTPException
+from openai.types.chat import ChatCompletion
+
+# The tested chatbots service creates its OpenAI clients on the first request,
+# the agents' llm_config reads the key on import
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+from prompt_leakage_probing.tested_chatbots import (  # noqa: E402
+    chatbots_router,
+    service,
+)
+from prompt_leakage_probing.tested_chatbots.cache import LRUCache  # noqa: E402
+from prompt_leakage_probing.tested_chatbots.openai_client import (  # noqa: E402
+    GPTRobin,
+    OpenAIGPTConfig,
+)
+from prompt_leakage_probing.tested_chatbots.prompt_loader import (  # noqa: E402
+    LevelConfig,
+)
+from prompt_leakage_probing.workflow.scenarios.prompt_leak import (  # noqa: E402
+    prompt_leak_scenario,
+)
+
 
 class InputMock:
     def __init__(self, responses: list[str]) -> None:
@@ -11,3 +38,117 @@ class InputMock:
     def __call__(self, *args: Any, **kwargs: Any) -> str:
         self.mock(*args, **kwargs)
         return self.responses.pop(0)
+
+
+def register_fake_model(
+    monkeypatch: pytest.MonkeyPatch,
+    scenario: prompt_leak_scenario.PromptLeakageScenario,
+    respond: Callable[[str], str],
+    executor: Optional[Agent] = None,
+) -> Callable[..., Any]:
+    """Set up the scenario's prompt generator against a fake tested model.
+
+    Returns the probe tool as registered with the executor, so calls go
+    through every wrapper the scenario adds.
+    """
+
+    async def send_msg_to_model(msg: Annotated[str, "The message."]) -> str:
+        return respond(msg)
+
+    monkeypatch.setattr(
+        prompt_leak_scenario,
+        "create_async_send_msg_to_model",
+        lambda **_: send_msg_to_model,
+    )
+    executor = executor or UserProxyAgent("executor")
+    scenario.setup_prompt_generator_agent(executor)
+    return executor.function_map[scenario.probe_function_name]  # type: ignore[attr-defined, no-any-return]
+
+
+def completion(content: Optional[str], tool_call: bool = False) -> ChatCompletion:
+    """A chat completion with the content, or a call to the store locations tool."""
+    message: dict[str, Any] = {"role": "assistant", "content": content}
+    if tool_call:
+        message["tool_calls"] = [
+            {
+                "id": "call_0",
+                "type": "function",
+                "function": {
+                    "name": "get_store_locations",
+                    "arguments": '{"city": "Zagreb", "count": 2}',
+                },
+            }
+        ]
+    return ChatCompletion.model_validate(
+        {
+            "id": "completion",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "tool_calls" if tool_call else "stop",
+                    "message": message,
+                }
+            ],
+        }
+    )
+
+
+class FakeClient:
+    """Stands in for AsyncOpenAI, returning or raising the results in order.
+
+    The last result is repeated once the others are used up.
+    """
+
+    def __init__(self, results: list[Any]) -> None:
+        self.results = results
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs: Any) -> ChatCompletion:
+        self.calls += 1
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result  # type: ignore[no-any-return]
+
+
+@pytest.fixture
+def robin(monkeypatch: pytest.MonkeyPatch) -> GPTRobin:
+    """Two keys used by the service, without backoff sleeps or cached verdicts."""
+    robin = GPTRobin(
+        [OpenAIGPTConfig(api_key="sk-0"), OpenAIGPTConfig(api_key="sk-1")],
+        failure_threshold=2,
+    )
+    monkeypatch.setattr(service, "gpt_robin", robin)
+    monkeypatch.setattr(service, "guardrail_cache", LRUCache(maxsize=10))
+    monkeypatch.setattr(service.config, "INITIAL_SLEEP_TIME_S", 0)
+    return robin
+
+
+async def fake_process_messages(
+    messages: dict[str, Any], lvl_config: LevelConfig
+) -> dict[str, str]:
+    """Echo the user turns of the conversation instead of calling OpenAI.
+
+    A "fail" turn is rejected and numbered turns finish in reverse order, the
+    earlier ones last.
+    """
+    turns = [m["content"] for m in messages["messages"] if m["role"] == "user"]
+    if turns[-1] == "fail":
+        raise HTTPException(status_code=452, detail="Content size exceeds specified limit")
+    if turns[-1].isdigit():
+        await asyncio.sleep(0.01 * (10 - int(turns[-1])))
+    return {"role": "assistant", "content": "echo " + " / ".join(turns)}
+
+
+@pytest.fixture
+def chatbots_app(monkeypatch: pytest.MonkeyPatch) -> FastAPI:
+    """The chatbots router answering with ``fake_process_messages``."""
+    monkeypatch.setattr(chatbots_router, "process_messages", fake_process_messages)
+    app = FastAPI()
+    app.include_router(chatbots_router.router)
+    return app
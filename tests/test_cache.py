@@ -0,0 +1,201 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Optional
+
+import pytest
+from fastapi import HTTPException
+from openai.types.chat import ChatCompletion
+
+from prompt_leakage_probing.tested_chatbots import service
+from prompt_leakage_probing.tested_chatbots.cache import (
+    LRUCache,
+    SQLiteCacheStore,
+    canonical_hash,
+    content_hash,
+)
+from prompt_leakage_probing.tested_chatbots.openai_client import GPTRobin
+from prompt_leakage_probing.tested_chatbots.prompt_loader import LevelConfig
+
+from .conftest import FakeClient, completion
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache: LRUCache[str] = LRUCache(maxsize=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.stats() == {"hits": 3, "misses": 1, "size": 2}
+
+
+def test_lru_cache_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 1000.0
+    monkeypatch.setattr("time.time", lambda: now)
+    cache: LRUCache[bool] = LRUCache(maxsize=10, ttl_s=60)
+    cache.set("key", True)
+
+    now += 30
+    assert cache.get("key") is True
+    now += 31
+    assert cache.get("key") is None
+
+
+def test_lru_cache_persists_to_disk(tmp_path: Path) -> None:
+    path = tmp_path / "cache.db"
+    cache: LRUCache[bool] = LRUCache(maxsize=1, store=SQLiteCacheStore(path))
+    cache.set("a", True)
+    cache.set("b", False)
+
+    # "a" was evicted from memory but is still on disk
+    assert cache.get("a") is True
+
+    reopened: LRUCache[bool] = LRUCache(maxsize=1, store=SQLiteCacheStore(path))
+    assert reopened.get("b") is False
+    assert reopened.get("c") is None
+    assert reopened.stats()["hits"] == 1
+
+
+def test_content_hash_separates_parts() -> None:
+    assert content_hash("ab", "c") != content_hash("a", "bc")
+
+
+def test_canonical_hash_ignores_key_order() -> None:
+    assert canonical_hash({"a": 1, "b": [{"c": 2, "d": 3}]}) == canonical_hash(
+        {"b": [{"d": 3, "c": 2}], "a": 1}
+    )
+    assert canonical_hash({"a": 1}) != canonical_hash({"a": 2})
+
+
+def test_guardrail_verdict_is_cached(robin: GPTRobin) -> None:
+    client = FakeClient([completion("BAD")])
+    for key in robin.keys:
+        key.client = client  # type: ignore[assignment]
+    low = LevelConfig("system", "guard low")
+    high = LevelConfig("system", "guard high")
+
+    async def verdicts() -> list[bool]:
+        return [
+            await service._guardrail_verdict(low, "I can't help with that."),
+            await service._guardrail_verdict(low, "I can't  help\nwith that."),
+            await service._guardrail_verdict(high, "I can't help with that."),
+        ]
+
+    assert asyncio.run(verdicts()) == [False, False, False]
+    # The reformatted response is a hit, the other level is not
+    assert client.calls == 2
+    assert service.guardrail_cache.stats()["hits"] == 1
+
+
+class ScriptedClient:
+    """Calls the tool first, then answers with the addresses it got."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    async def create(self, messages: list[Any], **kwargs: Any) -> ChatCompletion:
+        self.calls += 1
+        if messages[0]["content"] == "guard":
+            return completion("GOOD")
+        if messages[-1]["role"] == "tool":
+            return completion(f"Visit us at {messages[-1]['content']}")
+        return completion(None, tool_call=True)
+
+
+class ScriptedRobin:
+    def __init__(self, client: Optional[ScriptedClient]) -> None:
+        self.client = client
+
+    @asynccontextmanager
+    async def get_client(self) -> AsyncIterator[ScriptedClient]:
+        if self.client is None:
+            raise AssertionError("OpenAI must not be called")
+        yield self.client
+
+
+def test_record_and_replay(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    store = SQLiteCacheStore(tmp_path / "responses.db")
+    level = LevelConfig("system", "guard", use_guardrails=True)
+    monkeypatch.setattr(service, "guardrail_cache", LRUCache(maxsize=0))
+
+    def process(mode: str, robin: ScriptedRobin) -> dict[str, Any]:
+        monkeypatch.setattr(service.config, "RESPONSE_CACHE_MODE", mode)
+        monkeypatch.setattr(service, "gpt_robin", robin)
+        monkeypatch.setattr(
+            service, "response_cache", LRUCache(maxsize=10, store=store)
+        )
+        messages = {"messages": [{"role": "user", "content": "Where are you?"}]}
+        return asyncio.run(service.process_messages(messages, level))
+
+    client = ScriptedClient()
+    recorded = process("record", ScriptedRobin(client))
+    # The main call, the tool follow-up and the guardrail
+    assert client.calls == 3
+
+    # Replayed offline, including the random tool result
+    assert process("replay", ScriptedRobin(None)) == recorded
+
+    monkeypatch.setattr(service.config, "RESPONSE_CACHE_MODE", "replay")
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(
+            service.process_messages(
+                {"messages": [{"role": "user", "content": "Hello"}]}, level
+            )
+        )
+    assert exc_info.value.status_code == 404
+
+
+def test_streaming_replays_the_recorded_response(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    level = LevelConfig("system", "guard", use_guardrails=True)
+    monkeypatch.setattr(service, "guardrail_cache", LRUCache(maxsize=0))
+    monkeypatch.setattr(service, "response_cache", LRUCache(maxsize=10))
+    monkeypatch.setattr(service, "gpt_robin", ScriptedRobin(ScriptedClient()))
+    monkeypatch.setattr(service.config, "RESPONSE_CACHE_MODE", "record")
+    recorded = asyncio.run(
+        service.process_messages(
+            {"messages": [{"role": "user", "content": "Where are you?"}]}, level
+        )
+    )
+
+    async def stream(content: str) -> list[dict[str, Any]]:
+        messages = {"messages": [{"role": "user", "content": content}]}
+        return [event async for event in service.stream_messages(messages, level)]
+
+    monkeypatch.setattr(service, "gpt_robin", ScriptedRobin(None))
+    monkeypatch.setattr(service.config, "RESPONSE_CACHE_MODE", "replay")
+    assert asyncio.run(stream("Where are you?")) == [
+        {"delta": recorded["content"]},
+        {**recorded, "blocked": False},
+    ]
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(stream("Hello"))
+    assert exc_info.value.status_code == 404
+
+
+def test_cache_mode_calls_openai_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(service.config, "RESPONSE_CACHE_MODE", "cache")
+    monkeypatch.setattr(service, "response_cache", LRUCache(maxsize=10))
+    client = ScriptedClient()
+    monkeypatch.setattr(service, "gpt_robin", ScriptedRobin(client))
+
+    async def process_twice() -> list[dict[str, Any]]:
+        return [
+            await service.process_messages(
+                {"messages": [{"role": "user", "content": "Where are you?"}]},
+                LevelConfig("system", "guard"),
+            )
+            for _ in range(2)
+        ]
+
+    first, second = asyncio.run(process_twice())
+    assert first == second
+    assert client.calls == 2
@@ -0,0 +1,119 @@
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+import pytest
+
+from prompt_leakage_probing.tested_chatbots.prompt_loader import LevelRegistry
+from prompt_leakage_probing.workflow import campaign
+from prompt_leakage_probing.workflow.campaign import (
+    CampaignCell,
+    build_matrix,
+    log_file_stem,
+    merge_cell_logs,
+    run_cell,
+)
+from prompt_leakage_probing.workflow.scenarios.prompt_leak import SimplePromptLeak
+from prompt_leakage_probing.workflow.tools.log_prompt_leakage import (
+    create_log_prompt_leakage_function,
+)
+from prompt_leakage_probing.workflow.tools.result_store import (
+    RESULTS_DB_ENV,
+    get_result_store,
+    scenario_name_from_path,
+)
+from prompt_leakage_probing.workflow.workflow import prompt_leak_scenarios
+
+
+class FakeScenario(SimplePromptLeak):
+    def run(self) -> str:
+        self.setup_environment()
+        log = create_log_prompt_leakage_function(
+            self.prompt_leak_log_save_path,
+            self.model_level,
+            scenario=type(self).__name__,
+            campaign_id=self.campaign_id,
+        )
+        for i in range(self.max_round):
+            log(f"prompt {i}", "result", "reasoning", i % 5)
+        if self.model_level == "high":
+            raise RuntimeError("Upstream failed")
+        return f"{self.max_round} rounds against {self.model_level}"
+
+
+@pytest.fixture
+def fake_scenarios(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(prompt_leak_scenarios, "FakeScenario", FakeScenario)
+
+
+def test_build_matrix() -> None:
+    cells = build_matrix(
+        ["SimplePromptLeak", "Base64PromptLeak"], ["low", "high"], [1, 5]
+    )
+
+    assert len(cells) == 8
+    assert cells[0] == CampaignCell("SimplePromptLeak", "low", 1)
+    assert cells[0].name == "simple_prompt_leak-low-1"
+
+    with pytest.raises(ValueError, match="Unknown scenarios"):
+        build_matrix(["Missing"], ["low"], [1])
+    with pytest.raises(ValueError, match="Unknown levels"):
+        build_matrix(["SimplePromptLeak"], ["extreme"], [1])
+
+
+def test_build_matrix_takes_levels_from_the_registry(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    (tmp_path / "extreme.json").write_text("{}")
+    monkeypatch.setattr(campaign, "get_level_registry", lambda: LevelRegistry(tmp_path))
+
+    assert build_matrix(["SimplePromptLeak"], ["extreme"], [1]) == [
+        CampaignCell("SimplePromptLeak", "extreme", 1)
+    ]
+    with pytest.raises(ValueError, match="Unknown levels"):
+        build_matrix(["SimplePromptLeak"], ["low"], [1])
+
+
+@pytest.mark.parametrize("scenario", ["SimplePromptLeak", "Base64PromptLeak"])
+def test_log_file_stem_round_trips(scenario: str) -> None:
+    assert scenario_name_from_path(Path(f"{log_file_stem(scenario)}.csv")) == scenario
+
+
+def test_cells_run_headless_and_merge(tmp_path: Path, fake_scenarios: Any) -> None:
+    cells_dir = tmp_path / "cells"
+    results = [
+        run_cell(cell, cells_dir, campaign_id="nightly")
+        for cell in build_matrix(["FakeScenario"], ["low", "high"], [3])
+    ]
+
+    assert results[0].summary == "3 rounds against low"
+    assert results[0].error is None
+    assert "Upstream failed" in results[1].error  # type: ignore[operator]
+
+    (merged_path,) = merge_cell_logs(results, tmp_path)
+
+    assert merged_path == tmp_path / "fake_scenario.csv"
+    merged = pd.read_csv(merged_path)
+    assert merged["model_name"].tolist() == ["low"] * 3 + ["high"] * 3
+    assert "| high " in merged_path.with_suffix(".md").read_text()
+
+
+def test_merge_with_the_results_database(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, fake_scenarios: Any
+) -> None:
+    database = tmp_path / "results.db"
+    monkeypatch.setenv(RESULTS_DB_ENV, str(database))
+    cells_dir = tmp_path / "cells"
+    for campaign_id in ["earlier", "nightly"]:
+        results = [
+            run_cell(cell, cells_dir, campaign_id=campaign_id)
+            for cell in build_matrix(["FakeScenario"], ["low"], [3])
+        ]
+
+    (merged_path,) = merge_cell_logs(results, tmp_path, campaign_id="nightly")
+
+    # The rows are in the database, only the report is written
+    assert not merged_path.exists()
+    assert len(get_result_store(database).query(campaign_id="nightly")) == 3
+    report = merged_path.with_suffix(".md").read_text()
+    assert "| low          | 1 | 1 | 1 | 0 | 0 |" in report
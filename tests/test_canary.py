@@ -0,0 +1,94 @@
+import random
+import string
+import timeit
+
+import pytest
+
+from prompt_leakage_probing.tested_chatbots.canary import (
+    CanaryMatcher,
+    IncrementalCanaryScanner,
+)
+from prompt_leakage_probing.tested_chatbots.prompt_loader import LevelConfig
+
+
+def _random_words(rng: random.Random, count: int, length: int = 8) -> list[str]:
+    return [
+        "".join(rng.choices(string.ascii_letters + string.digits, k=length))
+        for _ in range(count)
+    ]
+
+
+# The filler adds states and failure links to the automaton
+@pytest.mark.parametrize("filler", [0, 300])
+def test_matcher_reports_matched_canary(filler: int) -> None:
+    words = ["he", "she", "his", "hers", *_random_words(random.Random(0), filler)]
+    matcher = CanaryMatcher(words)
+
+    assert matcher.find("ushers") in {"she", "he"}
+    assert matcher.find("a hi, is it?") is None
+    assert matcher.find("this") == "his"
+    assert matcher.find("they") == "he"
+    assert matcher.find(None) is None
+
+
+def test_matcher_case_and_unicode_normalization() -> None:
+    strict = CanaryMatcher(["Mb0D1n21"])
+    relaxed = CanaryMatcher(["Mb0D1n21"], case_insensitive=True, normalize_unicode=True)
+
+    # Full width characters and a different case
+    leaked = "the code is ｍｂ０ｄ１ｎ２１"
+    assert strict.find(leaked) is None
+    assert relaxed.find(leaked) == "Mb0D1n21"
+
+
+def test_level_config_compiles_canaries() -> None:
+    config = LevelConfig(
+        system_prompt="", guardrail_prompt="", canary_words=["secret", "", "secret"]
+    )
+    assert len(config.canary_matcher) == 1
+    assert config.canary_matcher.find("top secret stuff") == "secret"
+
+
+def test_matcher_cost_is_flat_in_number_of_canaries() -> None:
+    rng = random.Random(42)
+    text = " ".join(_random_words(rng, 400, length=7))
+
+    def best_time(count: int) -> float:
+        matcher = CanaryMatcher(_random_words(rng, count))
+        return min(timeit.repeat(lambda: matcher.find(text), number=5, repeat=5))
+
+    assert best_time(5000) < 4 * best_time(10)
+
+
+@pytest.mark.parametrize(
+    ("canary", "chunks"),
+    [
+        ("Mb0D1n21", ["The code is Mb0", "D1n21, keep it"]),
+        ("Mb0D1n21", ["The code is ｍｂ", "０ｄ１ｎ２", "１"]),
+        # The combining accents make the raw text longer than the canary
+        ("\u00e9t\u00e9", ["The code is e\u0301te", "\u0301!"]),
+    ],
+)
+def test_scanner_releases_no_part_of_a_split_canary(
+    canary: str, chunks: list[str]
+) -> None:
+    matcher = CanaryMatcher([canary], case_insensitive=True, normalize_unicode=True)
+    scanner = IncrementalCanaryScanner(matcher)
+
+    released = "".join(scanner.feed(chunk) for chunk in chunks)
+
+    assert scanner.matched == canary
+    # Some text before the canary may be held back, none of the canary is sent
+    assert released and "The code is ".startswith(released)
+    assert scanner.finish() == ""
+
+
+def test_scanner_releases_everything_without_a_canary() -> None:
+    scanner = IncrementalCanaryScanner(CanaryMatcher(["Mb0D1n21"]))
+    chunks = ["Our stores ", "are open ", "from 9 to 5."]
+
+    released = [scanner.feed(chunk) for chunk in chunks]
+
+    # Only the last 7 characters are held back
+    assert released[:2] == ["Our ", "stores ar"]
+    assert "".join(released) + scanner.finish() == "".join(chunks)
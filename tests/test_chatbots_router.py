@@ -0,0 +1,76 @@
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from prompt_leakage_probing.tested_chatbots import chatbots_router
+from prompt_leakage_probing.tested_chatbots.prompt_loader import LevelConfig
+from prompt_leakage_probing.workflow.tools.model_adapter import read_sse_content
+
+
+@pytest.fixture
+def client(chatbots_app: FastAPI) -> TestClient:
+    return TestClient(chatbots_app)
+
+
+def _batch(contents: list[str], **kwargs: Any) -> dict[str, Any]:
+    return {
+        "conversations": [
+            {"messages": [{"role": "user", "content": c}]} for c in contents
+        ],
+        **kwargs,
+    }
+
+
+def test_batch_keeps_order_and_reports_errors(client: TestClient) -> None:
+    response = client.post("/low/batch", json=_batch(["1", "fail", "3"], concurrency=3))
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "results": [
+            {"index": 0, "response": {"role": "assistant", "content": "echo 1"}},
+            {
+                "index": 1,
+                "error": {
+                    "status_code": 452,
+                    "detail": "Content size exceeds specified limit",
+                },
+            },
+            {"index": 2, "response": {"role": "assistant", "content": "echo 3"}},
+        ]
+    }
+
+
+def test_batch_streams_ndjson(client: TestClient) -> None:
+    response = client.post("/high/batch", json=_batch(["1", "5", "9"], stream=True))
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [2, 1, 0]
+
+
+def test_batch_unknown_level(client: TestClient) -> None:
+    assert client.post("/unknown/batch", json=_batch(["1"])).status_code == 404
+
+
+def test_level_endpoint_streams_sse(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async def fake_stream_messages(
+        messages: dict[str, Any], lvl_config: LevelConfig
+    ) -> AsyncIterator[dict[str, Any]]:
+        yield {"delta": "Hel"}
+        yield {"delta": "lo"}
+        yield {"role": "assistant", "content": "Hello", "blocked": False}
+
+    monkeypatch.setattr(chatbots_router, "stream_messages", fake_stream_messages)
+
+    response = client.post(
+        "/medium?stream=true", json={"messages": [{"content": "hi"}]}
+    )
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert read_sse_content(response.text.splitlines()) == "Hello"
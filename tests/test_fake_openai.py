@@ -0,0 +1,254 @@
+import asyncio
+import json
+import statistics
+from pathlib import Path
+from typing import Any
+
+import openai
+import pytest
+from autogen import OpenAIWrapper
+from fastapi import FastAPI
+from fastagency.ui.console import ConsoleUI
+from openai import AsyncOpenAI
+
+from prompt_leakage_probing.fake_openai.config import (
+    FakeOpenAIConfig,
+    ScriptedResponse,
+    ScriptedToolCall,
+)
+from prompt_leakage_probing.fake_openai.server import (
+    FakeOpenAI,
+    running_server,
+    serve_in_thread,
+)
+from prompt_leakage_probing.tested_chatbots import chatbots_router, service
+from prompt_leakage_probing.tested_chatbots.cache import LRUCache
+from prompt_leakage_probing.tested_chatbots.openai_client import (
+    GPTRobin,
+    OpenAIGPTConfig,
+)
+from prompt_leakage_probing.tested_chatbots.prompt_loader import (
+    LevelConfig,
+    functions,
+)
+from prompt_leakage_probing.workflow.llm_config import llm_config
+from prompt_leakage_probing.workflow.scenarios.prompt_leak import SimplePromptLeak
+from prompt_leakage_probing.workflow.tools.probe_stats import load_probe_stats
+from prompt_leakage_probing.workflow.tools.result_store import get_result_store
+from prompt_leakage_probing.workflow.tools.timing import load_timings
+
+TOOLS: list[Any] = [{"type": "function", "function": schema} for schema in functions]
+
+
+def _create(base_url: str, **kwargs: Any) -> Any:
+    async def create() -> Any:
+        client = AsyncOpenAI(api_key="sk-fake", base_url=base_url, max_retries=0)
+        async with client:
+            return await client.chat.completions.create(
+                model="gpt-4o-mini", **kwargs
+            )
+
+    return asyncio.run(create())
+
+
+def test_scripted_and_default_responses() -> None:
+    config = FakeOpenAIConfig(
+        SCRIPT=[ScriptedResponse(match="^Hello", content="Hi there!")],
+        COMPLETION_TOKENS=7,
+    )
+    with running_server(config) as base_url:
+        scripted = _create(base_url, messages=[{"role": "user", "content": "Hello"}])
+        default = _create(base_url, messages=[{"role": "user", "content": "Bye"}])
+
+    assert scripted.choices[0].message.content == "Hi there!"
+    assert scripted.usage.completion_tokens == 2
+    assert len(default.choices[0].message.content.split()) == 7
+
+
+def test_tool_calls_follow_the_schema() -> None:
+    with running_server(FakeOpenAIConfig(SEED=0)) as base_url:
+        called = _create(
+            base_url, messages=[{"role": "user", "content": "Where?"}], tools=TOOLS
+        )
+        answered = _create(
+            base_url,
+            messages=[{"role": "user", "content": "Where?"}],
+            tools=TOOLS,
+            tool_choice="none",
+        )
+        legacy = _create(
+            base_url,
+            messages=[{"role": "user", "content": "Where?"}],
+            functions=functions,
+        )
+
+    (call,) = called.choices[0].message.tool_calls
+    assert called.choices[0].finish_reason == "tool_calls"
+    assert call.function.name == "get_store_locations"
+    arguments = json.loads(call.function.arguments)
+    assert isinstance(arguments["city"], str)
+    assert isinstance(arguments["count"], int)
+    assert answered.choices[0].message.tool_calls is None
+    assert answered.choices[0].message.content
+    assert legacy.choices[0].finish_reason == "function_call"
+    assert legacy.choices[0].message.function_call.name == "get_store_locations"
+
+
+def test_streaming_with_tool_calls() -> None:
+    config = FakeOpenAIConfig(
+        SCRIPT=[
+            ScriptedResponse(
+                tool_calls=[
+                    ScriptedToolCall(
+                        name="get_store_locations", arguments={"city": "Zagreb"}
+                    ),
+                    ScriptedToolCall(
+                        name="get_store_locations", arguments={"city": "Split"}
+                    ),
+                ]
+            )
+        ]
+    )
+
+    async def stream(base_url: str) -> dict[int, dict[str, Any]]:
+        client = AsyncOpenAI(api_key="sk-fake", base_url=base_url)
+        calls: dict[int, dict[str, Any]] = {}
+        async with client:
+            chunks = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": "Where?"}],
+                tools=TOOLS,
+                stream=True,
+            )
+            async for chunk in chunks:
+                service._merge_tool_call_deltas(
+                    calls, chunk.choices[0].delta.tool_calls or []
+                )
+        return calls
+
+    with running_server(config) as base_url:
+        calls = asyncio.run(stream(base_url))
+
+    assert [json.loads(calls[i]["function"]["arguments"]) for i in sorted(calls)] == [
+        {"city": "Zagreb"},
+        {"city": "Split"},
+    ]
+    assert all(call["id"].startswith("call_") for call in calls.values())
+
+
+def test_requests_per_minute_limit() -> None:
+    with running_server(FakeOpenAIConfig(REQUESTS_PER_MINUTE=2)) as base_url:
+        messages = [{"role": "user", "content": "Hi"}]
+        _create(base_url, messages=messages)
+        _create(base_url, messages=messages)
+        with pytest.raises(openai.RateLimitError) as e:
+            _create(base_url, messages=messages)
+
+    headers = e.value.response.headers
+    assert headers["x-ratelimit-remaining-requests"] == "0"
+    assert float(headers["retry-after-ms"]) > 20_000
+
+
+def test_process_messages_against_the_fake(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    script_path = tmp_path / "script.json"
+    script_path.write_text(
+        json.dumps(
+            [
+                {"match": "^Where", "status_code": 429, "retry_after_s": 0, "times": 1},
+                {"match": "address", "content": "Visit one of our dealers."},
+            ]
+        )
+    )
+    config = FakeOpenAIConfig(SCRIPT_PATH=script_path)
+    monkeypatch.setattr(service, "guardrail_cache", LRUCache(maxsize=10))
+    monkeypatch.setattr(service.config, "INITIAL_SLEEP_TIME_S", 0)
+    # Answered by the default script, like the real guardrail prompt
+    level = LevelConfig("system", 'Answer either "GOOD" or "BAD"', use_guardrails=True)
+
+    async def process(base_url: str) -> dict[str, Any]:
+        robin = GPTRobin([OpenAIGPTConfig(api_key="sk-fake")], base_url=base_url)
+        monkeypatch.setattr(service, "gpt_robin", robin)
+        messages = {"messages": [{"role": "user", "content": "Where are you?"}]}
+        return await service.process_messages(messages, level)
+
+    with running_server(config) as base_url:
+        response = asyncio.run(process(base_url))
+
+    # The 429 was retried, the tool was called and the guardrail let it through
+    assert response == {"role": "assistant", "content": "Visit one of our dealers."}
+
+
+def test_autogen_uses_the_base_url() -> None:
+    with running_server(
+        FakeOpenAIConfig(SCRIPT=[ScriptedResponse(content="Hello from the fake")])
+    ) as base_url:
+        client = OpenAIWrapper(
+            config_list=[
+                {"model": "gpt-4o-mini", "api_key": "sk-fake", "base_url": base_url}
+            ],
+            cache_seed=None,
+        )
+        response = client.create(messages=[{"role": "user", "content": "Hi"}])
+
+    assert client.extract_text_or_completion_object(response) == [
+        "Hello from the fake"
+    ]
+
+
+def test_scenario_runs_offline(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    log_path = tmp_path / "simple_prompt_leak.csv"
+    app = FastAPI()
+    app.include_router(chatbots_router.router)
+    monkeypatch.setattr(service, "guardrail_cache", LRUCache(maxsize=10))
+
+    with running_server(FakeOpenAIConfig(SEED=0)) as base_url, serve_in_thread(
+        app
+    ) as model_url:
+        monkeypatch.setitem(llm_config["config_list"][0], "base_url", base_url)  # type: ignore[index]
+        # Not cached on disk, every run talks to the fake
+        monkeypatch.setitem(llm_config, "cache_seed", None)
+        monkeypatch.setattr(
+            service,
+            "gpt_robin",
+            GPTRobin([OpenAIGPTConfig(api_key="sk-fake")], base_url=base_url),
+        )
+        summary = SimplePromptLeak(
+            ConsoleUI(),
+            {
+                "model_level": "high",
+                "max_round": 3,
+                "log_path": log_path,
+                "model_url": model_url,
+            },
+        ).run()
+
+    assert summary
+    get_result_store(log_path).flush()
+    assert len(get_result_store(log_path).query()) == 3
+    stats = load_probe_stats(log_path).loc["high"]
+    assert (stats.probes, stats.classifier_turns) == (3, 3)
+    assert set(load_timings(log_path).loc["high"].index) == {
+        "generator",
+        "probe",
+        "classifier",
+        "log",
+        "summary",
+    }
+
+
+@pytest.mark.parametrize("distribution", ["uniform", "exponential", "lognormal"])
+def test_latency_distributions_keep_the_mean(distribution: str) -> None:
+    fake = FakeOpenAI(
+        FakeOpenAIConfig(
+            LATENCY_S=0.2,
+            LATENCY_DISTRIBUTION=distribution,  # type: ignore[arg-type]
+            SEED=0,
+        )
+    )
+    samples = [fake.sample_latency() for _ in range(20_000)]
+    assert statistics.fmean(samples) == pytest.approx(0.2, rel=0.05)
+    assert fake.sample_latency(0) == 0
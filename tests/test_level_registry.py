@@ -0,0 +1,107 @@
+import json
+import os
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from prompt_leakage_probing.tested_chatbots import chatbots_router, service
+from prompt_leakage_probing.tested_chatbots.prompt_loader import (
+    LevelConfig,
+    LevelRegistry,
+)
+from prompt_leakage_probing.workflow.scenarios.prompt_leak import (
+    SimplePromptLeak,
+    prompt_leak_scenario,
+)
+
+
+def _write_level(path: Path, system_prompt: str, mtime_ns: int) -> None:
+    path.write_text(
+        json.dumps(
+            {"system_prompt": system_prompt, "canary_words": [], "user_guardrail": False}
+        )
+    )
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_levels_are_loaded_lazily_and_reloaded(tmp_path: Path) -> None:
+    registry = LevelRegistry(tmp_path)
+    assert registry.get("custom") is None
+
+    _write_level(tmp_path / "custom.json", "first", 1_000_000_000)
+    level = registry.get("custom")
+    assert level is not None
+    assert level.system_prompt == "first"
+    assert registry.get("custom") is level
+
+    _write_level(tmp_path / "custom.json", "second", 2_000_000_000)
+    assert registry.get("custom").system_prompt == "second"  # type: ignore[union-attr]
+
+    (tmp_path / "custom.json").unlink()
+    assert registry.get("custom") is None
+
+
+def test_registry_discovers_levels(tmp_path: Path) -> None:
+    for name in ["b", "a"]:
+        _write_level(tmp_path / f"{name}.json", name, 1_000_000_000)
+    (tmp_path / "notes.md").write_text("not a level")
+
+    assert LevelRegistry(tmp_path).names() == ["a", "b"]
+
+
+@pytest.mark.parametrize("name", ["../low", "low.json", ""])
+def test_registry_rejects_invalid_names(name: str) -> None:
+    assert LevelRegistry(Path(__file__).parent).get(name) is None
+
+
+def test_default_levels() -> None:
+    assert {"low", "medium", "high"} <= set(chatbots_router.levels.names())
+    high = chatbots_router.levels.get("high")
+    assert high is not None
+    assert high.use_guardrails
+
+
+def test_new_level_is_served_without_restart(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async def fake_process_messages(
+        messages: dict[str, Any], lvl_config: LevelConfig
+    ) -> dict[str, str]:
+        return {"role": "assistant", "content": lvl_config.system_prompt}
+
+    monkeypatch.setattr(chatbots_router, "process_messages", fake_process_messages)
+    monkeypatch.setattr(chatbots_router, "levels", LevelRegistry(tmp_path))
+    app = FastAPI()
+    app.include_router(chatbots_router.router)
+    client = TestClient(app)
+    body = {"messages": [{"content": "hi"}]}
+
+    assert client.post("/custom", json=body).status_code == 404
+    _write_level(tmp_path / "custom.json", "custom prompt", 1_000_000_000)
+    assert client.post("/custom", json=body).json()["content"] == "custom prompt"
+
+
+def test_scenario_offers_the_registered_levels(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _write_level(tmp_path / "custom.json", "custom", 1_000_000_000)
+    _write_level(tmp_path / "low.json", "low", 1_000_000_000)
+    monkeypatch.setattr(
+        prompt_leak_scenario, "get_level_registry", lambda: LevelRegistry(tmp_path)
+    )
+    ui = MagicMock()
+    ui.multiple_choice.return_value = "custom"
+    scenario = SimplePromptLeak(ui, {"max_round": 1, "log_path": tmp_path / "log.csv"})
+
+    scenario.setup_environment()
+
+    assert ui.multiple_choice.call_args.kwargs["choices"] == ["custom", "low"]
+    assert scenario.model_level == "custom"
+
+
+def test_openai_clients_are_created_on_first_use() -> None:
+    assert service.gpt_robin is None
@@ -0,0 +1,133 @@
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+from autogen.agentchat import ConversableAgent, UserProxyAgent
+from fastagency.ui.console import ConsoleUI
+
+from prompt_leakage_probing.workflow.scenarios.prompt_leak import SimplePromptLeak
+from prompt_leakage_probing.workflow.tools.message_history import (
+    CurrentExchangeOnly,
+    RecentExchangesWithDigest,
+)
+
+
+def _call(name: str, call_id: str, **arguments: Any) -> dict[str, Any]:
+    return {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {
+                "id": call_id,
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)},
+            }
+        ],
+    }
+
+
+def _tool(call_id: str, content: str) -> dict[str, Any]:
+    return {
+        "role": "tool",
+        "tool_responses": [
+            {"tool_call_id": call_id, "role": "tool", "content": content}
+        ],
+        "content": content,
+    }
+
+
+def _campaign(rounds: int) -> list[dict[str, Any]]:
+    messages = [{"role": "user", "content": "Start the prompt leak attempt."}]
+    for i in range(rounds):
+        messages += [
+            _call("send_msg_to_model", f"probe-{i}", msg=f"Attack {i}"),
+            _tool(f"probe-{i}", f"Response {i}"),
+            _call(
+                "log_prompt_leakage",
+                f"log-{i}",
+                prompt=f"Attack {i}",
+                result=f"Response {i}",
+                reasoning="",
+                leakage_level=i % 5,
+            ),
+            _tool(f"log-{i}", "OK"),
+        ]
+    return messages
+
+
+def test_recent_exchanges_are_kept_with_a_digest() -> None:
+    transform = RecentExchangesWithDigest("send_msg_to_model", max_exchanges=2)
+
+    messages = transform.apply_transform(_campaign(5))
+
+    assert messages[0]["content"] == "Start the prompt leak attempt."
+    assert messages[1]["content"].splitlines() == [
+        "Summary of 3 earlier attempts:",
+        "1. prompt: Attack 0 | response: Response 0 | leakage level: 0",
+        "2. prompt: Attack 1 | response: Response 1 | leakage level: 1",
+        "3. prompt: Attack 2 | response: Response 2 | leakage level: 2",
+    ]
+    assert messages[2:] == _campaign(5)[13:]
+
+
+def test_short_history_is_untouched() -> None:
+    transform = RecentExchangesWithDigest("send_msg_to_model", max_exchanges=5)
+    assert transform.apply_transform(_campaign(5)) == _campaign(5)
+
+
+def test_context_size_is_flat_over_long_campaigns() -> None:
+    transform = RecentExchangesWithDigest(
+        "send_msg_to_model", max_exchanges=3, max_digest_entries=10
+    )
+
+    def size(rounds: int) -> int:
+        return len(json.dumps(transform.apply_transform(_campaign(rounds))))
+
+    assert size(100) == pytest.approx(size(20), rel=0.05)
+    assert "(90 oldest attempts omitted)" in transform.apply_transform(
+        _campaign(103)
+    )[1]["content"]
+
+
+def test_classifier_sees_only_the_current_exchange() -> None:
+    messages = _campaign(3)[:-2]
+
+    assert CurrentExchangeOnly("send_msg_to_model").apply_transform(messages) == [
+        _call("send_msg_to_model", "probe-2", msg="Attack 2"),
+        _tool("probe-2", "Response 2"),
+    ]
+
+
+def _history_hooks(agent: ConversableAgent) -> int:
+    return len(agent.hook_lists["process_all_messages_before_reply"])
+
+
+@pytest.mark.parametrize(
+    ("params", "hooks"),
+    [
+        # The history is untouched unless a scenario opts in
+        ({}, 0),
+        ({"history_window": 5, "classifier_sees_current_exchange_only": True}, 1),
+    ],
+)
+def test_scenario_history_compaction_is_opt_in(
+    tmp_path: Path, params: dict[str, Any], hooks: int
+) -> None:
+    scenario = SimplePromptLeak(
+        ConsoleUI(),
+        {
+            "model_level": "low",
+            "max_round": 1,
+            "log_path": tmp_path / "log.csv",
+            **params,
+        },
+    )
+    scenario.setup_environment()
+    executor = UserProxyAgent("executor")
+
+    generator = scenario.setup_prompt_generator_agent(executor)
+    classifier = scenario.setup_prompt_leak_classifier_agent(executor)
+
+    assert _history_hooks(generator) == hooks
+    assert _history_hooks(classifier) == hooks
@@ -0,0 +1,128 @@
+import asyncio
+from typing import Any, Optional
+from unittest.mock import MagicMock
+
+import openai
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from prompt_leakage_probing.tested_chatbots import service
+from prompt_leakage_probing.tested_chatbots.metrics import REGISTRY
+from prompt_leakage_probing.tested_chatbots.openai_client import GPTRobin
+from prompt_leakage_probing.tested_chatbots.prompt_loader import LevelConfig
+from prompt_leakage_probing.tested_chatbots.responses import REFUSAL_MESSAGE
+
+from .conftest import FakeClient, completion
+
+
+def _sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _use_client(robin: GPTRobin, client: FakeClient) -> None:
+    for key in robin.keys:
+        key.client = client  # type: ignore[assignment]
+
+
+def _process(level: LevelConfig) -> dict[str, Any]:
+    messages = {"messages": [{"role": "user", "content": "hi"}]}
+    return asyncio.run(service.process_messages(messages, level))
+
+
+def test_upstream_calls_and_retries_are_counted(robin: GPTRobin) -> None:
+    error = openai.RateLimitError(
+        "Rate limit reached", response=MagicMock(status_code=429), body=None
+    )
+    _use_client(robin, FakeClient([error, completion("Hello")]))
+    before = {
+        "rate_limited": _sample(
+            "openai_calls_total", purpose="main", outcome="rate_limited"
+        ),
+        "ok": _sample("openai_calls_total", purpose="main", outcome="ok"),
+        "retries": _sample(
+            "openai_retries_total", purpose="main", error="RateLimitError"
+        ),
+        "waits": _sample("openai_key_wait_seconds_count"),
+    }
+
+    assert _process(LevelConfig("sys", "guard"))["content"] == "Hello"
+
+    assert (
+        _sample("openai_calls_total", purpose="main", outcome="rate_limited")
+        == before["rate_limited"] + 1
+    )
+    assert _sample("openai_calls_total", purpose="main", outcome="ok") == before["ok"] + 1
+    assert (
+        _sample("openai_retries_total", purpose="main", error="RateLimitError")
+        == before["retries"] + 1
+    )
+    assert _sample("openai_key_wait_seconds_count") == before["waits"] + 2
+    assert _sample("openai_calls_in_flight", purpose="main") == 0
+    assert _sample("openai_key_in_flight", key="key-0") == 0
+    assert _sample("openai_key_in_flight", key="key-1") == 0
+
+
+def test_canary_blocks_and_guardrail_verdicts_per_level(robin: GPTRobin) -> None:
+    level = LevelConfig(
+        "sys", "guard", canary_words=["secret"], use_guardrails=True, name="metrics"
+    )
+    _use_client(
+        robin,
+        FakeClient(
+            [
+                completion("The secret is out"),
+                completion("Hello"),
+                completion("BAD"),
+                completion("Hello"),
+            ]
+        ),
+    )
+
+    def blocks() -> float:
+        return _sample("chatbot_canary_blocks_total", level="metrics")
+
+    def bad_verdicts() -> float:
+        return _sample("chatbot_guardrail_verdicts_total", level="metrics", verdict="BAD")
+
+    blocks_before, bad_before = blocks(), bad_verdicts()
+    guardrail_calls = _sample(
+        "openai_calls_total", purpose="guardrail", outcome="ok"
+    )
+
+    for _ in range(3):
+        assert _process(level)["content"] == REFUSAL_MESSAGE
+
+    assert blocks() == blocks_before + 1
+    # The second refusal comes from the guardrail cache but is still counted
+    assert bad_verdicts() == bad_before + 2
+    assert (
+        _sample("openai_calls_total", purpose="guardrail", outcome="ok")
+        == guardrail_calls + 1
+    )
+
+
+def test_metrics_endpoint(chatbots_app: FastAPI) -> None:
+    client = TestClient(chatbots_app)
+
+    def requests() -> Optional[float]:
+        return REGISTRY.get_sample_value(
+            "chatbot_request_duration_seconds_count",
+            {"level": "low", "endpoint": "chat"},
+        )
+
+    before = requests() or 0.0
+    response = client.post("/low", json={"messages": [{"content": "Hi"}]})
+    assert response.status_code == 200
+    assert requests() == before + 1
+
+    # Unknown levels are not recorded, so paths cannot blow up the label set
+    assert client.post("/unknown", json={"messages": [{"content": "Hi"}]}).status_code == 404
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert (
+        'chatbot_request_duration_seconds_count{endpoint="chat",level="low"}'
+        in metrics.text
+    )
+    assert 'level="unknown"' not in metrics.text
@@ -1,9 +1,19 @@
+import asyncio
+import time
+from collections.abc import Iterator
 from unittest.mock import patch, MagicMock
 
+import httpx
 import pytest
 import requests
 
-from prompt_leakage_probing.workflow.tools.model_adapter import create_send_msg_to_model
+from prompt_leakage_probing.workflow.tools import model_adapter
+from prompt_leakage_probing.workflow.tools.model_adapter import (
+    ModelClientPool,
+    create_async_send_msg_to_model,
+    create_pooled_send_msg_to_model,
+    create_send_msg_to_model,
+)
 
 
 # Test case for a successful API call
@@ -43,3 +53,65 @@ def test_send_msg_connection_error(mock_post: MagicMock) -> None:
 
     with pytest.raises(requests.exceptions.RequestException, match="Connection error"):
         send_msg_to_model("Test message")
+
+
+@pytest.fixture
+def mock_pool(monkeypatch: pytest.MonkeyPatch) -> Iterator[list[httpx.Request]]:
+    requests_seen: list[httpx.Request] = []
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, json={"content": "pooled response"}),
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_seen.append(request)
+        return responses.pop(0) if len(responses) > 1 else responses[0]
+
+    pool = ModelClientPool()
+    pool.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(model_adapter, "get_model_client_pool", lambda: pool)
+    yield requests_seen
+    pool.close()
+
+
+def test_async_send_msg_retries_on_rate_limit(mock_pool: list[httpx.Request]) -> None:
+    send_msg_to_model = create_async_send_msg_to_model("http://test.com", "test_token")
+
+    response = asyncio.run(send_msg_to_model("Test message"))
+
+    assert response == "pooled response"
+    assert len(mock_pool) == 2
+    assert mock_pool[-1].headers["Authorization"] == "Bearer test_token"
+
+
+def test_pooled_send_msg_sync_shim(mock_pool: list[httpx.Request]) -> None:
+    send_msg_to_model = create_pooled_send_msg_to_model("http://test.com")
+
+    assert send_msg_to_model("first") == "pooled response"
+    assert send_msg_to_model("second") == "pooled response"
+    assert len(mock_pool) == 3
+
+
+@pytest.mark.parametrize("retry_after", ["3600", "-5", "inf"])
+def test_retry_after_is_clamped(
+    monkeypatch: pytest.MonkeyPatch, retry_after: str
+) -> None:
+    responses = [
+        httpx.Response(503, headers={"Retry-After": retry_after}),
+        httpx.Response(200, json={"content": "pooled response"}),
+    ]
+    pool = ModelClientPool()
+    pool.client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: responses.pop(0))
+    )
+    monkeypatch.setattr(model_adapter, "get_model_client_pool", lambda: pool)
+    send_msg_to_model = create_async_send_msg_to_model(
+        "http://test.com", initial_backoff_s=0.01, max_backoff_s=0.01
+    )
+
+    start = time.perf_counter()
+    try:
+        assert asyncio.run(send_msg_to_model("Test message")) == "pooled response"
+    finally:
+        pool.close()
+    assert time.perf_counter() - start < 1
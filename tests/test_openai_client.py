@@ -0,0 +1,182 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import httpx
+import openai
+import pytest
+
+from prompt_leakage_probing.tested_chatbots import openai_client
+from prompt_leakage_probing.tested_chatbots.config import get_config
+from prompt_leakage_probing.tested_chatbots.openai_client import (
+    CircuitBreaker,
+    CircuitOpenError,
+    GPTRobin,
+    KeyState,
+    OpenAIGPTConfig,
+    RateLimitBucket,
+    parse_reset_duration,
+)
+
+
+def _robin(keys: int, batch_size: int = 1) -> GPTRobin:
+    return GPTRobin(
+        [OpenAIGPTConfig(api_key=f"sk-{i}") for i in range(keys)],
+        batch_size=batch_size,
+    )
+
+
+def _headers(remaining_requests: int, remaining_tokens: int = 1000) -> httpx.Headers:
+    return httpx.Headers(
+        {
+            "x-ratelimit-limit-requests": "100",
+            "x-ratelimit-remaining-requests": str(remaining_requests),
+            "x-ratelimit-reset-requests": "1m0s",
+            "x-ratelimit-limit-tokens": "1000",
+            "x-ratelimit-remaining-tokens": str(remaining_tokens),
+            "x-ratelimit-reset-tokens": "20ms",
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [("20ms", 0.02), ("1s", 1.0), ("6m0s", 360.0), ("1h2m3.5s", 3723.5), ("", None)],
+)
+def test_parse_reset_duration(value: str, expected: float) -> None:
+    assert parse_reset_duration(value) == expected
+
+
+def test_bucket_refills_until_reset() -> None:
+    bucket = RateLimitBucket()
+    bucket.update("100", "0", "10s", now=0.0)
+
+    assert bucket.estimated_remaining(0.0) == 0.0
+    assert bucket.estimated_remaining(5.0) == 50.0
+    assert bucket.estimated_remaining(10.0) == 100.0
+
+
+def test_work_goes_to_key_with_most_headroom() -> None:
+    robin = _robin(3, batch_size=2)
+    robin.keys[0].observe(200, _headers(10), now=0.0)
+    robin.keys[1].observe(200, _headers(90), now=0.0)
+    robin.keys[2].observe(200, _headers(90, remaining_tokens=100), now=0.0)
+
+    assert robin._select(0.0) is robin.keys[1]
+
+
+def test_key_is_parked_after_429() -> None:
+    robin = _robin(2)
+    robin.keys[1].observe(429, httpx.Headers({"retry-after": "30"}), now=0.0)
+
+    assert robin._select(1.0) is robin.keys[0]
+    robin.keys[0].in_flight = 1
+    assert robin._select(1.0) is None
+    assert robin._select(31.0) is robin.keys[1]
+
+
+def test_requests_wait_for_a_free_slot() -> None:
+    robin = _robin(2)
+
+    async def run() -> list[str]:
+        order: list[str] = []
+
+        async def request(name: str) -> None:
+            async with robin.get_client():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(request(str(i)) for i in range(6)))
+        return order
+
+    assert sorted(asyncio.run(run())) == [str(i) for i in range(6)]
+    assert all(key.in_flight == 0 for key in robin.keys)
+
+
+def test_throughput_scales_with_number_of_keys() -> None:
+    async def elapsed(keys: int) -> float:
+        robin = _robin(keys)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        async def request() -> None:
+            async with robin.get_client():
+                await asyncio.sleep(0.02)
+
+        await asyncio.gather(*(request() for _ in range(8)))
+        return loop.time() - start
+
+    assert asyncio.run(elapsed(4)) < asyncio.run(elapsed(1)) / 2
+
+
+def test_keys_are_loaded_from_json_config(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    keys_path = tmp_path / "keys.json"
+    keys_path.write_text(
+        json.dumps(
+            {
+                "list_of_GPTs": [{"api_key": "sk-1"}, {"api_key": "sk-2"}],
+                "batch_size": 3,
+            }
+        )
+    )
+    monkeypatch.setattr(get_config(), "OPENAI_KEYS_PATH", keys_path)
+
+    configs = openai_client.load_gpt_configs()
+
+    assert [gpt.api_key for gpt in configs.list_of_GPTs] == ["sk-1", "sk-2"]
+    assert configs.batch_size == 3
+
+
+def test_circuit_breaker_opens_and_allows_one_trial() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=10)
+    breaker.record_failure(0.0)
+    assert not breaker.is_open(0.0)
+    breaker.record_failure(1.0)
+    assert breaker.is_open(5.0)
+    assert breaker.available_at(5.0) == 11.0
+
+    # Half open: a single trial is let through, its failure opens it again
+    assert not breaker.is_open(11.0)
+    breaker.on_dispatch()
+    assert breaker.available_at(11.0) == float("inf")
+    breaker.record_failure(12.0)
+    assert breaker.is_open(12.0)
+
+    breaker.record_success()
+    assert not breaker.is_open(12.0)
+    assert breaker.failures == 0
+
+
+def test_fails_fast_when_all_breakers_are_open() -> None:
+    robin = GPTRobin(
+        [OpenAIGPTConfig(api_key="sk-0"), OpenAIGPTConfig(api_key="sk-1")],
+        failure_threshold=1,
+        reset_timeout_s=60,
+    )
+    error = openai.APIConnectionError(request=MagicMock())
+
+    async def run() -> KeyState:
+        for key in list(robin.keys):
+            key.in_flight += 1
+            robin.release(key, error)
+        return await robin.acquire()
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(run())
+
+
+def test_failing_key_is_skipped() -> None:
+    robin = GPTRobin(
+        [OpenAIGPTConfig(api_key="sk-0"), OpenAIGPTConfig(api_key="sk-1")],
+        failure_threshold=1,
+    )
+    robin.keys[0].in_flight += 1
+    robin.release(
+        robin.keys[0], openai.APIConnectionError(request=MagicMock())
+    )
+
+    assert robin._select(time.monotonic()) is robin.keys[1]
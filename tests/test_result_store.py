@@ -0,0 +1,122 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from prompt_leakage_probing.workflow.tools.log_prompt_leakage import (
+    generate_markdown_report,
+)
+from prompt_leakage_probing.workflow.tools.result_store import (
+    CSVResultStore,
+    SQLiteResultStore,
+    get_result_store,
+    migrate_csv_reports,
+    scenario_name_from_path,
+)
+
+
+def _rows(n: int) -> list[dict[str, object]]:
+    return [
+        {
+            "prompt": f"prompt {i}",
+            "result": f"result {i}",
+            "reasoning": "reasoning",
+            "leakage_level": i % 5,
+            "model_name": ["low", "medium", "high"][i % 3],
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def csv_report(tmp_path: Path) -> Path:
+    path = tmp_path / "simple_prompt_leak.csv"
+    pd.DataFrame(_rows(30)).to_csv(path, index=False)
+    return path
+
+
+def test_sqlite_store_uses_wal(tmp_path: Path) -> None:
+    store = SQLiteResultStore(tmp_path / "results.db")
+    mode = store._connection().execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+
+
+def test_sqlite_store_query_and_counts(tmp_path: Path) -> None:
+    store = SQLiteResultStore(tmp_path / "results.db")
+    store.append_many(
+        [{**row, "scenario": "A", "campaign_id": "c1"} for row in _rows(15)]
+    )
+    store.append_many([{**row, "scenario": "B"} for row in _rows(5)])
+
+    df = store.query(scenario="A", model_name="low", min_leakage_level=2)
+    assert set(df["model_name"]) == {"low"}
+    assert (df["leakage_level"] >= 2).all()
+
+    counts = store.leakage_counts(scenario="A")
+    assert counts.loc["low"].sum() == 5
+    assert list(counts.columns) == [0, 1, 2, 3, 4]
+    assert store.leakage_counts(campaign_id="c1").to_numpy().sum() == 15
+
+    with pytest.raises(ValueError, match="Unknown columns"):
+        store.query(columns=["prompt; DROP TABLE"])
+
+
+def test_sqlite_store_requires_a_scenario(tmp_path: Path) -> None:
+    store = SQLiteResultStore(tmp_path / "results.db")
+    rows = _rows(2)
+
+    with pytest.raises(ValueError, match="need a scenario"):
+        store.append_many([{**rows[0], "scenario": "A"}, rows[1]])
+
+    # Nothing of the rejected batch is stored
+    assert store.query().empty
+
+
+def test_migrate_csv_reports_once(tmp_path: Path, csv_report: Path) -> None:
+    store = SQLiteResultStore(tmp_path / "results.db")
+
+    assert migrate_csv_reports(tmp_path, store) == {"simple_prompt_leak.csv": 30}
+    assert migrate_csv_reports(tmp_path, store) == {"simple_prompt_leak.csv": 0}
+    assert scenario_name_from_path(csv_report) == "SimplePromptLeak"
+
+
+def test_report_is_identical_for_both_stores(tmp_path: Path, csv_report: Path) -> None:
+    db_path = tmp_path / "results.db"
+    migrate_csv_reports(tmp_path, SQLiteResultStore(db_path))
+
+    assert isinstance(get_result_store(csv_report), CSVResultStore)
+    assert isinstance(get_result_store(db_path), SQLiteResultStore)
+
+    from_csv = generate_markdown_report(name="SimplePromptLeak", log_path=csv_report)
+    from_db = generate_markdown_report(name="SimplePromptLeak", log_path=db_path)
+    assert from_csv == from_db
+    assert "not yet exist" in generate_markdown_report(
+        name="Base64PromptLeak", log_path=db_path
+    )
+
+
+def test_csv_store_counts_are_updated_incrementally(csv_report: Path) -> None:
+    store = CSVResultStore(csv_report)
+    assert store.leakage_counts().to_numpy().sum() == 30
+
+    pd.DataFrame(_rows(3)).to_csv(csv_report, mode="a", header=False, index=False)
+    counts = store.leakage_counts()
+    assert counts.to_numpy().sum() == 33
+    assert store.query(min_leakage_level=4).index.tolist() == [5, 10, 15, 20, 25, 30]
+    assert store.query().index[-1] == 33
+
+
+def test_report_is_cached_until_log_changes(tmp_path: Path) -> None:
+    store = SQLiteResultStore(tmp_path / "results.db")
+    store.append_many([{**row, "scenario": "A"} for row in _rows(10)])
+
+    first = generate_markdown_report(name="A", log_path=store.path, store=store)
+    assert generate_markdown_report(name="A", log_path=store.path, store=store) is first
+
+    store.append({**_rows(1)[0], "scenario": "B"})
+    assert generate_markdown_report(name="A", log_path=store.path, store=store) is first
+
+    store.append({**_rows(2)[1], "scenario": "A"})
+    updated = generate_markdown_report(name="A", log_path=store.path, store=store)
+    assert updated is not first
+    assert "**Total Attempts**: 4" in updated
@@ -0,0 +1,125 @@
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from prompt_leakage_probing.workflow.tools.log_prompt_leakage import (
+    create_log_prompt_leakage_function,
+    generate_markdown_report,
+)
+from prompt_leakage_probing.workflow.tools.result_writer import (
+    CSVResultWriter,
+    get_result_writer,
+)
+
+
+def _row(i: int) -> dict[str, object]:
+    return {
+        "prompt": f"prompt, {i}",
+        "result": f"line one\nline two {i}",
+        "reasoning": "because",
+        "leakage_level": i % 5,
+        "model_name": "low",
+    }
+
+
+def test_writer_appends_without_rewriting(tmp_path: Path) -> None:
+    path = tmp_path / "log.csv"
+    writer = CSVResultWriter(path, flush_interval_s=60)
+    try:
+        writer.append(_row(0))
+        writer.flush()
+        writer.append(_row(1))
+        writer.flush()
+    finally:
+        writer.close()
+
+    df = pd.read_csv(path)
+    assert df["prompt"].tolist() == ["prompt, 0", "prompt, 1"]
+    assert df["result"].tolist() == ["line one\nline two 0", "line one\nline two 1"]
+    assert path.read_text().count("prompt,result,reasoning") == 1
+
+
+def test_writer_concurrent_appends(tmp_path: Path) -> None:
+    path = tmp_path / "log.csv"
+    writer = CSVResultWriter(path, flush_interval_s=0.01, max_buffered_rows=7)
+
+    def worker(offset: int) -> None:
+        for i in range(50):
+            writer.append(_row(offset + i))
+
+    threads = [threading.Thread(target=worker, args=(n * 100,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writer.close()
+
+    df = pd.read_csv(path)
+    assert len(df) == 200
+    assert df["prompt"].nunique() == 200
+
+
+def test_failed_flush_keeps_the_rows(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    # A file where the directory should be, so every write fails
+    (tmp_path / "reports").write_text("")
+    writer = CSVResultWriter(tmp_path / "reports" / "log.csv", flush_interval_s=0.01)
+    try:
+        writer.append(_row(0))
+        with pytest.raises(OSError):
+            writer.flush()
+        writer.append(_row(1))
+
+        # The flush thread logs the failures and keeps running
+        time.sleep(0.1)
+        assert writer._thread.is_alive()
+        assert "Writing results to" in caplog.text
+
+        writer.path = tmp_path / "log.csv"
+    finally:
+        writer.close()
+
+    assert pd.read_csv(writer.path)["prompt"].tolist() == ["prompt, 0", "prompt, 1"]
+
+
+def test_failed_fsync_does_not_write_the_rows_twice(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "log.csv"
+    writer = CSVResultWriter(path, flush_interval_s=60)
+
+    def failing_fsync(fd: int) -> None:
+        raise OSError("fsync failed")
+
+    try:
+        writer.append(_row(0))
+        writer.flush()
+        writer.append(_row(1))
+        with monkeypatch.context() as m:
+            m.setattr("os.fsync", failing_fsync)
+            with pytest.raises(OSError, match="fsync failed"):
+                writer.flush()
+        assert pd.read_csv(path)["prompt"].tolist() == ["prompt, 0"]
+    finally:
+        writer.close()
+
+    assert pd.read_csv(path)["prompt"].tolist() == ["prompt, 0", "prompt, 1"]
+
+
+def test_log_prompt_leakage_is_visible_in_report(tmp_path: Path) -> None:
+    path = tmp_path / "report.csv"
+    log_prompt_leakage = create_log_prompt_leakage_function(
+        save_path=path, model_name="medium"
+    )
+
+    assert log_prompt_leakage("p", "r", "why", -1) == "Noted"
+    assert log_prompt_leakage("p", "r", "why", 2) == "OK"
+    assert get_result_writer(path) is get_result_writer(tmp_path / "." / "report.csv")
+
+    report = generate_markdown_report(name="Test", log_path=path)
+    assert "### Model: medium" in report
+    assert "**Total Attempts**: 1" in report
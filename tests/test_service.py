@@ -0,0 +1,202 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any
+from unittest.mock import MagicMock
+
+import openai
+import pytest
+from fastapi import HTTPException
+from openai.types.chat import ChatCompletion
+
+from prompt_leakage_probing.tested_chatbots import service
+from prompt_leakage_probing.tested_chatbots.openai_client import (
+    GPTRobin,
+    KeyState,
+)
+from prompt_leakage_probing.tested_chatbots.prompt_loader import LevelConfig
+from prompt_leakage_probing.tested_chatbots.tools import Tool, ToolRegistry
+
+from .conftest import FakeClient, completion
+
+
+def _rate_limit_error() -> openai.RateLimitError:
+    response = MagicMock(status_code=429)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def _process() -> dict[str, Any]:
+    messages = {"messages": [{"role": "user", "content": "hi"}]}
+    return asyncio.run(service.process_messages(messages, LevelConfig("sys", "guard")))
+
+
+class RateLimitedClient(FakeClient):
+    def __init__(self, key: KeyState) -> None:
+        super().__init__([_rate_limit_error()])
+        self.key = key
+
+    async def create(self, **kwargs: Any) -> ChatCompletion:
+        self.key.park(60)  # As the response hook does on a 429
+        return await super().create(**kwargs)
+
+
+def test_retry_releases_key_and_moves_to_another(robin: GPTRobin) -> None:
+    limited = RateLimitedClient(robin.keys[0])
+    healthy = FakeClient([completion("Hello")])
+    robin.keys[0].client, robin.keys[1].client = limited, healthy  # type: ignore[assignment]
+
+    async def run() -> dict[str, Any]:
+        # Keep the healthy key busy so that the first attempt is rate limited
+        robin.keys[1].in_flight = 1
+        messages = {"messages": [{"role": "user", "content": "hi"}]}
+        task = asyncio.ensure_future(
+            service.process_messages(messages, LevelConfig("sys", "guard"))
+        )
+        await asyncio.sleep(0.01)
+        assert limited.calls == 1
+        assert robin.keys[0].in_flight == 0
+        robin.release(robin.keys[1])
+        return await task
+
+    assert asyncio.run(run())["content"] == "Hello"
+    assert healthy.calls == 1
+    assert all(key.in_flight == 0 for key in robin.keys)
+
+
+def test_gives_up_with_429_after_max_retries(
+    robin: GPTRobin, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(service.config, "MAX_RETRIES", 3)
+    client = FakeClient([_rate_limit_error()])
+    for key in robin.keys:
+        key.client = client  # type: ignore[assignment]
+
+    with pytest.raises(HTTPException) as e:
+        _process()
+
+    assert e.value.status_code == 429
+    assert client.calls == 3
+
+
+def test_fails_fast_when_upstream_is_down(robin: GPTRobin) -> None:
+    error = openai.APIConnectionError(request=MagicMock())
+    client = FakeClient([error])
+    for key in robin.keys:
+        key.client = client  # type: ignore[assignment]
+
+    with pytest.raises(HTTPException) as e:
+        _process()
+
+    # Two failures per key open both breakers before the retries run out
+    assert e.value.status_code == 503
+    assert client.calls == 4
+
+
+def _tool_calls_completion(*cities: str) -> ChatCompletion:
+    response = completion("")
+    response.choices[0].message = response.choices[0].message.model_validate(
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": f"call_{city}",
+                    "type": "function",
+                    "function": {
+                        "name": "get_store_locations",
+                        "arguments": json.dumps({"city": city, "count": 1}),
+                    },
+                }
+                for city in cities
+            ],
+        }
+    )
+    return response
+
+
+class ToolLoopClient(FakeClient):
+    def __init__(self) -> None:
+        super().__init__([])
+        self.requests: list[dict[str, Any]] = []
+
+    async def create(self, **kwargs: Any) -> ChatCompletion:
+        self.calls += 1
+        self.requests.append(kwargs)
+        if kwargs["tool_choice"] == "none":
+            return completion("Done")
+        return _tool_calls_completion("Zagreb", "Split")
+
+
+@pytest.mark.parametrize("max_tool_rounds", [1, 3])
+def test_tool_rounds_are_capped(
+    robin: GPTRobin, monkeypatch: pytest.MonkeyPatch, max_tool_rounds: int
+) -> None:
+    monkeypatch.setattr(service.config, "MAX_TOOL_ROUNDS", max_tool_rounds)
+    client = ToolLoopClient()
+    for key in robin.keys:
+        key.client = client  # type: ignore[assignment]
+
+    assert _process()["content"] == "Done"
+
+    assert client.calls == max_tool_rounds + 1
+    assert [r["tool_choice"] for r in client.requests] == ["auto"] * max_tool_rounds + [
+        "none"
+    ]
+    # Both calls of a turn are answered before the next completion
+    tool_results = [m for m in client.requests[-1]["messages"] if m["role"] == "tool"]
+    assert len(tool_results) == 2 * max_tool_rounds
+
+
+def test_tool_registry_reports_errors_to_the_model() -> None:
+    async def add(a: int, b: int) -> int:
+        return a + b
+
+    registry = ToolRegistry(
+        [Tool({"name": "add", "parameters": {"type": "object"}}, add)]
+    )
+
+    async def calls() -> list[str]:
+        return [
+            await registry.call("add", '{"a": 1, "b": 2}'),
+            await registry.call("add", '{"a": 1}'),
+            await registry.call("add", "{not json"),
+            await registry.call("sub", "{}"),
+        ]
+
+    result, *errors = asyncio.run(calls())
+    assert json.loads(result) == 3
+    assert all("error" in json.loads(error) for error in errors)
+    assert registry.definitions() == [
+        {"type": "function", "function": {"name": "add", "parameters": {"type": "object"}}}
+    ]
+
+
+def test_tool_registry_runs_blocking_tools_in_threads() -> None:
+    def lookup(city: str) -> dict[str, Any]:
+        time.sleep(0.2)
+        return {"city": city, "thread": threading.current_thread().name}
+
+    def unserializable() -> object:
+        return object()
+
+    registry = ToolRegistry(
+        [
+            Tool({"name": "lookup"}, lookup),
+            Tool({"name": "unserializable"}, unserializable),
+        ]
+    )
+
+    async def calls() -> list[str]:
+        return await asyncio.gather(
+            *(registry.call("lookup", '{"city": "Zagreb"}') for _ in range(5)),
+            registry.call("unserializable", "{}"),
+        )
+
+    start = time.perf_counter()
+    *results, error = asyncio.run(calls())
+
+    # The blocking calls ran concurrently, off the event loop's thread
+    assert time.perf_counter() - start < 0.6
+    assert all(json.loads(r)["thread"] != "MainThread" for r in results)
+    assert json.loads(error)["error"].startswith("Invalid result")
@@ -0,0 +1,220 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+
+import pytest
+from openai.types.chat import ChatCompletionChunk
+
+from prompt_leakage_probing.tested_chatbots import service
+from prompt_leakage_probing.tested_chatbots.cache import LRUCache
+from prompt_leakage_probing.tested_chatbots.prompt_loader import LevelConfig
+from prompt_leakage_probing.tested_chatbots.responses import REFUSAL_MESSAGE
+from prompt_leakage_probing.workflow.tools.model_adapter import read_sse_content
+
+
+def _chunk(
+    content: Optional[str] = None,
+    finish_reason: Optional[str] = None,
+    tool_calls: Optional[list[dict[str, Any]]] = None,
+) -> ChatCompletionChunk:
+    delta: dict[str, Any] = {"content": content}
+    if tool_calls is not None:
+        delta["tool_calls"] = tool_calls
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "chunk",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+    )
+
+
+class FakeStream:
+    def __init__(self, chunks: list[ChatCompletionChunk]) -> None:
+        self.chunks = chunks
+        self.consumed = 0
+        self.closed = False
+
+    def __aiter__(self) -> AsyncIterator[ChatCompletionChunk]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[ChatCompletionChunk]:
+        for chunk in self.chunks:
+            if self.closed:
+                return
+            self.consumed += 1
+            yield chunk
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, streams: list[FakeStream]) -> None:
+        self.streams = streams
+        self.requests: list[dict[str, Any]] = []
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs: Any) -> FakeStream:
+        self.requests.append(kwargs)
+        return self.streams.pop(0)
+
+
+@pytest.fixture
+def fake_client(monkeypatch: pytest.MonkeyPatch) -> FakeClient:
+    client = FakeClient([])
+
+    class FakeRobin:
+        @asynccontextmanager
+        async def get_client(self) -> AsyncIterator[FakeClient]:
+            yield client
+
+    monkeypatch.setattr(service, "gpt_robin", FakeRobin())
+    return client
+
+
+def _collect(lvl_config: LevelConfig) -> list[dict[str, Any]]:
+    async def collect() -> list[dict[str, Any]]:
+        messages = {"messages": [{"role": "user", "content": "hi"}]}
+        return [e async for e in service.stream_messages(messages, lvl_config)]
+
+    return asyncio.run(collect())
+
+
+def test_stream_releases_deltas_and_final_content(fake_client: FakeClient) -> None:
+    fake_client.streams.append(
+        FakeStream([_chunk("Hello"), _chunk(", world"), _chunk(finish_reason="stop")])
+    )
+    lvl_config = LevelConfig("system", "guard", canary_words=["secret-code"])
+
+    events = _collect(lvl_config)
+
+    assert "".join(e["delta"] for e in events if "delta" in e) == "Hello, world"
+    assert events[-1] == {"role": "assistant", "content": "Hello, world", "blocked": False}
+
+
+def test_stream_is_cut_on_canary_across_chunks(fake_client: FakeClient) -> None:
+    stream = FakeStream(
+        [_chunk("the code is Mb0"), _chunk("D1n"), _chunk("21"), _chunk(" and more")]
+    )
+    fake_client.streams.append(stream)
+    lvl_config = LevelConfig("system", "guard", canary_words=["Mb0D1n21"])
+
+    events = _collect(lvl_config)
+
+    released = "".join(e["delta"] for e in events if "delta" in e)
+    assert "Mb0" not in released
+    assert events[-1]["blocked"] is True
+    assert events[-1]["content"] == REFUSAL_MESSAGE
+    assert stream.closed
+    assert stream.consumed == 3
+
+
+def _tool_call_delta(index: int, **function: str) -> dict[str, Any]:
+    delta: dict[str, Any] = {"index": index, "function": function}
+    if "name" in function:
+        delta.update(id=f"call_{index}", type="function")
+    return delta
+
+
+def test_stream_runs_parallel_tool_calls(fake_client: FakeClient) -> None:
+    fake_client.streams.extend(
+        [
+            FakeStream(
+                [
+                    _chunk(
+                        tool_calls=[
+                            _tool_call_delta(0, name="get_store_locations", arguments="")
+                        ]
+                    ),
+                    _chunk(tool_calls=[_tool_call_delta(0, arguments='{"city": "Zagreb", ')]),
+                    _chunk(
+                        tool_calls=[
+                            _tool_call_delta(1, name="get_store_locations", arguments="")
+                        ]
+                    ),
+                    _chunk(tool_calls=[_tool_call_delta(0, arguments='"count": 2}')]),
+                    _chunk(
+                        tool_calls=[
+                            _tool_call_delta(1, arguments='{"city": "Split", "count": 1}')
+                        ]
+                    ),
+                    _chunk(finish_reason="tool_calls"),
+                ]
+            ),
+            FakeStream([_chunk("Three dealers"), _chunk(finish_reason="stop")]),
+        ]
+    )
+
+    events = _collect(LevelConfig("system", "guard"))
+
+    assert events[-1]["content"] == "Three dealers"
+    assert fake_client.requests[0]["parallel_tool_calls"] is True
+    follow_up = fake_client.requests[1]["messages"]
+    calls = follow_up[-3]["tool_calls"]
+    assert [json.loads(c["function"]["arguments"])["city"] for c in calls] == [
+        "Zagreb",
+        "Split",
+    ]
+    assert [(m["role"], m["tool_call_id"]) for m in follow_up[-2:]] == [
+        ("tool", "call_0"),
+        ("tool", "call_1"),
+    ]
+    assert [len(json.loads(m["content"])) for m in follow_up[-2:]] == [2, 1]
+
+
+def test_recorded_stream_is_replayed(
+    fake_client: FakeClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    fake_client.streams.extend(
+        [
+            FakeStream(
+                [
+                    _chunk(
+                        tool_calls=[
+                            _tool_call_delta(
+                                0,
+                                name="get_store_locations",
+                                arguments='{"city": "Zagreb", "count": 2}',
+                            )
+                        ]
+                    ),
+                    _chunk(finish_reason="tool_calls"),
+                ]
+            ),
+            FakeStream([_chunk("Two "), _chunk("dealers"), _chunk(finish_reason="stop")]),
+        ]
+    )
+    monkeypatch.setattr(service, "response_cache", LRUCache(maxsize=10))
+    monkeypatch.setattr(service.config, "RESPONSE_CACHE_MODE", "record")
+    level = LevelConfig("system", "guard")
+    recorded = _collect(level)
+
+    monkeypatch.setattr(service.config, "RESPONSE_CACHE_MODE", "replay")
+    assert _collect(level) == [
+        {"delta": "Two dealers"},
+        {"role": "assistant", "content": "Two dealers", "blocked": False},
+    ]
+    assert recorded[-1] == {"role": "assistant", "content": "Two dealers", "blocked": False}
+    assert len(fake_client.requests) == 2
+
+
+def test_read_sse_content() -> None:
+    lines = [
+        'data: {"delta": "Hel"}',
+        "",
+        'data: {"delta": "lo"}',
+        "",
+        "event: done",
+        'data: {"role": "assistant", "content": "Hello", "blocked": false}',
+        "",
+    ]
+    assert read_sse_content(lines) == "Hello"
+
+    with pytest.raises(ValueError, match="without a final event"):
+        read_sse_content(lines[:3])
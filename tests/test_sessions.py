@@ -0,0 +1,139 @@
+import asyncio
+from collections.abc import Iterator
+from typing import Any
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from prompt_leakage_probing.tested_chatbots import chatbots_router
+from prompt_leakage_probing.tested_chatbots.sessions import SessionStore
+from prompt_leakage_probing.workflow.tools import model_adapter
+from prompt_leakage_probing.workflow.tools.model_adapter import (
+    ModelClientPool,
+    create_async_session_send_msg_to_model,
+)
+
+
+def _turn(content: str) -> list[dict[str, str]]:
+    return [
+        {"role": "user", "content": content},
+        {"role": "assistant", "content": f"echo {content}"},
+    ]
+
+
+def test_store_evicts_least_recently_used() -> None:
+    store = SessionStore(max_sessions=2)
+    first, second = store.create("low"), store.create("low")
+    assert store.get(first.id, "low") is first
+    third = store.create("low")
+
+    assert store.get(second.id, "low") is None
+    assert store.get(first.id, "low") is first
+    assert store.get(third.id, "low") is third
+    # Sessions are bound to their level
+    assert store.get(first.id, "high") is None
+
+
+def test_store_memory_cap() -> None:
+    store = SessionStore(max_sessions=10, max_bytes=100)
+    first, second = store.create("low"), store.create("low")
+    store.append(first, *_turn("a" * 30))
+    store.append(second, *_turn("b" * 30))
+
+    assert store.get(first.id, "low") is None
+    assert store.get(second.id, "low") is second
+    assert store.size == second.size
+
+
+def test_store_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = 1000.0
+    monkeypatch.setattr("time.time", lambda: now)
+    store = SessionStore(max_sessions=10, ttl_s=60)
+    session = store.create("low")
+
+    now += 59
+    assert store.get(session.id, "low") is session
+    now += 61
+    assert store.get(session.id, "low") is None
+    assert len(store) == 0
+
+
+def test_store_trims_history() -> None:
+    store = SessionStore(max_sessions=10, max_history_messages=3)
+    session = store.create("low")
+    store.append(session, *_turn("1"))
+    store.append(session, *_turn("2"))
+
+    # The trimmed history starts with a user turn
+    assert session.messages == _turn("2")
+
+
+@pytest.fixture
+def app(chatbots_app: FastAPI, monkeypatch: pytest.MonkeyPatch) -> FastAPI:
+    monkeypatch.setattr(chatbots_router, "session_store", SessionStore(max_sessions=10))
+    return chatbots_app
+
+
+def test_session_endpoints(app: FastAPI) -> None:
+    client = TestClient(app)
+    session_id = client.post("/low/sessions").json()["session_id"]
+    url = f"/low/sessions/{session_id}/messages"
+
+    assert client.post(url, json={"content": "hi"}).json()["content"] == "echo hi"
+    assert client.post(url, json={"content": "fail"}).status_code == 452
+    # The failed turn is not part of the history
+    assert client.post(url, json={"content": "again"}).json()["content"] == (
+        "echo hi / again"
+    )
+
+    assert client.post("/unknown/sessions").status_code == 404
+    assert client.post(f"/high/sessions/{session_id}/messages", json={"content": "x"}).status_code == 404
+    assert client.delete(f"/low/sessions/{session_id}").status_code == 204
+    assert client.post(url, json={"content": "hi"}).status_code == 404
+
+
+@pytest.fixture
+def session_pool(
+    app: FastAPI, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[ModelClientPool]:
+    pool = ModelClientPool()
+    pool.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+    monkeypatch.setattr(model_adapter, "get_model_client_pool", lambda: pool)
+    yield pool
+    pool.close()
+
+
+def test_session_adapter_sends_only_new_turns(session_pool: ModelClientPool) -> None:
+    send_msg_to_model = create_async_session_send_msg_to_model("http://test/low")
+
+    async def conversation() -> list[str]:
+        return [await send_msg_to_model(msg) for msg in ["one", "two", "three"]]
+
+    assert asyncio.run(conversation()) == [
+        "echo one",
+        "echo one / two",
+        "echo one / two / three",
+    ]
+    assert len(chatbots_router.session_store) == 1
+
+
+def test_session_adapter_creates_one_session_for_concurrent_messages(
+    session_pool: ModelClientPool, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    post = session_pool.post
+
+    async def slow_post(*args: Any, **kwargs: Any) -> httpx.Response:
+        # Let the other messages start before the session is created
+        await asyncio.sleep(0.01)
+        return await post(*args, **kwargs)
+
+    monkeypatch.setattr(session_pool, "post", slow_post)
+    send_msg_to_model = create_async_session_send_msg_to_model("http://test/low")
+
+    async def fan_out() -> list[str]:
+        return await asyncio.gather(*(send_msg_to_model(str(i)) for i in range(5)))
+
+    assert len(asyncio.run(fan_out())) == 5
+    assert len(chatbots_router.session_store) == 1
@@ -0,0 +1,127 @@
+import asyncio
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from autogen.agentchat import UserProxyAgent
+from fastagency.ui.console import ConsoleUI
+
+from prompt_leakage_probing.workflow.scenarios.prompt_leak import SimplePromptLeak
+from prompt_leakage_probing.workflow.tools.log_prompt_leakage import (
+    generate_markdown_report,
+)
+from prompt_leakage_probing.workflow.tools.timing import (
+    JSONLinesSpanExporter,
+    Span,
+    Tracer,
+    load_timings,
+    timing_path,
+)
+
+
+def test_tracer_records_sync_and_async_calls() -> None:
+    rounds = iter([0, 1, 2])
+    tracer = Tracer("SimplePromptLeak", "low", "c", current_round=lambda: next(rounds))
+
+    def generate() -> str:
+        return "reply"
+
+    async def probe(msg: str) -> str:
+        await asyncio.sleep(0.01)
+        return f"echo {msg}"
+
+    def fail() -> None:
+        raise ValueError("boom")
+
+    assert tracer.traced("generator", generate)() == "reply"
+    traced_probe = tracer.traced("probe", probe)
+    assert traced_probe.__name__ == "probe"
+    assert asyncio.run(traced_probe("hi")) == "echo hi"
+    with pytest.raises(ValueError, match="boom"):
+        tracer.traced("log", fail)()
+
+    assert [(s.stage, s.round) for s in tracer.spans] == [
+        ("generator", 0),
+        ("probe", 1),
+        ("log", 2),
+    ]
+    assert tracer.spans[1].duration_s >= 0.01
+
+
+class ListExporter:
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    def export(self, spans: list[Span]) -> None:
+        self.spans.extend(spans)
+
+
+def test_flush_hands_spans_to_the_exporter() -> None:
+    tracer = Tracer("SimplePromptLeak", "low", "c")
+    with tracer.span("summary"):
+        pass
+    exporter = ListExporter()
+
+    tracer.flush(exporter)
+    tracer.flush(exporter)
+
+    assert [s.stage for s in exporter.spans] == ["summary"]
+    assert tracer.spans == []
+
+
+def _span(stage: str, duration_s: float, scenario: str = "SimplePromptLeak") -> Span:
+    return Span(scenario, "low", "c", stage, 0, 0.0, duration_s)
+
+
+def test_timing_breakdown_in_report(tmp_path: Path) -> None:
+    log_path = tmp_path / "simple_prompt_leak.csv"
+    pd.DataFrame(
+        [
+            {
+                "prompt": "p",
+                "result": "r",
+                "reasoning": "",
+                "leakage_level": 0,
+                "model_name": "low",
+            }
+        ]
+    ).to_csv(log_path, index=False)
+    exporter = JSONLinesSpanExporter(log_path)
+    exporter.export([_span("summary", 4.0)])
+    exporter.export([_span("probe", float(i)) for i in range(1, 21)])
+    exporter.export([_span("probe", 100.0, scenario="Other")])
+
+    assert exporter.path == tmp_path / "simple_prompt_leak.timing.jsonl"
+    timings = load_timings(log_path, scenario="SimplePromptLeak")
+    # Stages are listed in the order they run
+    assert list(timings.index) == [("low", "probe"), ("low", "summary")]
+    assert timings.loc[("low", "probe")].to_dict() == {
+        "spans": 20,
+        "p50_s": 10.5,
+        "p95_s": pytest.approx(19.05),
+        "total_s": 210.0,
+    }
+
+    report = generate_markdown_report("SimplePromptLeak", log_path)
+    assert "## Timing Breakdown" in report
+    assert "| low          | probe | 20 | 10.500 | 19.050 | 210.0 |" in report
+
+
+def test_scenario_traces_logging(tmp_path: Path) -> None:
+    log_path = tmp_path / "simple_prompt_leak.csv"
+    scenario = SimplePromptLeak(
+        ConsoleUI(), {"model_level": "high", "max_round": 5, "log_path": log_path}
+    )
+    scenario.setup_environment()
+    scenario.setup_prompt_leak_classifier_agent(UserProxyAgent("executor"))
+    assert scenario.log_prompt_leakage is not None
+
+    scenario.log_prompt_leakage("prompt", "response", "reasoning", 1)
+    scenario.log_prompt_leakage("prompt", "response", "reasoning", 2)
+    scenario.tracer.flush(JSONLinesSpanExporter(log_path))
+
+    spans = pd.read_json(timing_path(log_path), lines=True)
+    assert spans[["stage", "round", "model_name"]].to_dict(orient="records") == [
+        {"stage": "log", "round": 0, "model_name": "high"},
+        {"stage": "log", "round": 1, "model_name": "high"},
+    ]